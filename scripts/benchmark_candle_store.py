@@ -0,0 +1,54 @@
+"""Compare load time of the legacy CSV path with the memory-mapped candle store.
+
+Run from the project root: python -m scripts.benchmark_candle_store [rows]
+Uses synthetic 15m candles written to a temporary directory, so no exchange access is needed.
+"""
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from src.candle_store import CandleStore
+
+rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+repeats = 3
+
+rng = np.random.default_rng(42)
+close = 30000 * np.exp(np.cumsum(rng.normal(0, 0.002, rows)))
+df = pd.DataFrame({
+    'timestamp': pd.date_range('2019-01-01', periods=rows, freq='15min'),
+    'open': close * (1 + rng.normal(0, 0.001, rows)), 'high': close * 1.002, 'low': close * 0.998,
+    'close': close, 'volume': rng.lognormal(5, 0.5, rows)
+})
+
+def best_of(load):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        loaded = load()
+        loaded['close'].sum()  # Touch the data so memory-mapped pages are actually read
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def load_csv(path):
+    # The previous DataHandler path: read the CSV, then parse every timestamp string
+    loaded = pd.read_csv(path)
+    loaded['timestamp'] = pd.to_datetime(loaded['timestamp'])
+    return loaded
+
+with tempfile.TemporaryDirectory() as tmp:
+    csv_path = os.path.join(tmp, 'candles.csv')
+    df.to_csv(csv_path, index=False)
+    store = CandleStore(os.path.join(tmp, 'store'))
+    store.write('candles', df)
+
+    csv_time = best_of(lambda: load_csv(csv_path))
+    store_time = best_of(lambda: store.load('candles'))
+    loaded = store.load('candles')
+    assert loaded['timestamp'].equals(df['timestamp'].astype(loaded['timestamp'].dtype))
+    assert np.array_equal(loaded['close'].to_numpy(), df['close'].to_numpy())
+
+print(f"Rows: {rows}")
+print(f"CSV load:          {csv_time * 1000:10.1f} ms")
+print(f"Candle store load: {store_time * 1000:10.1f} ms ({csv_time / store_time:.0f}x faster)")
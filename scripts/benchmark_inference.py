@@ -0,0 +1,50 @@
+"""Compare single-row inference latency of the DMatrix path with MLModel.predict_fast.
+
+Run from the project root: python -m scripts.benchmark_inference [calls]
+Uses models/xgboost_model.json if it exists, otherwise trains a throwaway model on random features.
+"""
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+import xgboost as xgb
+from src.ml_model import MLModel
+from src.profiling import LatencyRecorder
+from src.config import ML_FEATURES
+
+calls = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+
+model = MLModel()
+if model.model is None:
+    rng = np.random.default_rng(42)
+    X = rng.normal(size=(20000, len(ML_FEATURES))).astype(np.float32)
+    y = (X[:, 0] + rng.normal(size=len(X)) > 1).astype(np.float32)
+    booster = xgb.train({'max_depth': 6, 'objective': 'binary:logistic'},
+                        xgb.DMatrix(X, label=y, feature_names=ML_FEATURES), num_boost_round=300)
+    path = os.path.join(tempfile.mkdtemp(), 'model.json')
+    booster.save_model(path)
+    model = MLModel(model_path=path)
+
+rng = np.random.default_rng(0)
+rows = rng.normal(size=(calls, len(ML_FEATURES)))
+dicts = [dict(zip(ML_FEATURES, row)) for row in rows[:calls]]
+
+def measure(predict, inputs):
+    recorder = LatencyRecorder(window=calls)
+    for item in inputs:
+        start = time.perf_counter()
+        predict(item)
+        recorder.record(time.perf_counter() - start)
+    return recorder.summary()
+
+# The previous live path: wrap one row in a new DMatrix and call MLModel.predict
+legacy = measure(lambda row: model.predict(xgb.DMatrix(row.reshape(1, -1), feature_names=ML_FEATURES)), rows)
+fast_row = measure(model.predict_fast, rows)
+fast_dict = measure(model.predict_fast, dicts)
+assert np.allclose(model.predict(xgb.DMatrix(rows[:100].astype(np.float32), feature_names=ML_FEATURES)), model.predict_fast(rows[:100]), atol=1e-6)
+
+print(f"Calls: {calls}")
+for name, stats in [('DMatrix + predict', legacy), ('predict_fast (array)', fast_row), ('predict_fast (dict)', fast_dict)]:
+    print(f"{name:<22} p50 {stats['p50_us']:8.1f} us   p99 {stats['p99_us']:8.1f} us   "
+          f"({legacy['p50_us'] / stats['p50_us']:.1f}x p50 vs DMatrix)")
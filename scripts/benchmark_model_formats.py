@@ -0,0 +1,48 @@
+"""Compare booster load time and file size for XGBoost's JSON and binary UBJ formats.
+
+Run from the project root: python -m scripts.benchmark_model_formats [trees]
+Uses models/xgboost_model.json if it exists, otherwise trains a throwaway model on random features.
+"""
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+import xgboost as xgb
+from src.ml_model import MODEL_PATH
+from src.config import ML_FEATURES
+
+trees = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+repeats = 5
+
+if os.path.exists(MODEL_PATH):
+    booster = xgb.Booster()
+    booster.load_model(MODEL_PATH)
+    print(f"Using {MODEL_PATH} ({booster.num_boosted_rounds()} rounds)")
+else:
+    rng = np.random.default_rng(42)
+    X = rng.normal(size=(20000, len(ML_FEATURES))).astype(np.float32)
+    y = (X[:, 0] + rng.normal(size=len(X)) > 1).astype(np.float32)
+    booster = xgb.train({'max_depth': 6, 'objective': 'binary:logistic'},
+                        xgb.DMatrix(X, label=y, feature_names=ML_FEATURES), num_boost_round=trees)
+    print(f"Using a synthetic {trees}-tree model")
+
+def best_load_time(path):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        xgb.Booster().load_model(path)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+with tempfile.TemporaryDirectory() as tmp:
+    results = {}
+    for extension in ('json', 'ubj'):
+        path = os.path.join(tmp, f"model.{extension}")
+        booster.save_model(path)
+        results[extension] = (best_load_time(path), os.path.getsize(path))
+
+json_time = results['json'][0]
+for extension, (load_time, size) in results.items():
+    print(f"{extension.upper():<5} load {load_time * 1000:8.1f} ms   size {size / 1e6:7.2f} MB   "
+          f"({json_time / load_time:.1f}x vs JSON)")
@@ -0,0 +1,16 @@
+"""Convert every legacy OHLCV CSV under data/raw and data/processed into the candle store.
+
+Run from the project root: python -m scripts.convert_csv_to_store
+"""
+import glob
+import os
+from src.candle_store import CandleStore, convert_csv
+
+store = CandleStore()
+csv_files = sorted(glob.glob(os.path.join('data', 'raw', 'data_*.csv')) +
+                   glob.glob(os.path.join('data', 'processed', 'data_*.csv')))
+if not csv_files:
+    print("No CSV files found under data/raw or data/processed.")
+for csv_path in csv_files:
+    convert_csv(csv_path, store)
+print(f"Converted {len(csv_files)} files into {store.root}")
@@ -1,4 +1,12 @@
-from data_handler import DataHandler
+"""Fetch candles for fixed market-regime periods into data/store (keys like BTC_USDT_4h_bull_...).
+
+Run from the project root: python -m scripts.fetch_period_data
+All periods and timeframes are downloaded concurrently under one shared rate limit.
+"""
+import pandas as pd
+from src.async_fetcher import FetchJob, fetch_all
+from src.candle_store import candle_key
+from src.config import SYMBOL
 
 # Define periods for different market conditions
 periods = [
@@ -25,12 +33,13 @@ periods = [
 # Define timeframes
 timeframes = ['1h', '4h', '15m']
 
-# Fetch data for each period and timeframe
-handler = DataHandler()
-for period in periods:
-    for timeframe in timeframes:
-        handler.fetch_historical_data(
-            timeframe=timeframe,
-            start_date=period['start_date'],
-            end_date=period['end_date']
-        )
\ No newline at end of file
+def to_ms(date):
+    return int(pd.to_datetime(date).timestamp() * 1000)
+
+# One job per period and timeframe, each written to its own period series
+jobs = [
+    FetchJob(SYMBOL, timeframe, to_ms(period['start_date']), to_ms(period['end_date']),
+             key=candle_key(SYMBOL, timeframe, period['name']))
+    for period in periods for timeframe in timeframes
+]
+fetch_all(jobs)
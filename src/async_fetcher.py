@@ -0,0 +1,196 @@
+import asyncio
+import os
+import time
+import ccxt
+import ccxt.async_support as ccxt_async
+import pandas as pd
+from src.config import (SYMBOL, HISTORY_START_DATE, FETCH_MAX_RETRIES, FETCH_RETRY_DELAY, FETCH_MAX_RATE_LIMITED,
+                        ASYNC_FETCH_RATE, ASYNC_FETCH_BURST, ASYNC_FETCH_CONCURRENCY, ASYNC_FETCH_SEGMENT_PAGES)
+from src.candle_store import CandleStore, COLUMNS, candle_key
+
+class TokenBucket:
+    """Shared request budget: `rate` requests per second with bursts of up to `capacity`."""
+
+    def __init__(self, rate, capacity, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.clock = clock
+        self.updated = clock()
+        self.lock = asyncio.Lock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        """Wait until a request may be sent."""
+        async with self.lock:
+            self._refill()
+            while self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+    def penalize(self, seconds):
+        """Back the whole budget off after the exchange reports a rate-limit violation."""
+        self._refill()
+        self.tokens = min(self.tokens, 0) - seconds * self.rate
+
+class FetchJob:
+    """One (symbol, timeframe, time range) download written to a candle store series."""
+
+    def __init__(self, symbol, timeframe, since, until=None, key=None):
+        self.symbol = symbol
+        self.timeframe = timeframe
+        self.since = since
+        self.until = until
+        self.key = key or candle_key(symbol, timeframe)
+
+    def __repr__(self):
+        return f"FetchJob({self.key}, {pd.to_datetime(self.since, unit='ms')} -> {pd.to_datetime(self.until, unit='ms')})"
+
+class _OrderedSink:
+    """Streams pages of one series into the store in timestamp order while its segments download concurrently.
+
+    Pages from the earliest unfinished segment are appended as they arrive; later segments are
+    buffered until every segment before them has finished.
+    """
+
+    def __init__(self, store, key, segments):
+        self.store = store
+        self.key = key
+        self.next_segment = 0
+        self.buffers = [[] for _ in range(segments)]
+        self.finished = [False] * segments
+        self.rows = 0
+
+    def _append(self, page):
+        self.rows += self.store.append(self.key, pd.DataFrame(page, columns=COLUMNS))
+
+    def page(self, segment, page):
+        if segment == self.next_segment:
+            self._append(page)
+        else:
+            self.buffers[segment].append(page)
+
+    def finish(self, segment):
+        self.finished[segment] = True
+        while self.next_segment < len(self.finished) and self.finished[self.next_segment]:
+            self.next_segment += 1
+            if self.next_segment < len(self.finished):
+                for page in self.buffers[self.next_segment]:
+                    self._append(page)
+                self.buffers[self.next_segment] = []
+
+class AsyncFetcher:
+    """Runs many candle download jobs concurrently over one pooled ccxt client and one token-bucket budget."""
+
+    def __init__(self, exchange=None, store=None, rate=ASYNC_FETCH_RATE, burst=ASYNC_FETCH_BURST,
+                 concurrency=ASYNC_FETCH_CONCURRENCY, limit_per_call=1000, max_rate_limited=FETCH_MAX_RATE_LIMITED):
+        self.exchange = exchange
+        self.store = store or CandleStore()
+        self.rate = rate
+        self.burst = burst
+        self.concurrency = concurrency
+        self.limit_per_call = limit_per_call
+        self.max_rate_limited = max_rate_limited
+        self.requests = 0
+        self.rate_limited = 0
+
+    async def _request(self, job, since):
+        """Fetch one page under the shared budget, backing off on 429s and retrying network errors.
+
+        Gives up (re-raising) after max_rate_limited 429s or FETCH_MAX_RETRIES network errors for the page.
+        """
+        attempt = 0
+        rate_limited = 0
+        while True:
+            await self.bucket.acquire()
+            async with self.semaphore:
+                try:
+                    self.requests += 1
+                    return await self.exchange.fetch_ohlcv(job.symbol, job.timeframe, since=since, limit=self.limit_per_call)
+                except ccxt.RateLimitExceeded as e:
+                    self.rate_limited += 1
+                    rate_limited += 1
+                    if rate_limited > self.max_rate_limited:
+                        raise
+                    self.bucket.penalize(FETCH_RETRY_DELAY)
+                    print(f"Rate limited fetching {job.key}: {e}. Backing off...")
+                    continue
+                except ccxt.NetworkError as e:
+                    attempt += 1
+                    if attempt >= FETCH_MAX_RETRIES:
+                        raise
+                    delay = FETCH_RETRY_DELAY * 2 ** (attempt - 1)
+                    print(f"Error fetching {job.key}: {e}. Retrying in {delay}s...")
+            await asyncio.sleep(delay)
+
+    async def _fetch_segment(self, job, sink, segment, since, until, last_closed):
+        while since < until:
+            ohlcv = await self._request(job, since)
+            if not ohlcv:
+                break
+            page = [row for row in ohlcv if since <= row[0] < until and row[0] <= last_closed]
+            if page:
+                sink.page(segment, page)
+            if ohlcv[-1][0] < since or ohlcv[-1][0] >= until or ohlcv[-1][0] > last_closed:
+                break
+            since = ohlcv[-1][0] + 1
+        sink.finish(segment)
+
+    async def _run_job(self, job):
+        """Split a job's range into segments fetched concurrently and stream them into the store in order."""
+        timeframe_ms = self.exchange.parse_timeframe(job.timeframe) * 1000
+        last_closed = self.exchange.milliseconds() - timeframe_ms
+        until = min(job.until or last_closed + 1, last_closed + 1)
+        span = ASYNC_FETCH_SEGMENT_PAGES * self.limit_per_call * timeframe_ms
+        bounds = list(range(job.since, until, span)) + [until]
+        sink = _OrderedSink(self.store, job.key, max(len(bounds) - 1, 0))
+        await asyncio.gather(*(self._fetch_segment(job, sink, i, bounds[i], bounds[i + 1], last_closed)
+                               for i in range(len(bounds) - 1)))
+        print(f"{job.key}: {sink.rows} candles stored")
+        return sink.rows
+
+    async def run(self, jobs):
+        """Run all jobs concurrently; returns {key: candles stored}."""
+        self.bucket = TokenBucket(self.rate, self.burst)
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        owns_exchange = self.exchange is None
+        if owns_exchange:
+            # One client means one aiohttp session, so every job shares its connection pool
+            self.exchange = ccxt_async.bybit({
+                'apiKey': os.environ.get('BYBIT_API_KEY'),
+                'secret': os.environ.get('BYBIT_API_SECRET'),
+                'enableRateLimit': False  # The token bucket replaces ccxt's per-call throttle
+            })
+        try:
+            start = time.monotonic()
+            results = await asyncio.gather(*(self._run_job(job) for job in jobs))
+            elapsed = time.monotonic() - start
+            print(f"Fetched {len(jobs)} jobs with {self.requests} requests in {elapsed:.1f}s "
+                  f"({self.requests / elapsed if elapsed else 0:.1f} req/s, {self.rate_limited} rate-limited)")
+            return {job.key: rows for job, rows in zip(jobs, results)}
+        finally:
+            if owns_exchange:
+                await self.exchange.close()
+                self.exchange = None
+
+def sync_jobs(timeframes, symbols=(SYMBOL,), start_date=HISTORY_START_DATE, store=None):
+    """Build jobs that bring each stored (symbol, timeframe) series up to date from its last candle."""
+    store = store or CandleStore()
+    start = int(pd.to_datetime(start_date).timestamp() * 1000)
+    jobs = []
+    for symbol in symbols:
+        for timeframe in timeframes:
+            key = candle_key(symbol, timeframe)
+            last = store.last_timestamp(key)
+            since = start if last is None else last + ccxt.Exchange.parse_timeframe(timeframe) * 1000
+            jobs.append(FetchJob(symbol, timeframe, since, key=key))
+    return jobs
+
+def fetch_all(jobs, **kwargs):
+    """Synchronous entry point: run the jobs on a fresh event loop."""
+    return asyncio.run(AsyncFetcher(**kwargs).run(jobs))
@@ -0,0 +1,287 @@
+from bisect import bisect_left
+import numpy as np
+import pandas as pd
+from src.config import (INITIAL_CAPITAL, TRANSACTION_FEE_RATE, POSITION_SIZE_FRACTION, TRAILING_STOP_PERCENT,
+                        ATR_STOP_LOSS_MULTIPLIER, ATR_STOP_LOSS_MULTIPLIER_CHOPPY, ATR_TAKE_PROFIT_MULTIPLIER,
+                        CHOPPY_POSITION_SIZE_FRACTION, MIN_CASH_FRACTION, COOLDOWN_CANDLES)
+
+# Trades are written into a preallocated structured array instead of one dict per fill
+TRADE_DTYPE = np.dtype([
+    ('trade_number', np.int64), ('type', np.int8), ('timestamp', 'datetime64[ns]'), ('price', np.float64),
+    ('amount', np.float64), ('portfolio_value', np.float64), ('fee', np.float64), ('reason', np.int8),
+    ('profit_loss', np.float64), ('regime', np.int8), ('holding_period', np.float64)
+])
+TRADE_TYPES = ('buy', 'sell')
+EXIT_REASONS = ('signal', 'stop-loss', 'take-profit', 'trailing-stop')
+REGIMES = ('choppy', 'trending')
+
+BUY, SELL = 0, 1
+STOP_LOSS, TAKE_PROFIT, TRAILING_STOP = 1, 2, 3
+
+SCALAR_SCAN_CANDLES = 8  # Candles checked one at a time before switching to vectorized exit scans
+MAX_SCAN_CHUNK = 4096  # Upper bound on candles checked per vectorized exit scan
+
+def default_params():
+    """Return the strategy parameters used by backtest() and LiveTrader."""
+    return {
+        'initial_capital': INITIAL_CAPITAL,
+        'fee_rate': TRANSACTION_FEE_RATE,
+        'position_size_fraction': POSITION_SIZE_FRACTION,
+        'choppy_position_size_fraction': CHOPPY_POSITION_SIZE_FRACTION,
+        'min_cash_fraction': MIN_CASH_FRACTION,
+        'stop_loss_atr': ATR_STOP_LOSS_MULTIPLIER,
+        'choppy_stop_loss_atr': ATR_STOP_LOSS_MULTIPLIER_CHOPPY,
+        'take_profit_atr': ATR_TAKE_PROFIT_MULTIPLIER,
+        'trailing_stop_percent': TRAILING_STOP_PERCENT,
+        'cooldown': COOLDOWN_CANDLES
+    }
+
+def prepare_arrays(df):
+    """Pull the columns the engine needs out of an indicator frame into contiguous arrays."""
+    return {
+        'close': np.ascontiguousarray(df['close'].to_numpy(dtype=np.float64)),
+        'atr': np.ascontiguousarray(df['ATR'].to_numpy(dtype=np.float64)),
+        'signal': np.ascontiguousarray(df['signal'].to_numpy(dtype=np.int8)),
+        'trend_regime': np.ascontiguousarray(df['trend_regime'].to_numpy(dtype=np.int8)),
+        'timestamp': np.ascontiguousarray(df['timestamp'].to_numpy(dtype='datetime64[ns]').view(np.int64))
+    }
+
+def _find_exit(close, atr, stop_mult, start, entry_price, peak_price, params):
+    """Scan forward from start for the first candle that triggers an exit.
+
+    Returns (index, reason, peak_price) where index is len(close) if the position is never closed,
+    and peak_price is the trailing-stop peak carried into that candle.
+    """
+    n = len(close)
+    take_profit_atr = params['take_profit_atr']
+    trailing_factor = 1 - params['trailing_stop_percent']
+    # Most trades exit within a few candles, where a scalar check is cheaper than array setup
+    scalar_end = min(start + SCALAR_SCAN_CANDLES, n)
+    for i in range(start, scalar_end):
+        price = close[i]
+        if price < entry_price - atr[i] * stop_mult[i]:
+            return i, STOP_LOSS, peak_price
+        if price > entry_price + take_profit_atr * atr[i]:
+            return i, TAKE_PROFIT, peak_price
+        if price < peak_price * trailing_factor:
+            return i, TRAILING_STOP, peak_price
+        peak_price = max(peak_price, price)
+    i = scalar_end
+    chunk = 32
+    while i < n:
+        end = min(i + chunk, n)
+        prices = close[i:end]
+        atrs = atr[i:end]
+        # Peak seen by each candle is the running max of closes before it (the entry close included)
+        peaks = np.empty(end - i)
+        peaks[0] = peak_price
+        if end - i > 1:
+            np.maximum.accumulate(np.maximum(prices[:-1], peak_price), out=peaks[1:])
+        stop_hit = prices < entry_price - atrs * stop_mult[i:end]
+        take_hit = prices > entry_price + take_profit_atr * atrs
+        trail_hit = prices < peaks * trailing_factor
+        hits = np.flatnonzero(stop_hit | take_hit | trail_hit)
+        if hits.size:
+            k = hits[0]
+            if stop_hit[k]:
+                reason = STOP_LOSS
+            elif take_hit[k]:
+                reason = TAKE_PROFIT
+            else:
+                reason = TRAILING_STOP
+            return i + k, reason, peaks[k]
+        peak_price = max(peak_price, prices.max())
+        i = end
+        chunk = min(chunk * 2, MAX_SCAN_CHUNK)
+    return n, 0, peak_price
+
+def intrabar_index(timestamp, bar_ns, sub_candles):
+    """Offset index from each bar into the lower-timeframe candles that fall inside it.
+
+    timestamp holds the bars' open times (int64 ns) and bar_ns their length; sub_candles is a lower-timeframe
+    OHLCV frame. Bar i covers sub-candles start[i]:end[i] (empty where the lower timeframe has a gap), and
+    bar[c] is the bar containing sub-candle c, or -1. Built once with searchsorted, so exit scans slice
+    plain arrays instead of filtering frames.
+    """
+    sub_ts = sub_candles['timestamp'].to_numpy(dtype='datetime64[ns]').view(np.int64)
+    bar = np.searchsorted(timestamp, sub_ts, side='right') - 1
+    covered = (bar >= 0) & (sub_ts < timestamp[np.maximum(bar, 0)] + bar_ns)
+    return {
+        'start': np.searchsorted(sub_ts, timestamp), 'end': np.searchsorted(sub_ts, timestamp + bar_ns),
+        'bar': np.where(covered, bar, -1),
+        'open': sub_candles['open'].to_numpy(dtype=np.float64),
+        'high': sub_candles['high'].to_numpy(dtype=np.float64),
+        'low': sub_candles['low'].to_numpy(dtype=np.float64)
+    }
+
+def _find_exit_intrabar(close, atr, stop_mult, start, entry_price, params, intrabar):
+    """Scan forward from start for the first lower-timeframe candle that crosses an exit level.
+
+    Levels inside bar k come from the last closed bar k - 1 (its ATR and regime, and the peak of closes up
+    to it), as the live stop monitor sees them. A sub-candle whose low crosses the stop-loss or trailing
+    stop exits there, at the level or at the sub-candle's open if it gapped through; when a sub-candle
+    crosses both a stop and the take-profit, the stop wins, since the order inside it is unknown. Bars with
+    no lower-timeframe candles fall back to _find_exit's close check, with that bar's own levels. Returns
+    (index, reason, exit_price) with index len(close) if the position is never closed.
+    """
+    n = len(close)
+    take_profit_atr = params['take_profit_atr']
+    trailing_factor = 1 - params['trailing_stop_percent']
+    sub_start, sub_end, sub_bar = intrabar['start'], intrabar['end'], intrabar['bar']
+    peak_price = entry_price
+    i = start
+    chunk = SCALAR_SCAN_CANDLES
+    while i < n:
+        end = min(i + chunk, n)
+        prev = slice(i - 1, end - 1)
+        peaks = np.maximum.accumulate(np.maximum(close[prev], peak_price))
+        stop_level = entry_price - atr[prev] * stop_mult[prev]
+        take_level = entry_price + take_profit_atr * atr[prev]
+        trail_level = peaks * trailing_factor
+
+        lo, hi = sub_start[i], sub_end[end - 1]
+        bars = sub_bar[lo:hi]
+        inside = bars >= 0
+        local = np.where(inside, bars - i, 0)
+        low, high = intrabar['low'][lo:hi], intrabar['high'][lo:hi]
+        stop_hit = inside & (low < stop_level[local])
+        trail_hit = inside & (low < trail_level[local])
+        take_hit = inside & (high > take_level[local])
+        sub_hits = np.flatnonzero(stop_hit | trail_hit | take_hit)
+        first_sub = local[sub_hits[0]] if sub_hits.size else end - i
+
+        # Bars without sub-candles use the close check exactly as _find_exit does: the bar's own ATR and regime
+        prices = close[i:end]
+        empty = sub_end[i:end] == sub_start[i:end]
+        close_stop = entry_price - atr[i:end] * stop_mult[i:end]
+        close_take = entry_price + take_profit_atr * atr[i:end]
+        close_hits = np.flatnonzero(empty & ((prices < close_stop) | (prices > close_take) | (prices < trail_level)))
+        if close_hits.size and close_hits[0] < first_sub:
+            k = close_hits[0]
+            reason = STOP_LOSS if prices[k] < close_stop[k] else TAKE_PROFIT if prices[k] > close_take[k] else TRAILING_STOP
+            return i + k, reason, float(prices[k])
+        if sub_hits.size:
+            c = sub_hits[0]
+            k = local[c]
+            sub_open = intrabar['open'][lo + c]
+            if stop_hit[c] or trail_hit[c]:
+                # Falling through both stops hits the higher one first
+                if stop_hit[c] and (not trail_hit[c] or stop_level[k] >= trail_level[k]):
+                    reason, level = STOP_LOSS, stop_level[k]
+                else:
+                    reason, level = TRAILING_STOP, trail_level[k]
+                return i + k, reason, float(min(level, sub_open))
+            return i + k, TAKE_PROFIT, float(max(take_level[k], sub_open))
+        peak_price = peaks[-1]
+        i = end
+        chunk = min(chunk * 2, MAX_SCAN_CHUNK)
+    return n, 0, None
+
+def run_engine(close, atr, signal, trend_regime, timestamp, params=None, intrabar=None):
+    """Run the ATR stop / take-profit / trailing-stop state machine over contiguous arrays.
+
+    Produces the same fills as the original per-candle loop, but jumps straight to the next signal while
+    flat and scans open positions for their exit candle in vectorized chunks. With an intrabar_index(),
+    exits fill at the first lower-timeframe candle crossing a level instead of at the bar's close.
+    Returns (trades, portfolio_values) where trades is a TRADE_DTYPE structured array.
+    """
+    p = default_params()
+    if params:
+        p.update(params)
+    n = len(close)
+    fee_rate = p['fee_rate']
+    cooldown_candles = int(p['cooldown'])
+    position_size_fraction = p['position_size_fraction']
+    choppy_position_size_fraction = p['choppy_position_size_fraction']
+    min_cash_fraction = p['min_cash_fraction']
+    stop_mult = np.where(trend_regime == 1, p['stop_loss_atr'], p['choppy_stop_loss_atr'])
+
+    signal_idx = np.flatnonzero(signal == 1).tolist()
+    # Every trade needs a signal candle, and every sell closes one buy
+    trades = np.zeros(min(n, 2 * len(signal_idx)), dtype=TRADE_DTYPE)
+    portfolio_values = np.empty(n, dtype=np.float64)
+    # Column views are much cheaper to write into than structured-array rows
+    t_number, t_type, t_timestamp = trades['trade_number'], trades['type'], trades['timestamp'].view(np.int64)
+    t_price, t_amount, t_value, t_fee = trades['price'], trades['amount'], trades['portfolio_value'], trades['fee']
+    t_reason, t_profit, t_regime, t_holding = trades['reason'], trades['profit_loss'], trades['regime'], trades['holding_period']
+
+    cash = p['initial_capital']
+    count = 0
+    i = 0
+    while i < n:
+        # Flat: nothing happens until the next signal candle
+        s = bisect_left(signal_idx, i)
+        if s == len(signal_idx):
+            portfolio_values[i:] = cash
+            break
+        j = signal_idx[s]
+        portfolio_values[i:j + 1] = cash
+        price = float(close[j])
+        portfolio_value = cash
+        regime = int(trend_regime[j])
+        trade_value = (position_size_fraction if regime == 1 else choppy_position_size_fraction) * portfolio_value
+        if cash < position_size_fraction * portfolio_value * min_cash_fraction or cash < trade_value:
+            i = j + 1
+            continue
+
+        amount = (trade_value / price) * (1 - fee_rate)
+        buy_fee = amount * price * fee_rate
+        t_number[count] = count + 1
+        t_type[count] = BUY
+        t_timestamp[count] = timestamp[j]
+        t_price[count] = price
+        t_amount[count] = amount
+        t_value[count] = portfolio_value
+        t_fee[count] = buy_fee
+        t_regime[count] = regime
+        count += 1
+        cash = cash - trade_value
+
+        # In position: locate the exit candle, then fill portfolio values up to it in one shot
+        if intrabar is None:
+            k, reason, _ = _find_exit(close, atr, stop_mult, j + 1, price, price, p)
+        else:
+            k, reason, exit_price = _find_exit_intrabar(close, atr, stop_mult, j + 1, price, p, intrabar)
+        portfolio_values[j + 1:k + 1] = cash + amount * close[j + 1:k + 1]
+        if k == n:
+            break
+
+        if intrabar is None:
+            exit_price = float(close[k])
+        else:
+            portfolio_values[k] = cash + amount * exit_price  # Marked at the fill, not the later close
+        fee = amount * exit_price * fee_rate
+        t_number[count] = count + 1
+        t_type[count] = SELL
+        t_timestamp[count] = timestamp[k]
+        t_price[count] = exit_price
+        t_amount[count] = amount
+        t_value[count] = portfolio_values[k]
+        t_fee[count] = fee
+        t_reason[count] = reason
+        t_profit[count] = (exit_price - price) * amount - fee - buy_fee
+        t_regime[count] = trend_regime[k]
+        t_holding[count] = int(timestamp[k] - timestamp[j]) / 1e9 / (3600 * 4)
+        count += 1
+        cash += amount * exit_price * (1 - fee_rate)
+
+        # Cooldown candles hold cash only
+        portfolio_values[k + 1:k + 1 + cooldown_candles] = cash
+        i = k + 1 + cooldown_candles
+
+    return trades[:count], portfolio_values
+
+def trades_to_records(trades):
+    """Convert a trade array into the list-of-dicts format used by the report and metrics code."""
+    records = []
+    for row in trades.tolist():
+        trade_number, trade_type, timestamp, price, amount, portfolio_value, fee, reason, profit_loss = row[:9]
+        record = {
+            'trade_number': trade_number, 'type': TRADE_TYPES[trade_type], 'timestamp': pd.Timestamp(timestamp),
+            'price': price, 'amount': amount, 'portfolio_value': portfolio_value, 'fee': fee
+        }
+        if trade_type == SELL:
+            record['reason'] = EXIT_REASONS[reason]
+        record['profit_loss'] = profit_loss
+        records.append(record)
+    return records
@@ -1,136 +1,55 @@
 import pandas as pd
 from src.data_handler import DataHandler
-from src.indicators import calculate_indicators
+from src.feature_store import load_features
 from src.ml_model import MLModel
-from src.trade_utils import execute_sell_trade, execute_buy_trade
-from src.report_utils import generate_html_report
-from src.config import INITIAL_CAPITAL, ML_FEATURES, TRANSACTION_FEE_RATE, POSITION_SIZE_FRACTION, TRAILING_STOP_PERCENT
-import xgboost as xgb
+from src.prediction_cache import cached_predict
+from src.backtest_engine import prepare_arrays, run_engine, trades_to_records, intrabar_index
+from src.metrics import compute_metrics
+from src.report_utils import write_report_files
+from src.resample import timeframe_ms
+from src.config import STRATEGY_COLUMNS, SIGNAL_THRESHOLD, BACKTEST_INTRABAR_TIMEFRAME
 import os
 
-def calculate_metrics(df, trades, trend_metrics):
-    """Calculate performance metrics from portfolio values and trades."""
-    returns = df['portfolio_value'].pct_change().dropna()
-    sharpe_ratio = returns.mean() / returns.std() * (252 ** 0.5) if len(returns) > 1 and returns.std() != 0 else 0.0
-    if sharpe_ratio == 0:
-        print("Warning: Sharpe Ratio set to 0 due to insufficient returns data or zero standard deviation.")
-    
-    cumulative_max = df['portfolio_value'].cummax()
-    drawdowns = (cumulative_max - df['portfolio_value']) / cumulative_max
-    max_drawdown = drawdowns.max() if not drawdowns.empty else 0.0
-    final_value = df['portfolio_value'].iloc[-1]
-    total_return = (final_value - INITIAL_CAPITAL) / INITIAL_CAPITAL * 100
-    total_fees = sum(trade['fee'] for trade in trades)
-    
-    buy_trades = [t for t in trades if t['type'] == 'buy']
-    sell_trades = [t for t in trades if t['type'] == 'sell']
-    profitable_trades = sum(1 for i, sell in enumerate(sell_trades) if i < len(buy_trades) and sell['price'] > buy_trades[i]['price'])
-    win_rate = (profitable_trades / len(sell_trades) * 100) if sell_trades else 0
-    
-    avg_holding_period = sum(trend_metrics['holding_periods']) / len(trend_metrics['holding_periods']) if trend_metrics['holding_periods'] else 0
-    profit_factor = trend_metrics['gross_profit'] / trend_metrics['gross_loss'] if trend_metrics['gross_loss'] != 0 else float('inf')
-    trending_win_rate = (trend_metrics['trend_regime_wins']['trending'] / trend_metrics['trend_regime_trades']['trending'] * 100) if trend_metrics['trend_regime_trades']['trending'] > 0 else 0
-    choppy_win_rate = (trend_metrics['trend_regime_wins']['choppy'] / trend_metrics['trend_regime_trades']['choppy'] * 100) if trend_metrics['trend_regime_trades']['choppy'] > 0 else 0
+def backtest(timeframe='4h', predictions=None, intrabar_timeframe=BACKTEST_INTRABAR_TIMEFRAME):
+    """Run a backtest with ML signals and ATR-based exits.
 
-    return {
-        'sharpe_ratio': sharpe_ratio, 'max_drawdown': max_drawdown, 'total_return': total_return,
-        'total_fees': total_fees, 'buy_trades': buy_trades, 'sell_trades': sell_trades, 'win_rate': win_rate,
-        'avg_holding_period': avg_holding_period, 'profit_factor': profit_factor,
-        'max_consecutive_wins': trend_metrics['max_consecutive_wins'], 'max_consecutive_losses': trend_metrics['max_consecutive_losses'],
-        'trending_win_rate': trending_win_rate, 'choppy_win_rate': choppy_win_rate,
-        'final_value': final_value,
-        'trend_regime_trades': trend_metrics['trend_regime_trades']
-    }
-
-def backtest(timeframe='4h'):
-    """Run a backtest with ML signals and ATR-based exits."""
+    predictions is an optional pred_prob Series indexed by timestamp (e.g. walk-forward
+    out-of-sample output); the backtest then covers only those candles instead of scoring the saved model.
+    With intrabar_timeframe (e.g. '15m'), stops and take-profits fill at the first candle of that
+    timeframe crossing them inside each bar rather than at the bar's close.
+    """
     handler = DataHandler()
     df = handler.load_historical_data(timeframe)
-    df = calculate_indicators(df)
-    model = MLModel()
-    X = df[ML_FEATURES]
-    df['pred_prob'] = model.predict(xgb.DMatrix(X))
-    df['signal'] = (df['pred_prob'] > 0.65).astype(int)  # Reverted to 0.65
+    df = load_features(df, STRATEGY_COLUMNS)
+    if predictions is None:
+        df['pred_prob'] = cached_predict(MLModel(), df, label=timeframe)
+    else:
+        df = df[df['timestamp'].isin(predictions.index)].copy()
+        df['pred_prob'] = predictions.reindex(pd.DatetimeIndex(df['timestamp'])).to_numpy()
+    df['signal'] = (df['pred_prob'] > SIGNAL_THRESHOLD).astype(int)
     df['trend_regime'] = (df['SMA50'] > df['SMA200']).astype(int)
 
-    cash = INITIAL_CAPITAL
-    position = 0
-    portfolio_values = []
-    trades = []
-    trade_number = 0
-    active_trade = None
-    peak_price = 0
-    cooldown = 0
-
-    trend_metrics = {
-        'gross_profit': 0, 'gross_loss': 0, 'consecutive_wins': 0, 'consecutive_losses': 0,
-        'max_consecutive_wins': 0, 'max_consecutive_losses': 0, 'holding_periods': [],
-        'trend_regime_profits': {'trending': 0, 'choppy': 0}, 'trend_regime_trades': {'trending': 0, 'choppy': 0},
-        'trend_regime_wins': {'trending': 0, 'choppy': 0}, 'regime': None
-    }
-
-    for i in range(len(df)):
-        price = df['close'].iloc[i]
-        timestamp = df['timestamp'].iloc[i]
-        signal = df['signal'].iloc[i]
-        atr = df['ATR'].iloc[i]
-        portfolio_value = cash + position * price
-        regime = 'trending' if df['trend_regime'].iloc[i] == 1 else 'choppy'
-        trend_metrics['regime'] = regime
-        portfolio_values.append(portfolio_value)
-
-        if i % 100 == 0:
-            print(f"Candle {i}: Timestamp={timestamp}, Price={price:.2f}, Portfolio Value={portfolio_value:.2f}, "
-                  f"Position={position:.6f}, Signal={signal}, ATR={atr:.2f}, Regime={regime}")
-
-        if cooldown > 0:
-            cooldown -= 1
-            continue
-
-        if position > 0 and active_trade:
-            stop_loss_multiplier = 0.5 if regime == 'choppy' else 1.0  # Changed to 0.5x ATR in choppy
-            if price < active_trade['price'] - atr * stop_loss_multiplier:
-                trade, cash_gain, cooldown = execute_sell_trade(trade_number + 1, active_trade, price, position, timestamp, portfolio_value, 'stop-loss', trend_metrics)
-                trades.append(trade)
-                cash += cash_gain
-                trade_number += 1
-                position = 0
-                active_trade = None
-                peak_price = 0
-            elif price > active_trade['price'] + 5 * atr:
-                trade, cash_gain, cooldown = execute_sell_trade(trade_number + 1, active_trade, price, position, timestamp, portfolio_value, 'take-profit', trend_metrics)
-                trades.append(trade)
-                cash += cash_gain
-                trade_number += 1
-                position = 0
-                active_trade = None
-                peak_price = 0
-            elif price < peak_price * (1 - TRAILING_STOP_PERCENT):
-                trade, cash_gain, cooldown = execute_sell_trade(trade_number + 1, active_trade, price, position, timestamp, portfolio_value, 'trailing-stop', trend_metrics)
-                trades.append(trade)
-                cash += cash_gain
-                trade_number += 1
-                position = 0
-                active_trade = None
-                peak_price = 0
-            else:
-                peak_price = max(peak_price, price)
-        else:
-            trade_info, amount, new_cash = execute_buy_trade(trade_number + 1, signal, price, portfolio_value, cash, timestamp, regime)
-            if trade_info:
-                trades.append(trade_info)
-                position = amount
-                cash = new_cash
-                active_trade = trade_info
-                peak_price = price
-                trade_number += 1
-
-    df['portfolio_value'] = portfolio_values
-    metrics = calculate_metrics(df, trades, trend_metrics)
-    html_content = generate_html_report(timeframe, trades, metrics)
-    
-    report_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'reports', f"backtest_report_{timeframe}.html")
-    os.makedirs(os.path.dirname(report_path), exist_ok=True)
-    with open(report_path, "w") as f:
-        f.write(html_content)
-    print(f"Backtest completed on {timeframe}. Open '{report_path}' in your browser to view the results.")
\ No newline at end of file
+    arrays = prepare_arrays(df)
+    intrabar = None
+    if intrabar_timeframe:
+        sub_candles = handler.load_historical_data(intrabar_timeframe)
+        intrabar = intrabar_index(arrays['timestamp'], timeframe_ms(timeframe) * 10**6, sub_candles)
+        print(f"Intrabar fills from {len(sub_candles)} {intrabar_timeframe} candles "
+              f"({int((intrabar['end'] == intrabar['start']).sum())} of {len(df)} bars have none and fall back to closes)")
+    trade_array, portfolio_values = run_engine(**arrays, intrabar=intrabar)
+    trades = trades_to_records(trade_array)
+    print(f"Simulated {len(df)} candles: {len(trades)} trades, final portfolio value {portfolio_values[-1]:.2f}")
+
+    metrics = compute_metrics(portfolio_values, trade_array, arrays['timestamp'], arrays['trend_regime'])
+
+    report_name = f"backtest_report_{timeframe}"
+    if predictions is not None:
+        report_name += "_walk_forward"
+    if intrabar_timeframe:
+        report_name += f"_intrabar_{intrabar_timeframe}"
+    report_name += ".html"
+    report_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'reports', report_name)
+    written = write_report_files(report_path, timeframe, trades, metrics, df['timestamp'], portfolio_values)
+    print(f"Backtest completed on {timeframe}. Open '{report_path}' in your browser to view the results "
+          f"(also written: {', '.join(os.path.basename(path) for path in written[1:])}).")
+    return trades, metrics
\ No newline at end of file
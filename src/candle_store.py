@@ -0,0 +1,186 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+
+STORE_ROOT = os.path.join('data', 'store')  # Relative to the working directory, like data/raw and data/processed
+COLUMNS = ('timestamp', 'open', 'high', 'low', 'close', 'volume')
+COLUMN_DTYPES = {'timestamp': np.dtype('<i8'), 'open': np.dtype('<f8'), 'high': np.dtype('<f8'),
+                 'low': np.dtype('<f8'), 'close': np.dtype('<f8'), 'volume': np.dtype('<f8')}
+MANIFEST = 'manifest.json'
+STORE_VERSION = 1
+
+def candle_key(symbol, timeframe, suffix=None):
+    """Name of a candle series in the store, e.g. BTC_USDT_4h or BTC_USDT_4h_stress_flash_crash."""
+    key = f"{symbol.replace('/', '_')}_{timeframe}"
+    return f"{key}_{suffix}" if suffix else key
+
+def frame_to_arrays(df):
+    """Convert an OHLCV DataFrame (datetime or epoch-ms timestamps) into store column arrays."""
+    timestamps = df['timestamp']
+    if pd.api.types.is_datetime64_any_dtype(timestamps):
+        timestamps = timestamps.astype('datetime64[ms]').astype('int64')
+    arrays = {'timestamp': np.ascontiguousarray(np.asarray(timestamps, dtype=COLUMN_DTYPES['timestamp']))}
+    for column in COLUMNS[1:]:
+        arrays[column] = np.ascontiguousarray(df[column].to_numpy(dtype=COLUMN_DTYPES[column]))
+    return arrays
+
+def arrays_to_frame(arrays):
+    """Build the OHLCV DataFrame the rest of the code expects from store column arrays."""
+    data = {'timestamp': pd.to_datetime(np.asarray(arrays['timestamp']), unit='ms')}
+    for column in COLUMNS[1:]:
+        data[column] = np.asarray(arrays[column])
+    return pd.DataFrame(data)
+
+class CandleStore:
+    """Columnar OHLCV storage: one raw little-endian binary file per column plus a JSON manifest.
+
+    Timestamps are int64 epoch milliseconds and prices/volume float64, so loading is a memory map
+    with no parsing. The manifest row count is the source of truth, which makes appends crash-safe:
+    bytes written past it by an interrupted append are ignored and overwritten by the next one.
+    """
+
+    def __init__(self, root=STORE_ROOT):
+        self.root = root
+
+    def path(self, key):
+        return os.path.join(self.root, key)
+
+    def exists(self, key):
+        return os.path.exists(os.path.join(self.path(key), MANIFEST))
+
+    def manifest(self, key):
+        with open(os.path.join(self.path(key), MANIFEST)) as f:
+            return json.load(f)
+
+    def _write_manifest(self, key, manifest):
+        path = os.path.join(self.path(key), MANIFEST)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def read_arrays(self, key):
+        """Memory-map every column of a series read-only; returns {column: array}."""
+        manifest = self.manifest(key)
+        rows = manifest['rows']
+        arrays = {}
+        for column in COLUMNS:
+            dtype = np.dtype(manifest['columns'][column])
+            if rows == 0:
+                arrays[column] = np.empty(0, dtype=dtype)
+            else:
+                arrays[column] = np.memmap(os.path.join(self.path(key), f"{column}.bin"), dtype=dtype, mode='r', shape=(rows,))
+        return arrays
+
+    def load(self, key):
+        """Load a series as an OHLCV DataFrame."""
+        return arrays_to_frame(self.read_arrays(key))
+
+    def last_timestamp(self, key):
+        """Last stored epoch-ms timestamp, or None if the series is missing or empty."""
+        if not self.exists(key):
+            return None
+        return self.manifest(key).get('last_timestamp')
+
+    def write(self, key, data, **metadata):
+        """Replace a series with the given DataFrame or column arrays (sorted, de-duplicated by timestamp)."""
+        arrays = frame_to_arrays(data) if isinstance(data, pd.DataFrame) else dict(data)
+        timestamps = np.asarray(arrays['timestamp'], dtype=COLUMN_DTYPES['timestamp'])
+        order = np.argsort(timestamps, kind='stable')
+        timestamps = timestamps[order]
+        keep = np.ones(len(timestamps), dtype=bool)
+        keep[1:] = timestamps[1:] != timestamps[:-1]
+        os.makedirs(self.path(key), exist_ok=True)
+        # Write every column before swapping any in, so a crash mid-write leaves the old series intact
+        for column in COLUMNS:
+            values = np.ascontiguousarray(np.asarray(arrays[column], dtype=COLUMN_DTYPES[column])[order][keep])
+            with open(os.path.join(self.path(key), f"{column}.bin.tmp"), 'wb') as f:
+                values.tofile(f)
+                f.flush()
+                os.fsync(f.fileno())
+        for column in COLUMNS:
+            os.replace(os.path.join(self.path(key), f"{column}.bin.tmp"), os.path.join(self.path(key), f"{column}.bin"))
+        timestamps = timestamps[keep]
+        manifest = self.manifest(key) if self.exists(key) else {}
+        manifest.update(metadata)
+        manifest.update(self._describe(key, timestamps))
+        self._write_manifest(key, manifest)
+        return len(timestamps)
+
+    def append(self, key, data):
+        """Append candles newer than the last stored one; returns the number of rows added."""
+        if not self.exists(key):
+            return self.write(key, data)
+        arrays = frame_to_arrays(data) if isinstance(data, pd.DataFrame) else dict(data)
+        manifest = self.manifest(key)
+        last = manifest.get('last_timestamp')
+        timestamps = np.asarray(arrays['timestamp'], dtype=COLUMN_DTYPES['timestamp'])
+        order = np.argsort(timestamps, kind='stable')
+        timestamps = timestamps[order]
+        keep = np.ones(len(timestamps), dtype=bool)
+        keep[1:] = timestamps[1:] != timestamps[:-1]
+        if last is not None:
+            keep &= timestamps > last
+        if not keep.any():
+            return 0
+        rows = manifest['rows']
+        for column in COLUMNS:
+            dtype = COLUMN_DTYPES[column]
+            values = np.ascontiguousarray(np.asarray(arrays[column], dtype=dtype)[order][keep])
+            with open(os.path.join(self.path(key), f"{column}.bin"), 'r+b') as f:
+                f.truncate(rows * dtype.itemsize)  # Drop bytes left behind by an interrupted append
+                f.seek(rows * dtype.itemsize)
+                values.tofile(f)
+                f.flush()
+                os.fsync(f.fileno())
+        added = int(keep.sum())
+        manifest['rows'] = rows + added
+        manifest['last_timestamp'] = int(timestamps[keep][-1])
+        if manifest.get('first_timestamp') is None:
+            manifest['first_timestamp'] = int(timestamps[keep][0])
+        self._write_manifest(key, manifest)
+        return added
+
+    def write_metadata(self, key, **metadata):
+        """Update extra manifest fields without touching the data."""
+        manifest = self.manifest(key)
+        manifest.update(metadata)
+        self._write_manifest(key, manifest)
+
+    def _describe(self, key, timestamps):
+        return {
+            'version': STORE_VERSION, 'key': key, 'rows': int(len(timestamps)),
+            'columns': {column: COLUMN_DTYPES[column].str for column in COLUMNS},
+            'first_timestamp': int(timestamps[0]) if len(timestamps) else None,
+            'last_timestamp': int(timestamps[-1]) if len(timestamps) else None
+        }
+
+def convert_csv(csv_path, store=None, key=None):
+    """One-shot conversion of a data_<key>.csv OHLCV file into the store; returns the key written."""
+    store = store or CandleStore()
+    if key is None:
+        key = os.path.splitext(os.path.basename(csv_path))[0]
+        key = key[len('data_'):] if key.startswith('data_') else key
+    df = pd.read_csv(csv_path)
+    df['timestamp'] = pd.to_datetime(df['timestamp'])
+    rows = store.write(key, df, source=os.path.basename(csv_path))
+    print(f"Converted {csv_path} -> {store.path(key)} ({rows} rows)")
+    return key
+
+def find_gaps(timestamps, step_ms):
+    """Locate missing candles in a sorted timestamp array.
+
+    Returns (gaps, duplicates) where gaps is a list of [first_missing_ms, last_missing_ms] ranges
+    and duplicates is the number of repeated timestamps.
+    """
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    if len(timestamps) < 2:
+        return [], 0
+    diffs = np.diff(timestamps)
+    duplicates = int((diffs == 0).sum())
+    gap_idx = np.flatnonzero(diffs > step_ms)
+    gaps = [[int(timestamps[i] + step_ms), int(timestamps[i + 1] - step_ms)] for i in gap_idx]
+    return gaps, duplicates
@@ -0,0 +1,33 @@
+import asyncio
+import time
+
+def next_bar_close(now_ms, timeframe_ms):
+    """Epoch-ms close time of the bar that is open at now_ms (bars are aligned to the epoch)."""
+    return (now_ms // timeframe_ms + 1) * timeframe_ms
+
+class SystemClock:
+    """Wall-clock time for live trading."""
+
+    def now_ms(self):
+        return int(time.time() * 1000)
+
+    async def sleep_until(self, target_ms):
+        delay = (target_ms - self.now_ms()) / 1000
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+class SimulatedClock:
+    """Virtual time for offline runs: sleeping jumps straight to the target time, advance() moves it forward."""
+
+    def __init__(self, start_ms):
+        self.current_ms = int(start_ms)
+
+    def now_ms(self):
+        return self.current_ms
+
+    def advance(self, ms):
+        self.current_ms += int(ms)
+
+    async def sleep_until(self, target_ms):
+        self.current_ms = max(self.current_ms, int(target_ms))
+        await asyncio.sleep(0)  # Still yield to the event loop like a real sleep would
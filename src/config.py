@@ -15,6 +15,18 @@ INITIAL_CAPITAL = 10000  # Starting capital in USDT
 POSITION_SIZE_FRACTION = 0.70  # Position size as 70% of current portfolio value (replaces POSITION_SIZE_PERCENT)
 TRANSACTION_FEE_RATE = 0.000775  # Bybit fee rate (0.0775% per trade)
 
+# Historical data download parameters
+BASE_TIMEFRAME = '15m'  # Finest timeframe downloaded; coarser candles can be aggregated from it
+DERIVE_FROM_BASE_TIMEFRAME = True  # Build coarser timeframes locally from BASE_TIMEFRAME candles instead of downloading them
+HISTORY_START_DATE = '2023-03-11 00:00:00'  # First candle fetched when a series is synced from scratch
+FETCH_MAX_RETRIES = 5  # Attempts per OHLCV page before a sync gives up (progress is kept)
+FETCH_RETRY_DELAY = 2  # Seconds before the first retry, doubled on each further attempt
+FETCH_MAX_RATE_LIMITED = 10  # 429 responses tolerated for one OHLCV page before the fetch gives up
+ASYNC_FETCH_RATE = 10  # Requests per second shared by all concurrent download jobs (Bybit allows ~10/s per IP for market data)
+ASYNC_FETCH_BURST = 10  # Requests that may be sent back to back before the rate applies
+ASYNC_FETCH_CONCURRENCY = 8  # Maximum requests in flight at once
+ASYNC_FETCH_SEGMENT_PAGES = 5  # Pages per independently fetched segment of one series
+
 # Indicator parameters for technical analysis
 SMA_PERIOD = 50  # Period for Simple Moving Average
 RSI_PERIOD = 20  # Period for Relative Strength Index, tuned for 4h timeframe
@@ -32,14 +44,100 @@ ML_FEATURES = [
     'volume_momentum', 'price_volume_corr', 'MACD_histogram_slope'
     # Matches 101.93%, 77.55%, 66.48%, and 55.40% feature set
 ]
+STRATEGY_COLUMNS = ML_FEATURES + ['ATR', 'SMA50', 'SMA200']  # Model inputs plus the ATR stops and the SMA50/SMA200 regime
 ML_TEST_SIZE = 0.15  # Fraction of data for test set (15%)
 ML_N_ESTIMATORS = 500  # Number of boosting rounds (unused in xgb.train, kept for reference)
 ML_MAX_DEPTH = 6  # Maximum tree depth for XGBoost
 ML_LEARNING_RATE = 0.01  # Learning rate (unused in xgb.train, kept for reference)
 EARLY_STOPPING_ROUNDS = 50  # Rounds for early stopping in training
+ML_VALIDATION_SIZE = 0.1765  # Fraction of the non-test rows used for validation (0.1765 of 0.85 = 15% of total)
+ML_TRAIN_BATCH_ROWS = 0  # If > 0, feed training data to xgboost in float32 batches of this many rows instead of one matrix
+# Hyperparameter search (python -m src.main tune): name -> (low, high, scale) with scale 'int', 'float' or 'log'
+TUNE_SPACE = {
+    'learning_rate': (0.002, 0.1, 'log'),
+    'max_depth': (3, 10, 'int'),
+    'min_child_weight': (1, 50, 'log'),
+    'subsample': (0.5, 1.0, 'float'),
+    'colsample_bytree': (0.4, 1.0, 'float')
+}
+TUNE_TRIALS = 60  # Trials per tune run (a resumed search continues towards this total)
+TUNE_CONCURRENCY = 4  # Trials trained at once; the cores are split evenly between them
+TUNE_PRUNE_WARMUP_TRIALS = 5  # Trials that must report a round before others can be pruned against it
+TUNE_PRUNE_ROUNDS = (50, 100, 200, 400, 800)  # Rounds at which a trial worse than the median so far is stopped
+WALK_FORWARD_TRAIN_CANDLES = 3000  # Initial (expanding) or fixed (rolling) training window per fold
+WALK_FORWARD_TEST_CANDLES = 500  # Out-of-sample candles predicted by each fold
+WALK_FORWARD_MODE = 'expanding'  # 'expanding' keeps all history before each test window, 'rolling' only the last window
+WALK_FORWARD_VALIDATION_FRACTION = 0.15  # Tail of each training window held out for early stopping
 
 # Risk management parameters
 STOP_LOSS_PERCENT = 0.05  # Fixed stop-loss at 5% (unused with ATR-based stop)
 DAILY_LOSS_LIMIT = 0.05  # Daily loss limit at 5% (not implemented in backtest)
 TRAILING_STOP_PERCENT = 0.03  # Trailing stop at 3% from peak
-TAKE_PROFIT_PERCENT = 0.05  # Fixed take-profit at 5% (unused with ATR-based profit)
\ No newline at end of file
+TAKE_PROFIT_PERCENT = 0.05  # Fixed take-profit at 5% (unused with ATR-based profit)
+ATR_STOP_LOSS_MULTIPLIER = 1.0  # Stop-loss distance in ATRs below entry (trending regime)
+ATR_STOP_LOSS_MULTIPLIER_CHOPPY = 0.5  # Tighter 0.5x ATR stop-loss in choppy regime
+ATR_TAKE_PROFIT_MULTIPLIER = 5  # Take-profit distance in ATRs above entry
+CHOPPY_POSITION_SIZE_FRACTION = 0.70  # Position size as 70% of portfolio value in choppy regime
+MIN_CASH_FRACTION = 0.70  # Minimum cash, as a fraction of the target position, required to open a trade
+COOLDOWN_CANDLES = 2  # Candles to wait after any exit before trading again
+
+# Signal parameters
+SIGNAL_THRESHOLD = 0.65  # Predicted probability above which a buy signal is generated
+
+# Live trading parameters
+LIVE_SEED_CANDLES = 1000  # Closed candles used to seed the streaming indicators on start-up
+LIVE_UPDATE_CANDLES = 5  # Recent candles fetched each cycle to pick up newly closed ones
+LIVE_CLOSE_GRACE_SECONDS = 5  # Wait this long after each candle close before fetching, so the exchange has published it
+LIVE_FETCH_RETRIES = 3  # Extra fetches when the just-closed candle is not available yet
+LIVE_FETCH_RETRY_SECONDS = 5  # Delay between those fetches
+STOP_MONITOR_POLL_SECONDS = 1  # Ticker poll interval for intrabar stop checks while a position is open
+STOP_MONITOR_LATENCY_BUDGET_MS = 250  # Tick-to-order time above which an intrabar exit is logged as slow
+LIVE_SNAPSHOT_PATH = os.path.join('data', 'live', 'live_state.pkl')  # Trader + indicator state, rewritten atomically after every cycle
+LEDGER_RECONCILE_SECONDS = 6 * 3600  # Balance checks against the exchange between fill-driven ledger updates
+LEDGER_DRIFT_TOLERANCE = 1e-6  # Relative ledger/exchange difference reported as drift on reconcile
+MODEL_POLL_SECONDS = 30  # How often LiveTrader's background watcher checks the model registry for a new version
+REPLAY_PRICE_TOLERANCE = 1e-9  # Relative fill-price difference allowed when diffing replayed trades against backtest()
+REPLAY_AMOUNT_TOLERANCE = 1e-3  # Relative size difference allowed: the exchange charges fees on top of cost, the backtest nets them from size
+
+# Backtest fills
+BACKTEST_INTRABAR_TIMEFRAME = None  # e.g. '15m': resolve stops/take-profits on these candles inside each bar; None fills at bar closes
+
+# Backtest report parameters
+REPORT_CHART_POINTS = 2000  # Max points per equity/drawdown series in the report chart (min/max decimated)
+REPORT_PAGE_SIZE = 100  # Trade rows shown per page in the HTML report
+REPORT_CHUNK_ROWS = 10000  # Trade rows serialized per write while streaming the report
+METRICS_ROLLING_WINDOW = 180  # Bars per window for rolling Sharpe/Sortino/drawdown/exposure (30 days of 4h candles)
+
+# Parameter sweep grid (python -m src.main sweep); keys are backtest engine parameters plus the signal threshold
+SWEEP_GRID = {
+    'signal_threshold': [0.55, 0.60, 0.65, 0.70, 0.75],
+    'stop_loss_atr': [0.5, 1.0, 1.5],
+    'choppy_stop_loss_atr': [0.25, 0.5, 1.0],
+    'take_profit_atr': [3, 5, 7],
+    'trailing_stop_percent': [0.02, 0.03, 0.05],
+    'position_size_fraction': [0.5, 0.7, 0.9],
+    'cooldown': [0, 2, 4]
+}
+SWEEP_RANK_BY = 'total_return'  # Metric used to rank sweep results
+
+# Portfolio backtest (python -m src.main portfolio): the same model over a basket of pairs sharing INITIAL_CAPITAL
+PORTFOLIO_SYMBOLS = ['BTC/USDT', 'ETH/USDT', 'SOL/USDT', 'XRP/USDT', 'BNB/USDT']
+MAX_TOTAL_EXPOSURE = 0.95  # Cap on open positions as a fraction of portfolio value; concurrent entries are scaled down to fit
+
+# Monte Carlo stress test (python -m src.main stress): synthetic paths bootstrapped from history
+STRESS_PATHS = 1000  # Synthetic price paths per run
+STRESS_BARS = 2400  # Candles per path, including the ~200 consumed by indicator warm-up
+STRESS_SEED = 42  # Same seed, same paths
+STRESS_BLOCK_BARS = 24  # Block bootstrap length; whole blocks keep short-range autocorrelation and volatility clustering
+STRESS_REGIME_MEAN_BARS = 120  # Mean length of a volatility regime (geometric)
+STRESS_HIGH_VOL_PROBABILITY = 0.2  # Chance that a volatility regime is a high-volatility one
+STRESS_HIGH_VOL_MULTIPLIER = 2.5  # Return and range scale in high-volatility regimes
+STRESS_CRASH_PROBABILITY = 0.0005  # Per-candle chance of an injected flash crash
+STRESS_CRASH_DEPTH = (0.10, 0.30)  # Flash crash drop, drawn uniformly from this range
+STRESS_CRASH_RECOVERY = 0.5  # Fraction of a crash's log drop recovered on the next candle
+STRESS_CRASH_VOLUME_MULTIPLIER = 3  # Volume scale on crash candles
+STRESS_PATHS_PER_TASK = 20  # Paths per worker task; their features are scored with one model call
+
+# Feature store (cached indicator frames under data/features)
+FEATURE_STORE_MAX_BYTES = 2 * 1024 ** 3  # Least recently used entries are evicted above this size
+FEATURE_WARMUP_CANDLES = 2000  # Candles recomputed before new ones when extending a cached entry; EMA/ATR memory is negligible past this
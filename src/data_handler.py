@@ -1,82 +1,199 @@
 import ccxt
+import numpy as np
 import pandas as pd
-from src.config import SYMBOL  # Import SYMBOL from src.config
+from src.config import SYMBOL, HISTORY_START_DATE, FETCH_MAX_RETRIES, FETCH_RETRY_DELAY, BASE_TIMEFRAME, DERIVE_FROM_BASE_TIMEFRAME
+from src.candle_store import CandleStore, COLUMNS, candle_key, convert_csv, find_gaps, frame_to_arrays
+from src.resample import can_resample, resample_arrays, timeframe_ms
+from src.exchange import get_exchange
 import os
 import time
-from dotenv import load_dotenv
-
-# Load environment variables from .env in the root directory (consistent with config.py)
-load_dotenv(os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env'))
 
 class DataHandler:
-    def __init__(self):
-        self.exchange = ccxt.bybit({
-            'apiKey': os.environ.get('BYBIT_API_KEY'),
-            'secret': os.environ.get('BYBIT_API_SECRET'),
-            'enableRateLimit': True
-        })
-
-    def fetch_historical_data(self, timeframe, start_date='2023-03-11 00:00:00', limit_per_call=1000):
-        """Fetch historical OHLCV data for a given timeframe and save to CSV."""
-        print(f"Fetching {timeframe} historical data from {start_date}...")
-        start_timestamp = int(pd.to_datetime(start_date).timestamp() * 1000)
-        end_timestamp = int(time.time() * 1000)
-        all_ohlcv = []
-        since = start_timestamp
+    def __init__(self, exchange=None, store=None, symbol=SYMBOL):
+        self.exchange = exchange or get_exchange()  # Process-wide client shared with LiveTrader
+        self.store = store or CandleStore()
+        self.symbol = symbol
 
-        while since < end_timestamp:
+    def _fetch_page(self, timeframe, since, limit):
+        """Fetch one OHLCV page, retrying network errors with exponential backoff."""
+        for attempt in range(FETCH_MAX_RETRIES):
             try:
-                ohlcv = self.exchange.fetch_ohlcv(SYMBOL, timeframe, since=since, limit=limit_per_call)
-                if not ohlcv:
-                    break
-                all_ohlcv.extend(ohlcv)
-                since = ohlcv[-1][0] + 1
-                print(f"Fetched {len(ohlcv)} candles up to {pd.to_datetime(since, unit='ms')}")
-                time.sleep(1)
-            except Exception as e:
-                print(f"Error fetching {timeframe} data: {e}")
+                return self.exchange.fetch_ohlcv(self.symbol, timeframe, since=since, limit=limit)
+            except ccxt.NetworkError as e:
+                if attempt == FETCH_MAX_RETRIES - 1:
+                    raise
+                delay = FETCH_RETRY_DELAY * 2 ** attempt
+                print(f"Error fetching {timeframe} data since {pd.to_datetime(since, unit='ms')}: {e}. Retrying in {delay}s...")
+                time.sleep(delay)
+
+    def _iter_pages(self, timeframe, since, until, limit_per_call):
+        """Yield pages of closed candles with since <= timestamp < until."""
+        timeframe_ms = self.exchange.parse_timeframe(timeframe) * 1000
+        last_closed = self.exchange.milliseconds() - timeframe_ms  # Candles opened after this are still forming
+        while since < until:
+            ohlcv = self._fetch_page(timeframe, since, limit_per_call)
+            if not ohlcv:
+                break
+            page = [row for row in ohlcv if since <= row[0] < until and row[0] <= last_closed]
+            if page:
+                yield page
+            if ohlcv[-1][0] < since or ohlcv[-1][0] >= until or ohlcv[-1][0] > last_closed:
                 break
+            since = ohlcv[-1][0] + 1
 
-        if not all_ohlcv:
-            print(f"No {timeframe} data fetched.")
-            return pd.DataFrame()
+    def sync_historical_data(self, timeframe, start_date=HISTORY_START_DATE, limit_per_call=1000, retry_known_gaps=False):
+        """Bring the stored series up to date: fetch only candles newer than the last stored one, then backfill gaps.
 
-        df = pd.DataFrame(all_ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-        df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
-        print(f"Total {timeframe} data points fetched: {len(df)}")
+        Every page is appended to the store as soon as it arrives, so an interrupted download resumes
+        from the last saved candle on the next run.
+        """
+        key = candle_key(self.symbol, timeframe)
+        timeframe_ms = self.exchange.parse_timeframe(timeframe) * 1000
+        start_timestamp = int(pd.to_datetime(start_date).timestamp() * 1000)
+        last_timestamp = self.store.last_timestamp(key)
+        since = start_timestamp if last_timestamp is None else last_timestamp + timeframe_ms
+        print(f"Syncing {timeframe} data for {self.symbol} from {pd.to_datetime(since, unit='ms')}...")
+
+        added = 0
+        try:
+            for page in self._iter_pages(timeframe, since, self.exchange.milliseconds(), limit_per_call):
+                added += self.store.append(key, pd.DataFrame(page, columns=COLUMNS))
+                print(f"Fetched {len(page)} candles up to {pd.to_datetime(page[-1][0], unit='ms')}")
+        except ccxt.BaseError as e:
+            print(f"Sync of {timeframe} data interrupted after {added} new candles: {e}. Run again to resume.")
+            raise
+        if self.store.exists(key):
+            added += self.repair_gaps(timeframe, start_timestamp, limit_per_call, retry_known_gaps)
+        print(f"Sync of {timeframe} data complete: {added} candles added.")
+        return self.store.load(key) if self.store.exists(key) else pd.DataFrame()
+
+    def repair_gaps(self, timeframe, start_timestamp=None, limit_per_call=1000, retry_known_gaps=False):
+        """Detect missing or duplicated candles in the stored series and backfill the gaps from the exchange.
+
+        Gaps the exchange has no data for are recorded in the manifest so later syncs do not re-request them
+        (pass retry_known_gaps=True to try them again). Returns the number of candles added.
+        """
+        key = candle_key(self.symbol, timeframe)
+        timeframe_ms = self.exchange.parse_timeframe(timeframe) * 1000
+        manifest = self.store.manifest(key)
+        arrays = {column: np.array(values) for column, values in self.store.read_arrays(key).items()}
+        gaps, duplicates = find_gaps(arrays['timestamp'], timeframe_ms)
+        if start_timestamp is not None and len(arrays['timestamp']) and start_timestamp < arrays['timestamp'][0]:
+            gaps.insert(0, [start_timestamp, int(arrays['timestamp'][0]) - timeframe_ms])
+        known_gaps = [] if retry_known_gaps else manifest.get('known_gaps', [])
+        gaps = [gap for gap in gaps if gap not in known_gaps]
+        if duplicates:
+            print(f"Found {duplicates} duplicate {timeframe} candles; they will be dropped.")
+        if not gaps and not duplicates:
+            return 0
+
+        fetched = []
+        for first_missing, last_missing in gaps:
+            print(f"Backfilling {timeframe} gap {pd.to_datetime(first_missing, unit='ms')} -> {pd.to_datetime(last_missing, unit='ms')}")
+            for page in self._iter_pages(timeframe, first_missing, last_missing + timeframe_ms, limit_per_call):
+                fetched.extend(page)
+        rows_before = manifest['rows']
+        if fetched:
+            new = frame_to_arrays(pd.DataFrame(fetched, columns=COLUMNS))
+            arrays = {column: np.concatenate([arrays[column], new[column]]) for column in COLUMNS}
+        # Whatever is still missing inside the requested ranges does not exist on the exchange
+        remaining, _ = find_gaps(np.unique(arrays['timestamp']), timeframe_ms)
+        still_missing = [gap for gap in remaining if any(gap[0] <= last and gap[1] >= first for first, last in gaps)]
+        rows = self.store.write(key, arrays, known_gaps=known_gaps + still_missing)
+        if still_missing:
+            print(f"{len(still_missing)} {timeframe} gaps are not available from the exchange and were recorded as known gaps.")
+        return rows - (rows_before - duplicates)  # Duplicates dropped by the rewrite are not losses
+
+    def fetch_historical_data(self, timeframe, start_date=HISTORY_START_DATE, limit_per_call=1000):
+        """Fetch historical OHLCV data for a given timeframe into the candle store (incrementally) and return it."""
+        df = self.sync_historical_data(timeframe, start_date, limit_per_call)
+        if df.empty:
+            print(f"No {timeframe} data fetched.")
+            return df
+        print(f"Total {timeframe} data points stored: {len(df)}")
         print("First few rows:")
         print(df.head())
-
-        filename = f"data/raw/data_{SYMBOL.replace('/', '_')}_{timeframe}.csv"  # Updated path
-        os.makedirs(os.path.dirname(filename), exist_ok=True)  # Ensure directory exists
-        df.to_csv(filename, index=False)
-        print(f"Saved {timeframe} data to {filename}")
         return df
 
+    def _ensure_series(self, key, csv_filename):
+        """True if the series is in the candle store, converting its legacy CSV on first use."""
+        if not self.store.exists(key) and os.path.exists(csv_filename):
+            print(f"Converting {csv_filename} to the candle store...")
+            convert_csv(csv_filename, self.store, key)
+        return self.store.exists(key)
+
+    def _load_series(self, key, csv_filename):
+        """Load a series from the candle store, converting its legacy CSV on first use."""
+        if not self._ensure_series(key, csv_filename):
+            return None
+        return self.store.load(key)
+
+    def _series_csv(self, key, period_name=None):
+        return f"data/processed/data_{key}.csv" if period_name else f"data/raw/data_{key}.csv"
+
+    def resample_series(self, timeframe, period_name=None, base_timeframe=BASE_TIMEFRAME):
+        """Build (or update) a coarser timeframe from the stored base candles and cache it in the store.
+
+        The cached series remembers which base candles it covers, so later calls only aggregate base
+        candles from the first bucket that was not yet complete. Returns the cached series key.
+        """
+        base_key = candle_key(self.symbol, base_timeframe, period_name)
+        key = candle_key(self.symbol, timeframe, f"{period_name}_from_{base_timeframe}" if period_name else f"from_{base_timeframe}")
+        base_manifest = self.store.manifest(base_key)
+        base = self.store.read_arrays(base_key)
+        base_timestamps = base['timestamp']
+
+        if self.store.exists(key):
+            manifest = self.store.manifest(key)
+            covered = manifest.get('base_last_timestamp')
+            if covered == base_manifest['last_timestamp'] and manifest.get('base_rows') == base_manifest['rows']:
+                return key
+            # New base candles only extend the cache if the base history before them is unchanged
+            new_rows = len(base_timestamps) - int(np.searchsorted(base_timestamps, covered, side='right')) if covered is not None else 0
+            if covered is not None and base_manifest['rows'] - new_rows == manifest.get('base_rows'):
+                next_bucket = manifest['last_timestamp'] + timeframe_ms(timeframe) if manifest['last_timestamp'] is not None else 0
+                start = int(np.searchsorted(base_timestamps, next_bucket, side='left'))
+                tail = resample_arrays({column: values[start:] for column, values in base.items()}, base_timeframe, timeframe)
+                added = self.store.append(key, tail)
+                self.store.write_metadata(key, base_rows=base_manifest['rows'], base_last_timestamp=base_manifest['last_timestamp'])
+                print(f"Updated {timeframe} candles derived from {base_key}: {added} new")
+                return key
+
+        candles = resample_arrays(base, base_timeframe, timeframe)
+        rows = self.store.write(key, candles, derived_from=base_key, base_rows=base_manifest['rows'],
+                                base_last_timestamp=base_manifest['last_timestamp'])
+        print(f"Built {rows} {timeframe} candles from {base_manifest['rows']} {base_timeframe} candles in {base_key}")
+        return key
+
     def load_historical_data(self, timeframe, period_name=None):
-        """Load historical data from CSV if available, otherwise fetch it."""
-        if period_name:
-            filename = f"data/processed/data_{SYMBOL.replace('/', '_')}_{timeframe}_{period_name}.csv"  # Updated path
+        """Load historical data from the candle store if available, otherwise fetch it.
+
+        With DERIVE_FROM_BASE_TIMEFRAME, coarser timeframes are aggregated locally from the stored
+        BASE_TIMEFRAME candles instead of being downloaded separately.
+        """
+        key = candle_key(self.symbol, timeframe, period_name)
+        base_key = candle_key(self.symbol, BASE_TIMEFRAME, period_name)
+        if (DERIVE_FROM_BASE_TIMEFRAME and can_resample(BASE_TIMEFRAME, timeframe)
+                and self._ensure_series(base_key, self._series_csv(base_key, period_name))):
+            key = self.resample_series(timeframe, period_name)
+            df = self.store.load(key)
         else:
-            filename = f"data/raw/data_{SYMBOL.replace('/', '_')}_{timeframe}.csv"  # Updated path
-        if os.path.exists(filename):
-            df = pd.read_csv(filename)
-            df['timestamp'] = pd.to_datetime(df['timestamp'])
-            print(f"Loaded {timeframe} data from {filename}. Total points: {len(df)}")
+            df = self._load_series(key, self._series_csv(key, period_name))
+        if df is not None:
+            print(f"Loaded {timeframe} data from {self.store.path(key)}. Total points: {len(df)}")
             print("First few rows:")
             print(df.head())
             return df
         else:
-            print(f"No {timeframe} data file found for {filename}. Fetching data...")
+            print(f"No {timeframe} data found for {key}. Fetching data...")
             return self.fetch_historical_data(timeframe)
 
     def load_stress_data(self, timeframe, stress_type):
-        """Load stress test data from CSV."""
-        filename = f"data/processed/data_{SYMBOL.replace('/', '_')}_{timeframe}_stress_{stress_type}.csv"  # Updated path
-        if os.path.exists(filename):
-            df = pd.read_csv(filename)
-            df['timestamp'] = pd.to_datetime(df['timestamp'])
-            print(f"Loaded {timeframe} stress data ({stress_type}) from {filename}. Total points: {len(df)}")
+        """Load stress test data from the candle store."""
+        key = candle_key(self.symbol, timeframe, f"stress_{stress_type}")
+        df = self._load_series(key, f"data/processed/data_{key}.csv")
+        if df is not None:
+            print(f"Loaded {timeframe} stress data ({stress_type}) from {self.store.path(key)}. Total points: {len(df)}")
             print("First few rows:")
             print(df.head())
             return df
@@ -84,10 +201,14 @@ class DataHandler:
             print(f"No {timeframe} stress data file found for {stress_type}.")
             return pd.DataFrame()
 
-    def fetch_live_data(self, timeframe, limit=200):
-        """Fetch recent data for live trading (not saved to file)."""
+    def fetch_live_ohlcv(self, timeframe, limit=200):
+        """Fetch recent [timestamp_ms, open, high, low, close, volume] rows for live trading (not saved to file)."""
         print(f"Fetching {timeframe} live data (last {limit} candles)...")
-        ohlcv = self.exchange.fetch_ohlcv(SYMBOL, timeframe, limit=limit)
+        return self.exchange.fetch_ohlcv(self.symbol, timeframe, limit=limit)
+
+    def fetch_live_data(self, timeframe, limit=200):
+        """Fetch recent data for live trading as a DataFrame (not saved to file)."""
+        ohlcv = self.fetch_live_ohlcv(timeframe, limit=limit)
         df = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
         df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
         return df
\ No newline at end of file
@@ -0,0 +1,26 @@
+import os
+import ccxt
+from dotenv import load_dotenv
+
+# Load environment variables from .env in the root directory (consistent with config.py)
+load_dotenv(os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env'))
+
+_clients = {}  # testnet flag -> ccxt.bybit
+
+def get_exchange(testnet=False):
+    """The process-wide Bybit client for mainnet or testnet.
+
+    One client per network: DataHandler and LiveTrader's market data share the mainnet client, LiveTrader's
+    balances and orders the testnet one, so each network has one HTTP connection pool and one rate limiter
+    (enableRateLimit spaces requests per client) instead of one per object.
+    """
+    if testnet not in _clients:
+        options = {
+            'apiKey': os.environ.get('BYBIT_API_KEY'),
+            'secret': os.environ.get('BYBIT_API_SECRET'),
+            'enableRateLimit': True
+        }
+        if testnet:
+            options['test'] = True  # Use testnet
+        _clients[testnet] = ccxt.bybit(options)
+    return _clients[testnet]
@@ -0,0 +1,159 @@
+import asyncio
+import bisect
+import json
+import time
+import ccxt
+
+class FakeExchange:
+    """Offline stand-in for the ccxt exchange calls DataHandler and LiveTrader make, serving recorded OHLCV candles.
+
+    candles maps timeframe -> list of [timestamp_ms, open, high, low, close, volume] rows. fetch_ohlcv
+    follows ccxt semantics (rows with timestamp >= since, at most limit). Failures can be injected
+    with fail_calls: the 1-based call numbers that raise ccxt.NetworkError. With a clock (see
+    src/clock.py) the current time follows it, so candles appear as simulated time passes. Market
+    orders fill immediately at the last closed candle's close against the balances dict, or at the latest
+    of the optional (timestamp_ms, price) ticks, which fetch_ticker replays.
+    """
+
+    def __init__(self, candles, now_ms=None, fail_calls=(), clock=None, balances=None, fee_rate=0.0, ticks=None):
+        self.candles = {tf: sorted(rows, key=lambda row: row[0]) for tf, rows in candles.items()}
+        self.open_times = {tf: [row[0] for row in rows] for tf, rows in self.candles.items()}  # For bisecting by time
+        last = max((rows[-1][0] for rows in self.candles.values() if rows), default=0)
+        self._now_ms = now_ms if now_ms is not None else last + 1
+        self.clock = clock
+        self.fail_calls = set(fail_calls)
+        self.calls = 0
+        self.requests = []  # (timeframe, since, limit) of every fetch_ohlcv call
+        self.balances = dict(balances or {})  # currency -> free amount
+        self.fee_rate = fee_rate
+        self.orders = []
+        ticks = sorted(ticks or [])
+        self.tick_times = [tick[0] for tick in ticks]
+        self.tick_prices = [tick[1] for tick in ticks]
+
+    @property
+    def now_ms(self):
+        return self.clock.now_ms() if self.clock is not None else self._now_ms
+
+    @now_ms.setter
+    def now_ms(self, value):
+        self._now_ms = value
+
+    @classmethod
+    def from_recording(cls, path, **kwargs):
+        """Load candles from a JSON recording written by record_ohlcv()."""
+        with open(path) as f:
+            recording = json.load(f)
+        return cls(recording['candles'], now_ms=recording.get('now_ms'), **kwargs)
+
+    @staticmethod
+    def parse_timeframe(timeframe):
+        return ccxt.Exchange.parse_timeframe(timeframe)
+
+    def milliseconds(self):
+        return self.now_ms
+
+    def fetch_ohlcv(self, symbol, timeframe='1m', since=None, limit=None, params={}):
+        self.calls += 1
+        self.requests.append((timeframe, since, limit))
+        if self.calls in self.fail_calls:
+            raise ccxt.NetworkError(f"injected failure on call {self.calls}")
+        rows = self.candles.get(timeframe, [])
+        open_times = self.open_times.get(timeframe, [])
+        end = bisect.bisect_right(open_times, self.now_ms)  # Candles that have opened by now
+        if since is not None:
+            start = bisect.bisect_left(open_times, since, 0, end)
+        else:
+            start = max(end - (limit or 1000), 0)
+        return [list(row) for row in rows[start:min(end, start + (limit or 1000))]]
+
+    def fetch_balance(self, params={}):
+        return {currency: {'free': amount, 'used': 0.0, 'total': amount} for currency, amount in self.balances.items()}
+
+    def _last_price(self):
+        """Latest tick, else the close of the latest closed candle of the finest timeframe (the forming candle's close is still in the future)."""
+        position = bisect.bisect_right(self.tick_times, self.now_ms)
+        if position:
+            return self.tick_prices[position - 1]
+        timeframe = min(self.candles, key=self.parse_timeframe)
+        timeframe_ms = self.parse_timeframe(timeframe) * 1000
+        closed = bisect.bisect_right(self.open_times[timeframe], self.now_ms - timeframe_ms)
+        return self.candles[timeframe][closed - 1][4]
+
+    def fetch_ticker(self, symbol, params={}):
+        price = self._last_price()
+        return {'symbol': symbol, 'timestamp': self.now_ms, 'last': price, 'bid': price, 'ask': price}
+
+    def _fill(self, symbol, side, amount):
+        base, quote = symbol.split('/')
+        price = self._last_price()
+        cost = amount * price
+        fee = cost * self.fee_rate
+        if side == 'buy':
+            if cost + fee > self.balances.get(quote, 0) + 1e-9:
+                raise ccxt.InsufficientFunds(f"buy {amount} {base} needs {cost + fee:.2f} {quote}")
+            self.balances[quote] = self.balances.get(quote, 0) - cost - fee
+            self.balances[base] = self.balances.get(base, 0) + amount
+        else:
+            if amount > self.balances.get(base, 0) + 1e-12:
+                raise ccxt.InsufficientFunds(f"sell {amount} {base} exceeds balance {self.balances.get(base, 0)}")
+            self.balances[base] = self.balances.get(base, 0) - amount
+            self.balances[quote] = self.balances.get(quote, 0) + cost - fee
+        order = {'id': str(len(self.orders) + 1), 'symbol': symbol, 'type': 'market', 'side': side, 'status': 'closed',
+                 'timestamp': self.now_ms, 'amount': amount, 'filled': amount, 'price': price, 'average': price,
+                 'cost': cost, 'fee': {'cost': fee, 'currency': quote}}
+        self.orders.append(order)
+        return order
+
+    def create_market_buy_order(self, symbol, amount, params={}):
+        return self._fill(symbol, 'buy', amount)
+
+    def create_market_sell_order(self, symbol, amount, params={}):
+        return self._fill(symbol, 'sell', amount)
+
+def record_ohlcv(exchange, symbol, timeframes, since, path, limit=1000, max_pages=10):
+    """Record OHLCV pages from a real exchange into a JSON file that FakeExchange can replay."""
+    candles = {}
+    for timeframe in timeframes:
+        rows, cursor = [], since
+        for _ in range(max_pages):
+            page = exchange.fetch_ohlcv(symbol, timeframe, since=cursor, limit=limit)
+            if not page:
+                break
+            rows.extend(page)
+            cursor = page[-1][0] + 1
+        candles[timeframe] = rows
+    with open(path, 'w') as f:
+        json.dump({'symbol': symbol, 'now_ms': exchange.milliseconds(), 'candles': candles}, f)
+    print(f"Recorded {sum(len(rows) for rows in candles.values())} candles to {path}")
+
+class FakeAsyncExchange(FakeExchange):
+    """Async variant for AsyncFetcher that adds per-request latency and injected 429 responses.
+
+    rate_limit_calls holds the 1-based call numbers answered with ccxt.RateLimitExceeded. The peak
+    number of concurrent requests and each request's start time are recorded for inspection.
+    """
+
+    def __init__(self, candles, now_ms=None, fail_calls=(), latency=0.05, rate_limit_calls=(), **kwargs):
+        super().__init__(candles, now_ms=now_ms, fail_calls=fail_calls, **kwargs)
+        self.latency = latency
+        self.rate_limit_calls = set(rate_limit_calls)
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.request_times = []
+
+    async def fetch_ohlcv(self, symbol, timeframe='1m', since=None, limit=None, params={}):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        self.request_times.append(time.monotonic())
+        try:
+            await asyncio.sleep(self.latency)
+            if self.calls + 1 in self.rate_limit_calls:
+                self.calls += 1
+                raise ccxt.RateLimitExceeded('429 Too Many Requests')
+            return super().fetch_ohlcv(symbol, timeframe, since, limit, params)
+        finally:
+            self.in_flight -= 1
+
+    async def close(self):
+        pass
@@ -0,0 +1,184 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+import numpy as np
+import pandas as pd
+from src.indicators import calculate_indicators
+from src.index_file import locked, read_json, write_json
+from src.config import (SMA_PERIOD, RSI_PERIOD, MACD_FAST, MACD_SLOW, MACD_SIGNAL, BB_PERIOD, BB_STD,
+                        FEATURE_STORE_MAX_BYTES, FEATURE_WARMUP_CANDLES)
+
+FEATURE_STORE_ROOT = os.path.join('data', 'features')
+FEATURE_STORE_VERSION = 1
+INDEX = 'index.json'
+SOURCE_COLUMNS = ('timestamp', 'open', 'high', 'low', 'close', 'volume')
+HEAD_CANDLES = 256  # Leading candles hashed into the entry key so different series never share an entry
+STAT_NAMES = ('hits', 'misses', 'extensions', 'evictions')
+
+def indicator_fingerprint():
+    """Hash of everything that changes indicator output other than the candles: parameters and code."""
+    with open(os.path.join(os.path.dirname(__file__), 'indicators.py'), 'rb') as f:
+        code = f.read()
+    params = [SMA_PERIOD, RSI_PERIOD, MACD_FAST, MACD_SLOW, MACD_SIGNAL, BB_PERIOD, BB_STD, FEATURE_STORE_VERSION]
+    return hashlib.blake2b(json.dumps(params).encode() + code, digest_size=16).hexdigest()
+
+def _source_arrays(df):
+    arrays = [df['timestamp'].astype('datetime64[ms]').astype('int64').to_numpy()]
+    arrays += [df[column].to_numpy(dtype=np.float64) for column in SOURCE_COLUMNS[1:]]
+    return arrays
+
+def candle_fingerprint(df, rows=None):
+    """Hash of the first `rows` candles (all of them by default)."""
+    digest = hashlib.blake2b(digest_size=16)
+    for values in _source_arrays(df.iloc[:rows] if rows is not None else df):
+        digest.update(np.ascontiguousarray(values).tobytes())
+    return digest.hexdigest()
+
+class FeatureStore:
+    """On-disk cache of calculate_indicators output, keyed by the source candles and indicator fingerprint.
+
+    Each entry holds the feature matrix as raw float64 rows plus timestamps and the source frame index,
+    all memory-mapped on load. When the same history has grown by new candles, only the tail is
+    recomputed (with FEATURE_WARMUP_CANDLES of warm-up) and appended. Entries are evicted least
+    recently used once the store exceeds max_bytes; hit/miss counters are kept in the index.
+    """
+
+    def __init__(self, root=FEATURE_STORE_ROOT, max_bytes=FEATURE_STORE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(root, exist_ok=True)
+        self.index = self._load_index()
+
+    def _load_index(self):
+        return read_json(os.path.join(self.root, INDEX),
+                         lambda: {'entries': {}, 'stats': {name: 0 for name in STAT_NAMES}})
+
+    def _save_index(self, key, stat):
+        """Merge this lookup into the index on disk under the store lock, evict, and write it back.
+
+        Several processes (e.g. portfolio workers) share one store: re-reading under the lock keeps their
+        entries and counters instead of the last writer's copy winning.
+        """
+        path = os.path.join(self.root, INDEX)
+        with locked(path):
+            index = self._load_index()
+            index['entries'][key] = self.index['entries'][key]
+            index['stats'][stat] += 1
+            self.index = index
+            self._evict(keep=key)
+            write_json(path, index)
+
+    def stats(self):
+        stats = dict(self.index['stats'])
+        lookups = stats['hits'] + stats['extensions'] + stats['misses']
+        stats['hit_rate'] = (stats['hits'] + stats['extensions']) / lookups if lookups else 0.0
+        stats['entries'] = len(self.index['entries'])
+        stats['bytes'] = sum(entry['bytes'] for entry in self.index['entries'].values())
+        return stats
+
+    def _entry_key(self, df, columns):
+        # One entry per (indicator fingerprint, requested columns, leading candles); it is extended as the series grows
+        raw = f"{indicator_fingerprint()}:{','.join(columns or ['*'])}:{candle_fingerprint(df, HEAD_CANDLES)}"
+        return hashlib.blake2b(raw.encode(), digest_size=12).hexdigest()
+
+    def _read(self, key):
+        entry = self.index['entries'][key]
+        path = os.path.join(self.root, key)
+        rows, columns = entry['rows'], entry['columns']
+        if rows == 0:
+            values = np.empty((0, len(columns)))
+            timestamps = index = np.empty(0, dtype=np.int64)
+        else:
+            values = np.memmap(os.path.join(path, 'features.bin'), dtype='<f8', mode='r', shape=(rows, len(columns)))
+            timestamps = np.memmap(os.path.join(path, 'timestamps.bin'), dtype='<i8', mode='r', shape=(rows,))
+            index = np.memmap(os.path.join(path, 'index.bin'), dtype='<i8', mode='r', shape=(rows,))
+        df = pd.DataFrame(np.array(values), columns=columns, index=pd.Index(np.array(index)))
+        df.insert(0, 'timestamp', pd.to_datetime(np.array(timestamps), unit='ms').astype(entry['timestamp_dtype']))
+        return df
+
+    def _write(self, key, features, mode):
+        """Write ('wb') or append ('ab') an indicator frame to an entry's files; returns the row count written."""
+        path = os.path.join(self.root, key)
+        os.makedirs(path, exist_ok=True)
+        columns = [column for column in features.columns if column != 'timestamp']
+        parts = {
+            'features.bin': np.ascontiguousarray(features[columns].to_numpy(dtype='<f8')),
+            'timestamps.bin': features['timestamp'].astype('datetime64[ms]').astype('int64').to_numpy().astype('<i8'),
+            'index.bin': np.asarray(features.index, dtype='<i8')
+        }
+        rows = self.index['entries'][key]['rows'] if mode == 'ab' else 0
+        for name, values in parts.items():
+            with open(os.path.join(path, name), 'r+b' if mode == 'ab' else 'wb') as f:
+                if mode == 'ab':
+                    # Ignore anything past the recorded row count (left behind by an interrupted append)
+                    f.truncate(rows * values.itemsize * (values.shape[1] if values.ndim == 2 else 1))
+                    f.seek(0, os.SEEK_END)
+                values.tofile(f)
+        return columns, rows + len(features)
+
+    def get_features(self, df, columns=None):
+        """Return calculate_indicators(df, columns), from the cache when the same candles were seen before."""
+        if df.empty:
+            return calculate_indicators(df, columns)
+        key = self._entry_key(df, columns)
+        self.index = self._load_index()  # Pick up entries other processes added since this store was opened
+        entry = self.index['entries'].get(key)
+        if entry and entry['source_rows'] <= len(df) and entry['source_hash'] == candle_fingerprint(df, entry['source_rows']):
+            if entry['source_rows'] == len(df):
+                stat = 'hits'
+                print(f"Feature store hit ({len(df)} candles, entry {key})")
+                features = self._read(key)
+            else:
+                stat = 'extensions'
+                features = self._extend(key, entry, df, columns)
+        else:
+            stat = 'misses'
+            features = calculate_indicators(df, columns)
+            columns, rows = self._write(key, features, 'wb')
+            self.index['entries'][key] = {'rows': rows, 'columns': columns, 'timestamp_dtype': str(df['timestamp'].dtype),
+                                          'source_rows': len(df), 'source_hash': candle_fingerprint(df)}
+            print(f"Feature store miss: computed and cached {rows} rows (entry {key})")
+        entry = self.index['entries'][key]
+        entry['last_access'] = time.time()
+        entry['bytes'] = sum(os.path.getsize(os.path.join(self.root, key, name))
+                             for name in ('features.bin', 'timestamps.bin', 'index.bin'))
+        self._save_index(key, stat)
+        return features
+
+    def _extend(self, key, entry, df, columns):
+        """Compute indicators for candles appended since the entry was cached and append them."""
+        start = max(0, entry['source_rows'] - FEATURE_WARMUP_CANDLES)
+        tail = calculate_indicators(df.iloc[start:], columns)
+        # Only rows for new candles are appended; earlier rows are already cached and indicators are causal
+        new_rows = tail[tail.index >= entry['source_rows']]
+        if list(new_rows.columns[1:]) != entry['columns'] and len(new_rows):
+            new_rows = new_rows[['timestamp'] + entry['columns']]
+        _, rows = self._write(key, new_rows, 'ab')
+        entry.update({'rows': rows, 'source_rows': len(df), 'source_hash': candle_fingerprint(df)})
+        print(f"Feature store extended entry {key} by {len(new_rows)} rows ({len(df) - start} candles recomputed)")
+        return self._read(key)
+
+    def _evict(self, keep):
+        entries = self.index['entries']
+        total = sum(entry.get('bytes', 0) for entry in entries.values())
+        for key in sorted(entries, key=lambda k: entries[k].get('last_access', 0)):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            total -= entries[key].get('bytes', 0)
+            shutil.rmtree(os.path.join(self.root, key), ignore_errors=True)
+            del entries[key]
+            self.index['stats']['evictions'] += 1
+            print(f"Feature store evicted entry {key}")
+
+def load_features(df, columns=None):
+    """calculate_indicators through the default on-disk feature store."""
+    store = FeatureStore()
+    features = store.get_features(df, columns)
+    stats = store.stats()
+    print(f"Feature store: {stats['hits']} hits, {stats['extensions']} extensions, {stats['misses']} misses "
+          f"({stats['hit_rate'] * 100:.0f}% hit rate), {stats['entries']} entries, {stats['bytes'] / 1e6:.1f} MB")
+    return features
@@ -0,0 +1,34 @@
+import contextlib
+import fcntl
+import json
+import os
+import tempfile
+
+@contextlib.contextmanager
+def locked(path):
+    """Hold an exclusive lock on path (via path + '.lock') across processes for a read-merge-write of the file."""
+    with open(path + '.lock', 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def read_json(path, default):
+    """Parsed JSON at path, or default() if the file does not exist yet."""
+    if not os.path.exists(path):
+        return default()
+    with open(path) as f:
+        return json.load(f)
+
+def write_json(path, data):
+    """Atomically replace path with data as JSON, through a uniquely named temp file in the same directory."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix=os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
@@ -1,46 +1,93 @@
 import ta
+import numpy as np
 import pandas as pd
 from src.config import SMA_PERIOD, RSI_PERIOD, MACD_FAST, MACD_SLOW, MACD_SIGNAL, BB_PERIOD, BB_STD
 
-def calculate_indicators(df):
-    """Calculate technical indicators for ML features and trading signals."""
-    df['SMA50'] = ta.trend.sma_indicator(df['close'], window=SMA_PERIOD)
-    df['EMA20'] = ta.trend.ema_indicator(df['close'], window=20)
-    df['EMA50'] = ta.trend.ema_indicator(df['close'], window=50)
-    df['EMA100'] = ta.trend.ema_indicator(df['close'], window=100)
-    df['SMA200'] = ta.trend.sma_indicator(df['close'], window=200)
-    df['RSI'] = ta.momentum.rsi(df['close'], window=RSI_PERIOD)
-    macd = ta.trend.MACD(df['close'], window_fast=MACD_FAST, window_slow=MACD_SLOW, window_sign=MACD_SIGNAL)
-    df['MACD'] = macd.macd()
-    df['MACD_signal'] = macd.macd_signal()
-    df['MACD_diff'] = macd.macd_diff()
-    df['MACD_histogram_slope'] = df['MACD_diff'].diff()
-    df['BB_upper'] = ta.volatility.bollinger_hband(df['close'], window=BB_PERIOD, window_dev=BB_STD)
-    df['BB_lower'] = ta.volatility.bollinger_lband(df['close'], window=BB_PERIOD, window_dev=BB_STD)
-    df['BB_width'] = (df['BB_upper'] - df['BB_lower']) / df['close']
-    df['bb_position'] = (df['close'] - df['BB_lower']) / (df['BB_upper'] - df['BB_lower'])
-    df['volume_change'] = df['volume'].pct_change()
-    df['volume_momentum'] = ta.momentum.roc(df['volume'], window=20)
-    df['close_change'] = df['close'].pct_change()
-    df['return_lag1'] = df['close'].pct_change().shift(1)
-    df['ATR'] = ta.volatility.average_true_range(df['high'], df['low'], df['close'], window=14)
-    df['ATR_normalized'] = df['ATR'] / df['close']
-    df['volatility_change'] = df['ATR_normalized'].pct_change()
-    df['price_volume_corr'] = df['close'].rolling(window=20).corr(df['volume'])
-    df['ema_diff'] = df['EMA20'] - df['EMA50']
-    df['momentum'] = ta.momentum.roc(df['close'], window=20)
-    df['momentum_vol_adj'] = df['momentum'] / df['ATR_normalized']
+def average_true_range(high, low, close, window=14):
+    """ta's average_true_range (same seed and Wilder recursion, bit-identical) without its per-row Series indexing."""
+    prev_close = close.shift(1)
+    true_range = pd.DataFrame({'tr1': high - low, 'tr2': (high - prev_close).abs(),
+                               'tr3': (low - prev_close).abs()}).max(axis=1).tolist()
+    atr = [0.0] * len(true_range)
+    if len(atr) >= window:
+        atr[window - 1] = float(np.mean(true_range[0:window]))
+        for i in range(window, len(atr)):
+            atr[i] = (atr[i - 1] * (window - 1) + true_range[i]) / float(window)
+    return pd.Series(atr, index=close.index, name='atr')
+
+# Feature graph: name -> (dependencies, function of the candle frame and the dependency series).
+# Names starting with an underscore are shared intermediates and never part of the output.
+FEATURES = {
+    'SMA50': ((), lambda df: ta.trend.sma_indicator(df['close'], window=SMA_PERIOD)),
+    'EMA20': ((), lambda df: ta.trend.ema_indicator(df['close'], window=20)),
+    'EMA50': ((), lambda df: ta.trend.ema_indicator(df['close'], window=50)),
+    'EMA100': ((), lambda df: ta.trend.ema_indicator(df['close'], window=100)),
+    'SMA200': ((), lambda df: ta.trend.sma_indicator(df['close'], window=200)),
+    'RSI': ((), lambda df: ta.momentum.rsi(df['close'], window=RSI_PERIOD)),
+    'MACD': ((), lambda df: ta.trend.macd(df['close'], window_slow=MACD_SLOW, window_fast=MACD_FAST)),
+    'MACD_signal': (('MACD',), lambda df, macd: ta.trend.ema_indicator(macd, window=MACD_SIGNAL)),
+    'MACD_diff': (('MACD', 'MACD_signal'), lambda df, macd, signal: macd - signal),
+    'MACD_histogram_slope': (('MACD_diff',), lambda df, diff: diff.diff()),
+    '_bb_mavg': ((), lambda df: df['close'].rolling(BB_PERIOD, min_periods=BB_PERIOD).mean()),
+    '_bb_mstd': ((), lambda df: df['close'].rolling(BB_PERIOD, min_periods=BB_PERIOD).std(ddof=0)),
+    'BB_upper': (('_bb_mavg', '_bb_mstd'), lambda df, mavg, mstd: mavg + BB_STD * mstd),
+    'BB_lower': (('_bb_mavg', '_bb_mstd'), lambda df, mavg, mstd: mavg - BB_STD * mstd),
+    'BB_width': (('BB_upper', 'BB_lower'), lambda df, upper, lower: (upper - lower) / df['close']),
+    'bb_position': (('BB_upper', 'BB_lower'), lambda df, upper, lower: (df['close'] - lower) / (upper - lower)),
+    'volume_change': ((), lambda df: df['volume'].pct_change()),
+    'volume_momentum': ((), lambda df: ta.momentum.roc(df['volume'], window=20)),
+    'close_change': ((), lambda df: df['close'].pct_change()),
+    'return_lag1': (('close_change',), lambda df, change: change.shift(1)),
+    'ATR': ((), lambda df: average_true_range(df['high'], df['low'], df['close'], window=14)),
+    'ATR_normalized': (('ATR',), lambda df, atr: atr / df['close']),
+    'volatility_change': (('ATR_normalized',), lambda df, atr_normalized: atr_normalized.pct_change()),
+    'price_volume_corr': ((), lambda df: df['close'].rolling(window=20).corr(df['volume'])),
+    'ema_diff': (('EMA20', 'EMA50'), lambda df, ema20, ema50: ema20 - ema50),
+    'momentum': ((), lambda df: ta.momentum.roc(df['close'], window=20)),
+    'momentum_vol_adj': (('momentum', 'ATR_normalized'), lambda df, momentum, atr_normalized: momentum / atr_normalized)
+}
+ALL_FEATURES = [name for name in FEATURES if not name.startswith('_')]
+
+def feature_closure(columns):
+    """Every graph node needed for the requested columns, in dependency order."""
+    order, seen = [], set()
+    def visit(name):
+        if name in seen:
+            return
+        if name not in FEATURES:
+            raise KeyError(f"Unknown feature: {name}")
+        seen.add(name)
+        for dependency in FEATURES[name][0]:
+            visit(dependency)
+        order.append(name)
+    for name in columns:
+        visit(name)
+    return order
+
+def calculate_indicators(df, columns=None, verbose=False):
+    """Calculate technical indicators for ML features and trading signals.
+
+    Only the requested columns (all features by default) and their dependencies are computed;
+    rows with NaNs in the result are dropped. verbose prints feature distribution statistics.
+    """
+    # Requested raw candle columns (e.g. 'close') are passed through rather than computed
+    columns = ALL_FEATURES if columns is None else [c for c in dict.fromkeys(columns) if c in FEATURES or c not in df.columns]
+    values = {}
+    for name in feature_closure(columns):
+        dependencies, func = FEATURES[name]
+        values[name] = func(df, *(values[dependency] for dependency in dependencies))
+    features = pd.DataFrame({name: values[name] for name in columns}, index=df.index)
+    df = pd.concat([df.drop(columns=[c for c in columns if c in df.columns]), features], axis=1)
     df = df.dropna()
-    print("Feature Distributions (after NaN removal):")
-    key_features = ['RSI', 'ATR_normalized', 'MACD_diff', 'BB_width', 'volume_change']
-    for feature in key_features:
-        print(f"{feature}:")
-        print(f"  Mean: {df[feature].mean():.4f}")
-        print(f"  Std: {df[feature].std():.4f}")
-        print(f"  Min: {df[feature].min():.4f}")
-        print(f"  Max: {df[feature].max():.4f}")
-        print(f"  Quantiles (25%, 50%, 75%): {df[feature].quantile([0.25, 0.50, 0.75]).to_dict()}")
-    print(f"Indicators Calculated. Shape: {df.shape}")
-    print("Sample indicators:")
-    print(df[['close', 'SMA50', 'RSI', 'MACD', 'EMA100', 'SMA200']].tail())
-    return df
\ No newline at end of file
+    if verbose:
+        print("Feature Distributions (after NaN removal):")
+        key_features = [f for f in ['RSI', 'ATR_normalized', 'MACD_diff', 'BB_width', 'volume_change'] if f in df.columns]
+        for feature in key_features:
+            print(f"{feature}:")
+            print(f"  Mean: {df[feature].mean():.4f}")
+            print(f"  Std: {df[feature].std():.4f}")
+            print(f"  Min: {df[feature].min():.4f}")
+            print(f"  Max: {df[feature].max():.4f}")
+            print(f"  Quantiles (25%, 50%, 75%): {df[feature].quantile([0.25, 0.50, 0.75]).to_dict()}")
+        print(f"Indicators Calculated. Shape: {df.shape}")
+    return df
@@ -0,0 +1,72 @@
+from src.config import LEDGER_RECONCILE_SECONDS, LEDGER_DRIFT_TOLERANCE
+
+class Ledger:
+    """Local cash/position book for LiveTrader, updated from order fill responses.
+
+    The exchange is only asked for balances when a reconcile is due: on start-up, every
+    LEDGER_RECONCILE_SECONDS, or after something made the book untrustworthy (a fill response without
+    fill details, a partial fill, a failed cycle). Until the first successful reconcile the balances are
+    unknown and the trader does not trade; a failed reconcile keeps the last known book rather than guessing.
+    """
+
+    def __init__(self, base, quote, reconcile_seconds=LEDGER_RECONCILE_SECONDS):
+        self.base = base
+        self.quote = quote
+        self.reconcile_ms = int(reconcile_seconds * 1000)
+        self.cash = 0.0
+        self.position = 0.0
+        self.known = False  # Set by the first successful reconcile
+        self.stale_reason = 'start-up'  # Why the next cycle must reconcile, or None
+        self.last_reconcile_ms = None
+        self.fills = 0
+        self.reconciles = 0
+
+    def mark_stale(self, reason):
+        if self.stale_reason is None:
+            self.stale_reason = reason
+
+    def reconcile_due(self, now_ms):
+        return (self.stale_reason is not None or self.last_reconcile_ms is None
+                or now_ms - self.last_reconcile_ms >= self.reconcile_ms)
+
+    def apply_fill(self, order):
+        """Book a market order from its exchange response; returns False (and marks the ledger stale) if it lacks fill details."""
+        filled = order.get('filled')
+        cost = order.get('cost')
+        if cost is None and filled is not None and order.get('average') is not None:
+            cost = filled * order['average']
+        if filled is None or cost is None:
+            self.mark_stale(f"order {order.get('id')} returned without fill details")
+            return False
+        if order.get('amount') and filled < order['amount']:
+            self.mark_stale(f"order {order.get('id')} filled {filled} of {order['amount']}")
+        fee = order.get('fee') or {}
+        fee_cost = fee.get('cost') or 0.0
+        if order['side'] == 'buy':
+            self.position += filled
+            self.cash -= cost
+        else:
+            self.position -= filled
+            self.cash += cost
+        # Fees come out of whichever currency the exchange charged them in
+        if fee.get('currency') == self.base:
+            self.position -= fee_cost
+        else:
+            self.cash -= fee_cost
+        self.fills += 1
+        return True
+
+    def reconcile(self, balance, now_ms):
+        """Replace the book with fetch_balance() output; returns the (position, cash) drift it corrected."""
+        position = float(balance.get(self.base, {}).get('free') or 0.0)
+        cash = float(balance.get(self.quote, {}).get('free') or 0.0)
+        drift = (position - self.position, cash - self.cash)
+        if self.known and (abs(drift[0]) > LEDGER_DRIFT_TOLERANCE * max(abs(position), 1.0)
+                           or abs(drift[1]) > LEDGER_DRIFT_TOLERANCE * max(abs(cash), 1.0)):
+            print(f"Ledger drift corrected: {drift[0]:+.8f} {self.base}, {drift[1]:+.2f} {self.quote}")
+        self.position, self.cash = position, cash
+        self.known = True
+        self.stale_reason = None
+        self.last_reconcile_ms = now_ms
+        self.reconciles += 1
+        return drift
@@ -1,35 +1,50 @@
-import ccxt
+import asyncio
 import pandas as pd
 import time
 import os
-from dotenv import load_dotenv
-from src.config import SYMBOL, TIMEFRAME, INITIAL_CAPITAL, POSITION_SIZE_FRACTION, TRANSACTION_FEE_RATE, TRAILING_STOP_PERCENT, ML_FEATURES
+from src.config import (SYMBOL, TIMEFRAME, STRATEGY_COLUMNS, SIGNAL_THRESHOLD, LIVE_SEED_CANDLES, LIVE_UPDATE_CANDLES,
+                        LIVE_CLOSE_GRACE_SECONDS, LIVE_FETCH_RETRIES, LIVE_FETCH_RETRY_SECONDS, LIVE_SNAPSHOT_PATH)
+from src.clock import SystemClock, next_bar_close
 from src.data_handler import DataHandler
-from src.indicators import calculate_indicators
+from src.exchange import get_exchange
+from src.ledger import Ledger
+from src.streaming_indicators import StreamingIndicators
 from src.ml_model import MLModel
+from src.profiling import LatencyRecorder
+from src.model_registry import ModelRegistry, ModelWatcher
+from src.snapshot import save_snapshot, load_snapshot
+from src.stop_monitor import StopMonitor, exit_reason, stop_multiplier
 from src.trade_utils import execute_buy_trade, execute_sell_trade
-import xgboost as xgb
-
-# Load environment variables
-load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
 
 class LiveTrader:
-    def __init__(self):
-        # Initialize Bybit testnet exchange
-        self.exchange = ccxt.bybit({
-            'apiKey': os.environ.get('BYBIT_API_KEY'),
-            'secret': os.environ.get('BYBIT_API_SECRET'),
-            'enableRateLimit': True,
-            'test': True  # Use testnet
-        })
-        self.data_handler = DataHandler()
-        self.model = MLModel()
-        self.cash = INITIAL_CAPITAL  # Starting USDT (testnet funds)
-        self.position = 0  # BTC held
+    def __init__(self, exchange=None, clock=None, snapshot_path=LIVE_SNAPSHOT_PATH, market_exchange=None):
+        self.started_at = time.perf_counter()  # For the restart-to-ready time
+        # Balances and orders go to the shared Bybit testnet client (or an injected one, e.g. FakeExchange for offline runs)
+        self.exchange = exchange or get_exchange(testnet=True)
+        # Candles and tickers come from mainnet, the market the model was trained on; an injected exchange serves both
+        self.market_exchange = market_exchange or (get_exchange() if exchange is None else exchange)
+        self.clock = clock or SystemClock()  # SimulatedClock drives the loop in virtual time
+        self.data_handler = DataHandler(self.market_exchange)
+        # Trade with the registry's active model (the legacy JSON file if nothing is registered yet)
+        self.registry = ModelRegistry()
+        index = self.registry.index()
+        self.model_version = index['active']
+        self.model = self.registry.load(self.model_version) if self.model_version else MLModel()
+        self.candidate_version = index.get('candidate')
+        self.candidate = self.registry.load(self.candidate_version) if self.candidate_version else None
+        self.model_watcher = ModelWatcher(self.registry, self.model_version, self.candidate_version)
+        self.ledger = Ledger(*SYMBOL.split('/'))  # BTC held and USDT cash, booked from fills
         self.active_trade = None
         self.peak_price = 0
         self.cooldown = 0
         self.trade_number = 0
+        self.trades = []  # Trade dicts as returned by execute_buy_trade/execute_sell_trade
+        self.indicators = None  # Streaming indicator state, seeded on the first cycle
+        self.timeframe_ms = self.exchange.parse_timeframe(TIMEFRAME) * 1000
+        self.cycle_latency = LatencyRecorder()  # Candle close -> trading decision, every cycle
+        self.order_latency = LatencyRecorder()  # Candle close -> order sent, cycles that traded
+        self.stop_monitor = StopMonitor(self)  # Intrabar exit checks between candle closes
+        self.snapshot_path = snapshot_path  # None disables snapshots (replays)
         # Metrics for tracking trades (simplified from backtest)
         self.trend_metrics = {
             'gross_profit': 0, 'gross_loss': 0, 'consecutive_wins': 0, 'consecutive_losses': 0,
@@ -39,130 +54,310 @@ class LiveTrader:
             'trend_regime_wins': {'trending': 0, 'choppy': 0},
             'regime': None
         }
+        self.restored = self.restore_state() if snapshot_path else False
+
+    @property
+    def position(self):
+        return self.ledger.position
+
+    @position.setter
+    def position(self, value):
+        self.ledger.position = value
+
+    @property
+    def cash(self):
+        return self.ledger.cash
+
+    @cash.setter
+    def cash(self, value):
+        self.ledger.cash = value
 
     def sync_position(self):
-        """Sync position and balance with the exchange."""
+        """Reconcile the ledger with the exchange balance; on failure keep the last known book and retry next cycle."""
+        now_ms = self.clock.now_ms()
         try:
             balance = self.exchange.fetch_balance()
-            self.position = balance.get('BTC', {}).get('free', 0)
-            self.cash = balance.get('USDT', {}).get('free', INITIAL_CAPITAL)
-            print(f"Synced position: {self.position:.6f} BTC, Cash: {self.cash:.2f} USDT")
         except Exception as e:
-            print(f"Error syncing position: {e}")
-            self.position = 0
-            self.cash = INITIAL_CAPITAL
+            print(f"Error syncing position, keeping the {'ledger' if self.ledger.known else 'unknown balances'}: {e}")
+            self.ledger.mark_stale('failed reconcile')
+            return False
+        self.ledger.reconcile(balance, now_ms)
+        print(f"Synced position: {self.position:.6f} BTC, Cash: {self.cash:.2f} USDT")
+        return True
 
-    def fetch_latest_data(self):
-        """Fetch the latest 200 candles for analysis."""
-        df = self.data_handler.fetch_live_data(TIMEFRAME, limit=200)
+    def _closed_candles(self, df):
+        """Drop the still-forming candle that fetch_ohlcv returns last."""
         if df.empty:
-            print("No live data fetched.")
-            return pd.DataFrame()
-        df = calculate_indicators(df)
-        return df
+            return df
+        close_times = df['timestamp'].astype('datetime64[ms]').astype('int64') + self.timeframe_ms
+        return df[close_times <= self.clock.now_ms()]
+
+    def fetch_latest_data(self):
+        """Feed newly closed candles into the streaming indicators and return the latest indicator row (None until ready)."""
+        if self.indicators is None:
+            df = self._closed_candles(self.data_handler.fetch_live_data(TIMEFRAME, limit=LIVE_SEED_CANDLES))
+            if df.empty:
+                print("No live data fetched.")
+                return None
+            self.indicators = StreamingIndicators()
+            self.indicators.seed(df)
+            print(f"Seeded streaming indicators from {len(df)} closed candles up to {self.indicators.last_timestamp}")
+        else:
+            # A handful of raw rows per cycle: plain lists avoid building DataFrames on every candle
+            now_ms = self.clock.now_ms()
+            last_ms = self.indicators.last_timestamp.value // 10**6
+            missed = (now_ms - last_ms) // self.timeframe_ms  # Candles closed since the last one seen (more after a restart)
+            limit = min(max(LIVE_UPDATE_CANDLES, missed + 2), LIVE_SEED_CANDLES)
+            new_rows = [row for row in self.data_handler.fetch_live_ohlcv(TIMEFRAME, limit=limit)
+                        if last_ms < row[0] and row[0] + self.timeframe_ms <= now_ms]
+            if new_rows and new_rows[0][0] - last_ms > self.timeframe_ms:
+                # Missed more candles than one update fetch covers: re-seed from history
+                print(f"Missed candles since {self.indicators.last_timestamp}. Re-seeding indicators...")
+                self.indicators = None
+                return self.fetch_latest_data()
+            for timestamp, open_, high, low, close, volume in new_rows:
+                self.indicators.update(pd.Timestamp(timestamp, unit='ms'), open_, high, low, close, volume)
+
+        if not self.indicators.ready(STRATEGY_COLUMNS):
+            print("Not enough history for indicators yet.")
+            return None
+        return self.indicators.latest
+
+    def snapshot_state(self):
+        """Everything needed to resume trading: trade state, the ledger and the streaming indicators."""
+        return {
+            'symbol': SYMBOL, 'timeframe': TIMEFRAME, 'saved_ms': self.clock.now_ms(),
+            'active_trade': self.active_trade, 'peak_price': self.peak_price, 'cooldown': self.cooldown,
+            'trade_number': self.trade_number, 'trend_metrics': self.trend_metrics,
+            'cash': self.cash, 'position': self.position, 'balances_known': self.ledger.known,
+            'indicators': self.indicators
+        }
+
+    def save_state(self):
+        if self.snapshot_path:
+            save_snapshot(self.snapshot_state(), self.snapshot_path)
+
+    def restore_state(self):
+        """Resume from the snapshot at snapshot_path, if there is a usable one; returns whether it did."""
+        state = load_snapshot(self.snapshot_path, symbol=SYMBOL, timeframe=TIMEFRAME)
+        if state is None:
+            return False
+        self.active_trade = state['active_trade']
+        self.peak_price = state['peak_price']
+        self.cooldown = state['cooldown']
+        self.trade_number = state['trade_number']
+        self.trend_metrics = state['trend_metrics']
+        self.indicators = state['indicators']
+        self.ledger.cash, self.ledger.position = state['cash'], state['position']
+        self.ledger.known = state['balances_known']
+        self.ledger.mark_stale('restart')  # Fills may have happened while the bot was down
+        print(f"Restored state from {self.snapshot_path} (saved at {pd.Timestamp(state['saved_ms'], unit='ms')}): "
+              f"position {self.position:.6f}, trade {self.trade_number}, cooldown {self.cooldown}, "
+              f"indicators up to {self.indicators.last_timestamp if self.indicators else None}")
+        return True
+
+    def warm_up(self):
+        """Catch the indicators up to the latest closed candle before waiting for the next one.
+
+        After a restore only the candles missed while down are fetched; each of them also counts down the cooldown.
+        """
+        seen = self.indicators.last_timestamp if self.indicators is not None else None
+        latest = self.fetch_latest_data()
+        missed = 0
+        if seen is not None and self.indicators is not None:
+            # From timestamps, not update counts: a re-seed restarts the count
+            missed = max((self.indicators.last_timestamp - seen).value // 10**6 // self.timeframe_ms, 0)
+        if missed:
+            self.cooldown = max(self.cooldown - missed, 0)
+        print(f"Restart to ready in {(time.perf_counter() - self.started_at) * 1000:.0f} ms "
+              f"({'resumed from snapshot, ' if self.restored else 'cold start, '}{missed} missed candles fed)"
+              + ('' if latest is not None else '; indicators still warming up'))
+        return latest
+
+    def apply_model_update(self):
+        """Swap in models the background watcher has loaded; called between candles so a cycle never mixes models."""
+        update = self.model_watcher.take_update()
+        if not update:
+            return
+        if 'active' in update:
+            self.model_version, self.model = update['active']
+            print(f"Switched to model {self.model_version}")
+        if 'candidate' in update:
+            self.candidate_version, self.candidate = update['candidate']
+            print(f"Shadow-scoring candidate model {self.candidate_version}" if self.candidate else "Stopped shadow scoring")
+
+    def shadow_score(self, timestamp, pred_prob):
+        """Score the candidate model on the same row and log it next to the active model's probability."""
+        candidate_prob = float(self.candidate.predict_fast(self.indicators.latest)[0])
+        print(f"Shadow {self.candidate_version}: {candidate_prob:.3f} vs active {self.model_version}: {pred_prob:.3f}"
+              f"{' (signals differ)' if (candidate_prob > SIGNAL_THRESHOLD) != (pred_prob > SIGNAL_THRESHOLD) else ''}")
+        path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'reports', f"shadow_{self.candidate_version}.csv")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        new_file = not os.path.exists(path)
+        with open(path, 'a') as f:
+            if new_file:
+                f.write("timestamp,active_version,active_prob,candidate_prob\n")
+            f.write(f"{timestamp},{self.model_version},{pred_prob:.6f},{candidate_prob:.6f}\n")
+        return candidate_prob
+
+    def _bar_available(self, bar_close_ms):
+        """True once the candle closing at bar_close_ms has been fed to the indicators."""
+        if self.indicators is None or self.indicators.last_timestamp is None:
+            return False
+        last_close_ms = pd.Timestamp(self.indicators.last_timestamp).value // 10**6 + self.timeframe_ms
+        return last_close_ms >= bar_close_ms
+
+    def prepare_signal(self):
+        """Fetch newly closed candles, update the indicators and score the latest row; returns (row, pred_prob) or (None, None)."""
+        latest = self.fetch_latest_data()
+        if latest is None:
+            return None, None
+        pred_prob = float(self.model.predict_fast(latest)[0])
+        if self.candidate is not None:
+            self.shadow_score(latest['timestamp'], pred_prob)
+        return latest, pred_prob
+
+    async def _signal_for_bar(self, bar_close_ms):
+        """prepare_signal, retried while the exchange has not published the just-closed candle yet."""
+        for attempt in range(LIVE_FETCH_RETRIES + 1):
+            latest, pred_prob = await asyncio.to_thread(self.prepare_signal)
+            if self._bar_available(bar_close_ms):
+                return latest, pred_prob
+            if attempt < LIVE_FETCH_RETRIES:
+                print(f"Candle closing at {pd.Timestamp(bar_close_ms, unit='ms')} not published yet; retrying in {LIVE_FETCH_RETRY_SECONDS}s")
+                await self.clock.sleep_until(self.clock.now_ms() + LIVE_FETCH_RETRY_SECONDS * 1000)
+        print(f"Candle closing at {pd.Timestamp(bar_close_ms, unit='ms')} still missing")
+        return None, None  # Deciding again on the previous candle would double-count it
+
+    def _latency_since_close(self, bar_close_ms, woke_ms, woke_at):
+        """Seconds from the candle close to now.
+
+        Clock time until the wake-up, plus the longer of clock time (retry waits) and wall time (the work itself)
+        since then; the two are the same on the system clock, while a simulated clock only moves during waits.
+        """
+        since_wake = max((self.clock.now_ms() - woke_ms) / 1000, time.perf_counter() - woke_at)
+        return (woke_ms - bar_close_ms) / 1000 + since_wake
+
+    def _sell(self, reason, price, timestamp, portfolio_value):
+        order = self.exchange.create_market_sell_order(SYMBOL, self.position)
+        trade, cash_gain, cooldown = execute_sell_trade(
+            self.trade_number + 1, self.active_trade, price, self.position,
+            timestamp, portfolio_value, reason, self.trend_metrics
+        )
+        print(f"Sell order executed ({reason}): {order}")
+        self.trades.append(trade)
+        if not self.ledger.apply_fill(order):
+            # No fill details: book the expected proceeds until the next reconcile
+            self.cash += cash_gain
+            self.position = 0
+        self.active_trade = None
+        self.peak_price = 0
+        self.cooldown = cooldown
+        self.trade_number += 1
+        return order
+
+    def _buy(self, signal, price, timestamp, portfolio_value, regime):
+        trade_info, amount, new_cash = execute_buy_trade(
+            self.trade_number + 1, signal, price, portfolio_value, self.cash, timestamp, regime
+        )
+        if not trade_info:
+            return None
+        order = self.exchange.create_market_buy_order(SYMBOL, amount)
+        print(f"Buy order executed: {order}")
+        self.trades.append(trade_info)
+        if not self.ledger.apply_fill(order):
+            self.position = amount
+            self.cash = new_cash
+        self.active_trade = trade_info
+        self.peak_price = price
+        self.trade_number += 1
+        return order
+
+    async def step(self, bar_close_ms):
+        """One trading cycle for the candle that closed at bar_close_ms; returns the order placed, if any."""
+        woke_ms, woke_at = self.clock.now_ms(), time.perf_counter()
+        self.apply_model_update()
+
+        # Balances come from the ledger; the exchange is only asked when a reconcile is due, concurrently with the
+        # data fetch -> indicators -> prediction chain, which does not depend on it
+        if self.ledger.reconcile_due(woke_ms):
+            _, (latest, pred_prob) = await asyncio.gather(asyncio.to_thread(self.sync_position), self._signal_for_bar(bar_close_ms))
+        else:
+            latest, pred_prob = await self._signal_for_bar(bar_close_ms)
+        if not self.ledger.known:
+            print("Skipping cycle: balances unknown until the exchange answers a balance request.")
+            return None
+        if latest is None:
+            print("Skipping cycle: No data available.")
+            return None
+
+        price = latest['close']
+        atr = latest['ATR']
+        regime = 'trending' if latest['SMA50'] > latest['SMA200'] else 'choppy'
+        self.trend_metrics['regime'] = regime
+        signal = int(pred_prob > SIGNAL_THRESHOLD)
+        portfolio_value = self.cash + self.position * price
+
+        # Log current state
+        latency = self.model.latency.summary()
+        print(f"Timestamp: {latest['timestamp']}, Price: {price:.2f}, Signal: {signal} ({pred_prob:.3f}, model {self.model_version}), "
+              f"Position: {self.position:.6f}, Cash: {self.cash:.2f}, Regime: {regime}, "
+              f"Inference p50/p99: {latency['p50_us']:.0f}/{latency['p99_us']:.0f} us")
+
+        order = None
+        if self.cooldown > 0:
+            self.cooldown -= 1
+            print(f"Cooldown: {self.cooldown} candles remaining")
+        elif self.position > 0 and self.active_trade:
+            # Check for exits if holding a position (the same rules the stop monitor applies between candles)
+            reason = exit_reason(price, self.active_trade['price'], atr, stop_multiplier(regime), self.peak_price)
+            if reason:
+                order = self._sell(reason, price, latest['timestamp'], portfolio_value)
+            else:
+                self.peak_price = max(self.peak_price, price)
+        elif signal == 1 and self.position == 0:
+            order = self._buy(signal, price, latest['timestamp'], portfolio_value, regime)
+
+        # Bar-close-to-decision latency every cycle, bar-close-to-order latency when an order went out
+        latency = self._latency_since_close(bar_close_ms, woke_ms, woke_at)
+        self.cycle_latency.record(latency)
+        if order is not None:
+            self.order_latency.record(latency)
+        cycle, orders = self.cycle_latency.summary(), self.order_latency.summary()
+        print(f"Bar close -> decision {latency * 1000:.0f} ms (p50/p99 {cycle['p50_us'] / 1000:.0f}/{cycle['p99_us'] / 1000:.0f} ms)"
+              + (f", -> order p50/p99 {orders['p50_us'] / 1000:.0f}/{orders['p99_us'] / 1000:.0f} ms over {orders['count']} orders"
+                 if orders['count'] else ''))
+        return order
+
+    async def run_async(self, max_cycles=None):
+        """Wake at every candle close plus LIVE_CLOSE_GRACE_SECONDS and run one cycle; max_cycles bounds offline runs.
+
+        While waiting for the next candle, an open position is watched tick by tick by the stop monitor.
+        """
+        await asyncio.to_thread(self.warm_up)
+        self.save_state()
+        cycles = 0
+        while max_cycles is None or cycles < max_cycles:
+            bar_close_ms = next_bar_close(self.clock.now_ms(), self.timeframe_ms)
+            await self.stop_monitor.watch_until(bar_close_ms + LIVE_CLOSE_GRACE_SECONDS * 1000)
+            try:
+                await self.step(bar_close_ms)
+            except Exception as e:
+                print(f"Error in trading loop: {e}")  # Try again at the next candle close
+                self.ledger.mark_stale('cycle error')  # An order may or may not have gone through
+            self.save_state()
+            cycles += 1
+            if self.stop_monitor.ticks:
+                print(self.stop_monitor.summary())
 
     def run(self):
         """Main trading loop."""
         print(f"Starting paper trading on {SYMBOL} ({TIMEFRAME}) with Bybit testnet...")
-        while True:
-            try:
-                # Sync position and balance
-                self.sync_position()
-
-                # Fetch and prepare latest data
-                df = self.fetch_latest_data()
-                if df.empty:
-                    print("Skipping cycle: No data available.")
-                    time.sleep(60)
-                    continue
-
-                # ML prediction
-                X = df[ML_FEATURES].iloc[-1:].values
-                df['pred_prob'] = self.model.predict(xgb.DMatrix(X))
-                df['signal'] = (df['pred_prob'] > 0.65).astype(int)
-                latest = df.iloc[-1]
-                price = latest['close']
-                atr = latest['ATR']
-                regime = 'trending' if latest['SMA50'] > latest['SMA200'] else 'choppy'
-                self.trend_metrics['regime'] = regime
-                signal = latest['signal']
-                portfolio_value = self.cash + self.position * price
-
-                # Log current state
-                print(f"Timestamp: {latest['timestamp']}, Price: {price:.2f}, Signal: {signal}, "
-                      f"Position: {self.position:.6f}, Cash: {self.cash:.2f}, Regime: {regime}")
-
-                # Handle cooldown
-                if self.cooldown > 0:
-                    self.cooldown -= 1
-                    print(f"Cooldown: {self.cooldown} candles remaining")
-                    time.sleep(60 * 60 * 4)  # Wait for 4 hours
-                    continue
-
-                # Check for exits if holding a position
-                if self.position > 0 and self.active_trade:
-                    stop_loss_multiplier = 0.5 if regime == 'choppy' else 1.0
-                    if price < self.active_trade['price'] - atr * stop_loss_multiplier:
-                        # Execute sell via exchange
-                        order = self.exchange.create_market_sell_order(SYMBOL, self.position)
-                        trade, cash_gain, cooldown = execute_sell_trade(
-                            self.trade_number + 1, self.active_trade, price, self.position,
-                            latest['timestamp'], portfolio_value, 'stop-loss', self.trend_metrics
-                        )
-                        print(f"Sell order executed: {order}")
-                        self.cash += cash_gain
-                        self.position = 0
-                        self.active_trade = None
-                        self.peak_price = 0
-                        self.cooldown = cooldown
-                        self.trade_number += 1
-                    elif price > self.active_trade['price'] + 5 * atr:
-                        order = self.exchange.create_market_sell_order(SYMBOL, self.position)
-                        trade, cash_gain, cooldown = execute_sell_trade(
-                            self.trade_number + 1, self.active_trade, price, self.position,
-                            latest['timestamp'], portfolio_value, 'take-profit', self.trend_metrics
-                        )
-                        print(f"Sell order executed: {order}")
-                        self.cash += cash_gain
-                        self.position = 0
-                        self.active_trade = None
-                        self.peak_price = 0
-                        self.cooldown = cooldown
-                        self.trade_number += 1
-                    elif price < self.peak_price * (1 - TRAILING_STOP_PERCENT):
-                        order = self.exchange.create_market_sell_order(SYMBOL, self.position)
-                        trade, cash_gain, cooldown = execute_sell_trade(
-                            self.trade_number + 1, self.active_trade, price, self.position,
-                            latest['timestamp'], portfolio_value, 'trailing-stop', self.trend_metrics
-                        )
-                        print(f"Sell order executed: {order}")
-                        self.cash += cash_gain
-                        self.position = 0
-                        self.active_trade = None
-                        self.peak_price = 0
-                        self.cooldown = cooldown
-                        self.trade_number += 1
-                    else:
-                        self.peak_price = max(self.peak_price, price)
-                elif signal == 1 and self.position == 0:
-                    # Execute buy via exchange
-                    trade_info, amount, new_cash = execute_buy_trade(
-                        self.trade_number + 1, signal, price, portfolio_value, self.cash, latest['timestamp'], regime
-                    )
-                    if trade_info:
-                        order = self.exchange.create_market_buy_order(SYMBOL, amount)
-                        print(f"Buy order executed: {order}")
-                        self.position = amount
-                        self.cash = new_cash
-                        self.active_trade = trade_info
-                        self.peak_price = price
-                        self.trade_number += 1
-
-                time.sleep(60 * 60 * 4)  # Wait 4 hours (adjustable)
-
-            except Exception as e:
-                print(f"Error in trading loop: {e}")
-                time.sleep(60)  # Retry after 1 minute
+        self.model_watcher.start()
+        try:
+            asyncio.run(self.run_async())
+        finally:
+            self.model_watcher.stop()
 
 if __name__ == "__main__":
     trader = LiveTrader()
@@ -1,32 +1,68 @@
 import sys
+import numpy as np
+import pandas as pd
 from src.data_handler import DataHandler
-from src.indicators import calculate_indicators
-from src.ml_model import MLModel
+from src.async_fetcher import fetch_all, sync_jobs
+from src.candle_store import candle_key
+from src.feature_store import load_features
+from src.ml_model import MLModel, make_target
+from src.model_registry import ModelRegistry
+from src.prediction_cache import cached_predict, threshold_scan
+from src.profiling import StageProfiler
 from src.backtest_utils import backtest
-from src.config import TIMEFRAME
+from src.sweep import run_sweep
+from src.walk_forward import walk_forward
+from src.tuning import tune
+from src.replay import replay_check
+from src.stress import run_stress
+from src.portfolio import portfolio_backtest
+from src.config import (ML_FEATURES, TIMEFRAME, SYMBOL, HISTORY_START_DATE, BASE_TIMEFRAME, DERIVE_FROM_BASE_TIMEFRAME,
+                        PORTFOLIO_SYMBOLS)
 
 def fetch_and_save_all_timeframes():
-    """Fetch and save historical data for multiple timeframes."""
+    """Fetch historical data for multiple timeframes concurrently, then backfill any gaps."""
     handler = DataHandler()
-    timeframes = ['4h', '1h', '15m']
-    for tf in timeframes:
-        handler.fetch_historical_data(tf)
+    # Coarser timeframes are aggregated from the base candles on load, so only the base needs downloading
+    timeframes = [BASE_TIMEFRAME] if DERIVE_FROM_BASE_TIMEFRAME else ['4h', '1h', '15m']
+    symbols = list(dict.fromkeys([SYMBOL] + PORTFOLIO_SYMBOLS))  # Portfolio backtest pairs too
+    fetch_all(sync_jobs(timeframes, symbols, store=handler.store), store=handler.store)
+    start_timestamp = int(pd.to_datetime(HISTORY_START_DATE).timestamp() * 1000)
+    for symbol in symbols:
+        symbol_handler = DataHandler(exchange=handler.exchange, store=handler.store, symbol=symbol)
+        for tf in timeframes:
+            if handler.store.exists(candle_key(symbol, tf)):
+                symbol_handler.repair_gaps(tf, start_timestamp)
 
 def train(timeframe=TIMEFRAME):
     """Train the ML model on historical data."""
+    profiler = StageProfiler('train')
     handler = DataHandler()
-    df = handler.load_historical_data(timeframe)
+    with profiler.stage('load candles'):
+        df = handler.load_historical_data(timeframe)
     if df.empty:
         print(f"No {timeframe} data available for training.")
         return
-    df = calculate_indicators(df)
+    with profiler.stage('features'):
+        df = load_features(df, ML_FEATURES)
     model = MLModel()
-    accuracy = model.train(df)
+    accuracy = model.train(df, profiler)
+    ModelRegistry().register(model.model, model.training_metadata, activate=True)
     print(f"ML Model Trained on {timeframe} data. Accuracy: {accuracy:.2f}")
 
+def scan_thresholds(timeframe=TIMEFRAME):
+    """Signal count and precision of the saved model at every probability threshold, from cached predictions."""
+    handler = DataHandler()
+    df = load_features(handler.load_historical_data(timeframe), ML_FEATURES)
+    pred_prob = cached_predict(MLModel(), df, label=timeframe)
+    labels = make_target(df['close'])
+    scan = pd.DataFrame(threshold_scan(pred_prob[:-1], labels[:-1], np.round(np.arange(0.40, 0.91, 0.01), 2)))
+    print(f"Threshold scan on {timeframe} ({len(df) - 1} candles, base rate {labels[:-1].mean():.3f}):")
+    print(scan.to_string(index=False))
+    return scan
+
 if __name__ == "__main__":
     if len(sys.argv) < 2:
-        print("Usage: python -m src.main [fetch|train|backtest] [optional: timeframe]")
+        print("Usage: python -m src.main [fetch|train|backtest|sweep|walkforward|tune|thresholds|replay|stress|portfolio] [optional: timeframe]")
         sys.exit(1)
     command = sys.argv[1].lower()
     if command == "fetch":
@@ -36,6 +72,32 @@ if __name__ == "__main__":
         train(timeframe)
     elif command == "backtest":
         timeframe = sys.argv[2] if len(sys.argv) > 2 else TIMEFRAME
-        backtest(timeframe)
+        if len(sys.argv) > 3:
+            backtest(timeframe, intrabar_timeframe=sys.argv[3])  # e.g. backtest 4h 15m
+        else:
+            backtest(timeframe)
+    elif command == "sweep":
+        timeframe = sys.argv[2] if len(sys.argv) > 2 else TIMEFRAME
+        run_sweep(timeframe)
+    elif command == "walkforward":
+        timeframe = sys.argv[2] if len(sys.argv) > 2 else TIMEFRAME
+        predictions, folds = walk_forward(timeframe)
+        if len(predictions):
+            backtest(timeframe, predictions)
+    elif command == "tune":
+        timeframe = sys.argv[2] if len(sys.argv) > 2 else TIMEFRAME
+        tune(timeframe)
+    elif command == "thresholds":
+        timeframe = sys.argv[2] if len(sys.argv) > 2 else TIMEFRAME
+        scan_thresholds(timeframe)
+    elif command == "replay":
+        timeframe = sys.argv[2] if len(sys.argv) > 2 else TIMEFRAME
+        replay_check(timeframe)
+    elif command == "stress":
+        timeframe = sys.argv[2] if len(sys.argv) > 2 else TIMEFRAME
+        run_stress(timeframe)
+    elif command == "portfolio":
+        timeframe = sys.argv[2] if len(sys.argv) > 2 else TIMEFRAME
+        portfolio_backtest(timeframe=timeframe)
     else:
-        print(f"Unknown command: {command}. Use 'fetch', 'train', or 'backtest'.")
\ No newline at end of file
+        print(f"Unknown command: {command}. Use 'fetch', 'train', 'backtest', 'sweep', 'walkforward', 'tune', 'thresholds', 'replay', 'stress', or 'portfolio'.")
\ No newline at end of file
@@ -0,0 +1,177 @@
+import numpy as np
+import pandas as pd
+from src.backtest_engine import BUY, SELL, REGIMES
+from src.config import INITIAL_CAPITAL, METRICS_ROLLING_WINDOW
+
+SECONDS_PER_YEAR = 365 * 24 * 3600  # Crypto trades around the clock, so annualize by calendar time
+
+def periods_per_year(timestamps):
+    """Bars per year implied by the median spacing of int64 nanosecond (or datetime64) timestamps."""
+    ts = np.asarray(timestamps).view(np.int64)
+    if len(ts) < 2:
+        return 0.0
+    bar_seconds = float(np.median(np.diff(ts))) / 1e9
+    return SECONDS_PER_YEAR / bar_seconds if bar_seconds > 0 else 0.0
+
+def _ratio(numerator, denominator):
+    """numerator / denominator, with inf for a positive numerator over zero and 0 otherwise."""
+    if denominator > 0:
+        return numerator / denominator
+    return float('inf') if numerator > 0 else 0.0
+
+def _longest_run(mask):
+    """Length of the longest run of True values in a boolean array."""
+    if not mask.any():
+        return 0
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], mask.astype(np.int8), [0]))))
+    return int((edges[1::2] - edges[0::2]).max())
+
+def _sharpe(returns, annualize):
+    if len(returns) < 2:
+        return 0.0
+    std = returns.std(ddof=1)
+    return float(returns.mean() / std * annualize) if std > 0 else 0.0
+
+def _sortino(returns, annualize):
+    if len(returns) < 2:
+        return 0.0
+    downside = np.sqrt(np.mean(np.minimum(returns, 0.0) ** 2))
+    return float(_ratio(float(returns.mean()) * annualize, float(downside)))
+
+def position_mask(trades, timestamps, n, groups=None):
+    """Per-return-period exposure: entry i is True when the position was held from bar i to bar i + 1.
+
+    Each buy at bar j and its sell at bar k (or the last bar for an open position) cover periods j..k-1.
+    Also returns the (entry_bar, exit_bar) index arrays of the round trips. With groups (one id per trade,
+    e.g. the portfolio's trade_symbols) buys and sells are paired within each group, and the mask is True
+    while any group holds a position.
+    """
+    if groups is not None:
+        groups = np.asarray(groups)
+        in_position = np.zeros(n - 1, dtype=bool)
+        entries, exits = [np.zeros(0, dtype=np.int64)], [np.zeros(0, dtype=np.int64)]
+        for group in np.unique(groups):
+            group_mask, group_entries, group_exits = position_mask(trades[groups == group], timestamps, n)
+            in_position |= group_mask
+            entries.append(group_entries)
+            exits.append(group_exits)
+        return in_position, np.concatenate(entries), np.concatenate(exits)
+    ts = np.asarray(timestamps).view(np.int64)
+    bars = np.searchsorted(ts, trades['timestamp'].view(np.int64))
+    entries = bars[trades['type'] == BUY]
+    exits = bars[trades['type'] == SELL]
+    exits_all = np.append(exits, n - 1) if len(entries) > len(exits) else exits
+    delta = np.zeros(n, dtype=np.int64)
+    np.add.at(delta, entries, 1)
+    np.add.at(delta, exits_all, -1)
+    return np.cumsum(delta)[:-1] > 0, entries[:len(exits)], exits
+
+def rolling_metrics(portfolio_values, in_position, window, ppy):
+    """Rolling Sharpe, Sortino, return, drawdown, Calmar and exposure over the last window bars, one row per bar.
+
+    Sums come from cumulative sums and the peaks from pandas' O(n) rolling max, so this is linear in the number
+    of bars whatever the window. Drawdowns are measured from the highest value within the window.
+    """
+    pv = np.asarray(portfolio_values, dtype=np.float64)
+    n = len(pv)
+    returns = pv[1:] / pv[:-1] - 1
+    out = {name: np.full(n, np.nan) for name in ('sharpe', 'sortino', 'return', 'drawdown', 'max_drawdown', 'calmar', 'exposure')}
+    if window < 2 or n <= window:
+        return pd.DataFrame(out)
+    annualize = np.sqrt(ppy)
+
+    def window_sums(values):
+        sums = np.cumsum(np.concatenate(([0.0], values)))
+        return sums[window:] - sums[:-window]  # Sum over the window of returns ending at bar window..n-1
+
+    s1 = window_sums(returns)
+    s2 = window_sums(returns ** 2)
+    mean = s1 / window
+    std = np.sqrt(np.maximum(s2 - s1 * mean, 0.0) / (window - 1))
+    downside = np.sqrt(window_sums(np.minimum(returns, 0.0) ** 2) / window)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        out['sharpe'][window:] = np.where(std > 0, mean / std * annualize, 0.0)
+        out['sortino'][window:] = np.where(downside > 0, mean / downside * annualize, np.where(mean > 0, np.inf, 0.0))
+        out['return'][window:] = pv[window:] / pv[:-window] - 1
+        peak = pd.Series(pv).rolling(window + 1).max().to_numpy()
+        out['drawdown'] = 1 - pv / peak
+        out['max_drawdown'] = pd.Series(out['drawdown']).rolling(window + 1).max().to_numpy()
+        annual_return = (1 + out['return'][window:]) ** (ppy / window) - 1
+        max_dd = out['max_drawdown'][window:]
+        out['calmar'][window:] = np.where(max_dd > 0, annual_return / max_dd, np.where(annual_return > 0, np.inf, 0.0))
+    out['exposure'][window:] = window_sums(in_position.astype(np.float64)) / window
+    return pd.DataFrame(out)
+
+def compute_metrics(portfolio_values, trades, timestamps, trend_regime=None, initial_capital=INITIAL_CAPITAL,
+                    rolling_window=METRICS_ROLLING_WINDOW, trade_groups=None):
+    """Performance metrics from the per-bar equity curve and a backtest_engine trade array.
+
+    backtest() and the sweep workers both call this on the engine's own arrays, so the numbers agree exactly.
+    Ratios are annualized by the bar spacing of timestamps. A round trip wins when its net profit (after both
+    fees) is positive. Per-regime trade stats use the regime at exit; per-regime return stats use trend_regime
+    at the start of each bar. With rolling_window set, metrics['rolling'] holds rolling_metrics() per bar.
+    trade_groups pairs round trips per group for trades of several symbols (see position_mask).
+    """
+    pv = np.asarray(portfolio_values, dtype=np.float64)
+    n = len(pv)
+    ppy = periods_per_year(timestamps)
+    annualize = np.sqrt(ppy)
+    returns = pv[1:] / pv[:-1] - 1 if n > 1 else np.empty(0)
+
+    running_max = np.maximum.accumulate(pv) if n else pv
+    drawdowns = 1 - pv / running_max if n else pv
+    max_drawdown = float(drawdowns.max()) if n else 0.0
+    final_value = float(pv[-1]) if n else float(initial_capital)
+    total_return = (final_value - initial_capital) / initial_capital * 100
+    years = len(returns) / ppy if ppy else 0.0
+    cagr = (final_value / initial_capital) ** (1 / years) - 1 if years > 0 and final_value > 0 else 0.0
+
+    in_position, entry_bars, exit_bars = position_mask(trades, timestamps, n, trade_groups) if n else (np.zeros(0, bool), [], [])
+    sells = trades[trades['type'] == SELL]
+    profits = sells['profit_loss']
+    wins = profits > 0
+    holding = np.asarray(exit_bars) - np.asarray(entry_bars)
+
+    metrics = {
+        'final_value': final_value, 'total_return': total_return, 'cagr': cagr * 100,
+        'sharpe_ratio': _sharpe(returns, annualize), 'sortino_ratio': _sortino(returns, annualize),
+        'calmar_ratio': _ratio(cagr, max_drawdown), 'max_drawdown': max_drawdown,
+        'max_drawdown_duration': _longest_run(drawdowns > 0),  # Bars spent below a previous peak
+        'exposure': float(in_position.mean()) * 100 if len(in_position) else 0.0,
+        'periods_per_year': ppy,
+        'total_fees': float(trades['fee'].sum()),
+        'buy_count': int((trades['type'] == BUY).sum()), 'sell_count': len(sells),
+        'win_rate': float(wins.mean()) * 100 if len(sells) else 0.0,
+        'avg_win': float(profits[wins].mean()) if wins.any() else 0.0,
+        'avg_loss': float(profits[~wins].mean()) if (~wins).any() else 0.0,
+        'profit_factor': _ratio(float(profits[wins].sum()), float(-profits[~wins].sum())),
+        'avg_holding_period': float(holding.mean()) if len(holding) else 0.0,  # Bars per round trip
+        'max_consecutive_wins': _longest_run(wins), 'max_consecutive_losses': _longest_run(~wins),
+        'trend_regime_trades': {}, 'regimes': {}
+    }
+
+    bar_regime = np.asarray(trend_regime)[:-1] if trend_regime is not None and n else None
+    for code, name in enumerate(REGIMES):
+        in_regime = sells['regime'] == code
+        stats = {
+            'trades': int(in_regime.sum()),
+            'win_rate': float(wins[in_regime].mean()) * 100 if in_regime.any() else 0.0,
+            'profit': float(profits[in_regime].sum())
+        }
+        if bar_regime is not None:
+            bars = bar_regime == code
+            stats.update(bars=int(bars.sum()), sharpe_ratio=_sharpe(returns[bars], annualize),
+                         sortino_ratio=_sortino(returns[bars], annualize),
+                         exposure=float(in_position[bars].mean()) * 100 if bars.any() else 0.0)
+        metrics['regimes'][name] = stats
+        metrics['trend_regime_trades'][name] = stats['trades']
+        metrics[f"{name}_win_rate"] = stats['win_rate']
+
+    if rolling_window:
+        rolling = rolling_metrics(pv, in_position, rolling_window, ppy)
+        metrics['rolling'] = rolling
+        metrics['rolling_window'] = rolling_window
+        metrics['rolling_sharpe_min'] = float(rolling['sharpe'].min()) if rolling['sharpe'].notna().any() else 0.0
+        metrics['rolling_sharpe_median'] = float(rolling['sharpe'].median()) if rolling['sharpe'].notna().any() else 0.0
+        metrics['rolling_return_min'] = float(rolling['return'].min()) * 100 if rolling['return'].notna().any() else 0.0
+    return metrics
@@ -1,20 +1,104 @@
 import xgboost as xgb
 import pandas as pd
 import numpy as np
-from sklearn.model_selection import train_test_split
 from sklearn.metrics import precision_score, recall_score, f1_score, roc_auc_score
-from src.config import ML_FEATURES, ML_TEST_SIZE, ML_MAX_DEPTH, EARLY_STOPPING_ROUNDS
+from src.config import ML_FEATURES, ML_TEST_SIZE, ML_VALIDATION_SIZE, ML_MAX_DEPTH, EARLY_STOPPING_ROUNDS, ML_TRAIN_BATCH_ROWS
+from src.profiling import StageProfiler, LatencyRecorder
+import json
+import math
 import os
+import time
+
+MODELS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'models')
+MODEL_PATH = os.path.join(MODELS_DIR, 'xgboost_model.json')
+TUNED_PARAMS_PATH = os.path.join(MODELS_DIR, 'xgboost_params.json')  # Written by the tune command
+
+def feature_matrix(df, columns=ML_FEATURES):
+    """C-contiguous float32 matrix of the model features, filled column by column to avoid a float64 copy."""
+    X = np.empty((len(df), len(columns)), dtype=np.float32)
+    for j, column in enumerate(columns):
+        X[:, j] = df[column].to_numpy()
+    return X
+
+def make_target(close):
+    """Training labels: 1 if the next close is more than 1% higher, else 0 (the last row has no next close)."""
+    close = np.asarray(close, dtype=np.float64)
+    y = np.zeros(len(close), dtype=np.float32)
+    y[:-1] = close[1:] / close[:-1] - 1 > 0.01
+    return y
+
+def load_tuned_params(path=TUNED_PARAMS_PATH):
+    """Best parameters found by the tune command, or {} if no search has been run."""
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        params = json.load(f)['params']
+    print(f"Using tuned XGBoost parameters from {path}: {params}")
+    return params
+
+def booster_params(y_train, overrides=None):
+    """XGBoost parameters (tuned for 55.40% run), with scale_pos_weight balancing the training labels.
+
+    overrides (e.g. from load_tuned_params) replace the hand-tuned defaults.
+    """
+    # Calculate scale_pos_weight to handle class imbalance
+    neg_count = np.sum(y_train == 0)
+    pos_count = np.sum(y_train == 1)
+    scale_pos_weight = neg_count / pos_count if pos_count > 0 else 1
+    params = {
+        'max_depth': ML_MAX_DEPTH,  # Tree depth (6) for complexity
+        'learning_rate': 0.002,  # Small learning rate for постепенное обучение
+        'objective': 'binary:logistic',  # Binary classification objective
+        'eval_metric': 'logloss',  # Evaluation metric
+        'scale_pos_weight': scale_pos_weight,  # Base value for balanced precision/recall
+        'random_state': 42,  # Seed for reproducibility
+        'min_child_weight': 15,  # Regularization to prevent overfitting
+        'subsample': 0.8,  # 80% of data per tree to reduce overfitting
+        'colsample_bytree': 0.7  # 70% of features per tree for diversity
+    }
+    params.update(overrides or {})
+    return params
+
+def chronological_split(n, test_size=ML_TEST_SIZE, val_size=ML_VALIDATION_SIZE):
+    """Row bounds (train_end, val_end) of an unshuffled split, sized like sklearn's train_test_split."""
+    val_end = n - math.ceil(test_size * n)
+    train_end = val_end - math.ceil(val_size * val_end)
+    return train_end, val_end
+
+class _FrameBatches(xgb.DataIter):
+    """Feeds rows [start, stop) of a feature frame to xgboost as float32 batches, never materialising the whole matrix."""
+
+    def __init__(self, df, labels, start, stop, batch_rows):
+        self.df = df
+        self.labels = labels
+        self.bounds = list(range(start, stop, batch_rows)) + [stop]
+        self.position = 0
+        super().__init__()
+
+    def next(self, input_data):
+        if self.position >= len(self.bounds) - 1:
+            return False
+        start, stop = self.bounds[self.position], self.bounds[self.position + 1]
+        input_data(data=feature_matrix(self.df.iloc[start:stop]), label=self.labels[start:stop], feature_names=ML_FEATURES)
+        self.position += 1
+        return True
+
+    def reset(self):
+        self.position = 0
 
 class MLModel:
-    def __init__(self, model_path=os.path.join(os.path.dirname(os.path.dirname(__file__)), 'models', 'xgboost_model.json')):
+    def __init__(self, model_path=MODEL_PATH):
         """Initialize the ML model, loading from file if it exists."""
         self.model = None
         self.model_path = model_path
+        self.training_metadata = None  # Set by train(); stored alongside the model in the registry
+        self.buffer = np.zeros((1, len(ML_FEATURES)), dtype=np.float32)  # Reused input row for predict_fast
+        self.latency = LatencyRecorder()
         if os.path.exists(self.model_path):
             try:
                 self.model = xgb.Booster()
                 self.model.load_model(self.model_path)
+                self._check_features()
                 print(f"Loaded existing model from {self.model_path}")
             except Exception as e:
                 print(f"Error loading model from {self.model_path}: {e}")
@@ -22,64 +106,58 @@ class MLModel:
         else:
             print(f"No model file found at {self.model_path}. Model must be trained first.")
 
-    def train(self, df):
+    def train(self, df, profiler=None, batch_rows=ML_TRAIN_BATCH_ROWS):
         """Train the XGBoost model to predict >1% price increases."""
         print("Training ML Model...")
-        # Define target: 1 if next close increases >1%, 0 otherwise
-        df['target'] = (df['close'].shift(-1) / df['close'] - 1 > 0.01).astype(int)
-        df = df.dropna()
-        print(f"Training Data Shape after preprocessing: {df.shape}")
-        print(f"Sample target distribution: {df['target'].value_counts(normalize=True)}")
-
-        # Prepare features and target
-        X = df[ML_FEATURES]
-        y = df['target']
-
-        # Split data: 70% train, 15% validation, 15% test (no shuffle for time series)
-        X_temp, X_test, y_temp, y_test = train_test_split(X, y, test_size=0.15, shuffle=False)
-        X_train, X_val, y_train, y_val = train_test_split(X_temp, y_temp, test_size=0.1765, shuffle=False)  # 0.1765 of 0.85 = 0.15 of total
-        print(f"Train Set Shape: {X_train.shape}, Validation Set Shape: {X_val.shape}, Test Set Shape: {X_test.shape}")
-
-        # Convert to DMatrix for xgboost.train
-        dtrain = xgb.DMatrix(X_train, label=y_train)
-        dval = xgb.DMatrix(X_val, label=y_val)
-        dtest = xgb.DMatrix(X_test, label=y_test)
-
-        # Calculate scale_pos_weight to handle class imbalance
-        neg_count = np.sum(y_train == 0)
-        pos_count = np.sum(y_train == 1)
-        scale_pos_weight = neg_count / pos_count if pos_count > 0 else 1
-        print(f"Scale Positive Weight: {scale_pos_weight:.2f}")
-
-        # Define XGBoost parameters (tuned for 55.40% run)
-        params = {
-            'max_depth': ML_MAX_DEPTH,  # Tree depth (6) for complexity
-            'learning_rate': 0.002,  # Small learning rate for постепенное обучение
-            'objective': 'binary:logistic',  # Binary classification objective
-            'eval_metric': 'logloss',  # Evaluation metric
-            'scale_pos_weight': scale_pos_weight,  # Base value for balanced precision/recall
-            'random_state': 42,  # Seed for reproducibility
-            'min_child_weight': 15,  # Regularization to prevent overfitting
-            'subsample': 0.8,  # 80% of data per tree to reduce overfitting
-            'colsample_bytree': 0.7  # 70% of features per tree for diversity
-        }
+        profiler = profiler or StageProfiler('train')
+        y = make_target(df['close'])
+        print(f"Training Data Shape after preprocessing: {(len(df), len(ML_FEATURES) + 1)}")
+        print(f"Sample target distribution: {pd.Series(y.astype(int)).value_counts(normalize=True)}")
+
+        # Chronological 70/15/15 split as row ranges: train [0, train_end), validation [train_end, val_end), test [val_end, n)
+        train_end, val_end = chronological_split(len(df))
+        print(f"Train Set Shape: {(train_end, len(ML_FEATURES))}, Validation Set Shape: {(val_end - train_end, len(ML_FEATURES))}, "
+              f"Test Set Shape: {(len(df) - val_end, len(ML_FEATURES))}")
+
+        # QuantileDMatrix keeps only quantised bins; validation reuses the training cuts
+        batched = batch_rows and len(df) > batch_rows
+        with profiler.stage('feature matrix'):
+            X = None if batched else feature_matrix(df)
+        with profiler.stage('dmatrix'):
+            if batched:
+                dtrain = xgb.QuantileDMatrix(_FrameBatches(df, y, 0, train_end, batch_rows))
+                dval = xgb.QuantileDMatrix(_FrameBatches(df, y, train_end, val_end, batch_rows), ref=dtrain)
+            else:
+                dtrain = xgb.QuantileDMatrix(X[:train_end], label=y[:train_end], feature_names=ML_FEATURES)
+                dval = xgb.QuantileDMatrix(X[train_end:val_end], label=y[train_end:val_end], ref=dtrain, feature_names=ML_FEATURES)
+        y_train, y_test = y[:train_end], y[val_end:].astype(int)
+
+        params = booster_params(y_train, load_tuned_params())
+        print(f"Scale Positive Weight: {params['scale_pos_weight']:.2f}")
 
         # Train with early stopping to optimize performance
         evals = [(dtrain, 'train'), (dval, 'validation')]
-        self.model = xgb.train(
-            params,
-            dtrain,
-            num_boost_round=2000,  # Max rounds, stopped early if needed
-            evals=evals,
-            early_stopping_rounds=EARLY_STOPPING_ROUNDS,  # Stop after 50 rounds of no improvement
-            verbose_eval=True  # Print training progress
-        )
+        with profiler.stage('train'):
+            self.model = xgb.train(
+                params,
+                dtrain,
+                num_boost_round=2000,  # Max rounds, stopped early if needed
+                evals=evals,
+                early_stopping_rounds=EARLY_STOPPING_ROUNDS,  # Stop after 50 rounds of no improvement
+                verbose_eval=True  # Print training progress
+            )
+        del dtrain, dval
 
         # Evaluate on test set with threshold 0.55
-        y_pred_prob = self.model.predict(dtest)
+        with profiler.stage('evaluate'):
+            if batched:
+                y_pred_prob = np.concatenate([self.model.inplace_predict(feature_matrix(df.iloc[start:start + batch_rows]))
+                                              for start in range(val_end, len(df), batch_rows)])
+            else:
+                y_pred_prob = self.model.inplace_predict(X[val_end:])
         threshold = 0.55  # Threshold for binary prediction
-        y_pred_binary = [1 if p > threshold else 0 for p in y_pred_prob]
-        accuracy = np.mean(np.array(y_pred_binary) == np.array(y_test))
+        y_pred_binary = (y_pred_prob > threshold).astype(int)
+        accuracy = np.mean(y_pred_binary == y_test)
         precision = precision_score(y_test, y_pred_binary)
         recall = recall_score(y_test, y_pred_binary)
         f1 = f1_score(y_test, y_pred_binary)
@@ -89,6 +167,15 @@ class MLModel:
         print(f"Recall (positive class): {recall:.2f}")
         print(f"F1-Score (positive class): {f1:.2f}")
         print(f"ROC-AUC Score: {roc_auc:.2f}")
+        timestamps = df['timestamp'].astype(str).to_numpy() if 'timestamp' in df else None
+        self.training_metadata = {
+            'features': ML_FEATURES, 'rows': len(df), 'params': params, 'best_iteration': self.model.best_iteration,
+            'train_from': timestamps[0] if timestamps is not None else None,
+            'train_to': timestamps[train_end - 1] if timestamps is not None else None,
+            'test_from': timestamps[val_end] if timestamps is not None else None,
+            'test_to': timestamps[-1] if timestamps is not None else None,
+            'metrics': {'accuracy': accuracy, 'precision': precision, 'recall': recall, 'f1': f1, 'roc_auc': roc_auc}
+        }
 
         # Display feature importance for analysis
         importance = self.model.get_score(importance_type='weight')
@@ -101,8 +188,44 @@ class MLModel:
         os.makedirs(os.path.dirname(self.model_path), exist_ok=True)  # Ensure directory exists
         self.model.save_model(self.model_path)
         print(f"Model saved to {self.model_path}")
+        profiler.summary()
         return accuracy
 
+    def _check_features(self):
+        """Fail at load time if the model expects a different feature order than ML_FEATURES."""
+        names = self.model.feature_names
+        if names is not None and list(names) != ML_FEATURES:
+            raise ValueError(f"model features {names} do not match ML_FEATURES {ML_FEATURES}")
+        if self.model.num_features() != len(ML_FEATURES):
+            raise ValueError(f"model expects {self.model.num_features()} features, ML_FEATURES has {len(ML_FEATURES)}")
+
+    def predict_fast(self, features):
+        """Low-latency probabilities for one row or a small batch, without building a DMatrix.
+
+        features is a mapping with the ML_FEATURES keys (e.g. StreamingIndicators.latest), a 1-D
+        row or a 2-D batch in ML_FEATURES order. Rows are copied into a reused float32 buffer and
+        scored with inplace_predict; the feature order was validated when the model was loaded.
+        """
+        start = time.perf_counter()
+        if hasattr(features, 'keys'):
+            buffer = self.buffer[:1]  # The buffer may have grown for an earlier batch; score just this row
+            for j, name in enumerate(ML_FEATURES):
+                buffer[0, j] = features[name]
+        else:
+            rows = np.asarray(features)
+            rows = rows.reshape(1, -1) if rows.ndim == 1 else rows
+            if rows.shape[1] != len(ML_FEATURES):
+                raise ValueError(f"Expected {len(ML_FEATURES)} features per row, got {rows.shape[1]}")
+            if len(rows) > len(self.buffer):
+                self.buffer = np.zeros((len(rows), len(ML_FEATURES)), dtype=np.float32)
+            buffer = self.buffer[:len(rows)]
+            buffer[:] = rows
+        if self.model is None:
+            return np.zeros(len(buffer))
+        pred_prob = self.model.inplace_predict(buffer)
+        self.latency.record(time.perf_counter() - start)
+        return pred_prob
+
     def predict(self, X):
         """Predict probabilities using the trained model."""
         if self.model is None:
@@ -0,0 +1,189 @@
+import json
+import os
+import sys
+import threading
+import time
+import xgboost as xgb
+from src.ml_model import MLModel, MODELS_DIR, MODEL_PATH
+from src.index_file import locked, read_json, write_json
+from src.config import MODEL_POLL_SECONDS
+
+REGISTRY_ROOT = os.path.join(MODELS_DIR, 'registry')
+REGISTRY_INDEX = 'registry.json'
+ARTIFACT = 'model.ubj'  # XGBoost's binary (Universal Binary JSON) format: much faster to load than .json
+
+class ModelRegistry:
+    """Versioned model artifacts (models/registry/vNNNN/model.ubj + metadata.json) with active/candidate pointers.
+
+    The active version is also published to published_path (MODEL_PATH), the file MLModel() and the backtests load,
+    so backtests always score the model LiveTrader trades with.
+    """
+
+    def __init__(self, root=REGISTRY_ROOT, published_path=MODEL_PATH):
+        self.root = root
+        self.published_path = published_path
+
+    def _index_path(self):
+        return os.path.join(self.root, REGISTRY_INDEX)
+
+    def index(self):
+        return read_json(self._index_path(), lambda: {'active': None, 'candidate': None, 'versions': []})
+
+    def _locked(self):
+        """Exclusive across processes: every index change is a read-modify-write under this lock."""
+        os.makedirs(self.root, exist_ok=True)
+        return locked(self._index_path())
+
+    def state_token(self):
+        """Changes whenever the index is rewritten; lets watchers detect promotions cheaply."""
+        try:
+            return os.stat(self._index_path()).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def model_path(self, version):
+        return os.path.join(self.root, version, ARTIFACT)
+
+    def metadata(self, version):
+        with open(os.path.join(self.root, version, 'metadata.json')) as f:
+            return json.load(f)
+
+    def register(self, booster, metadata, activate=False):
+        """Save a trained booster as the next version; returns the version name.
+
+        The version is allocated and recorded under the index lock, so concurrent train/tune runs get distinct versions.
+        """
+        with self._locked():
+            index = self.index()
+            version = f"v{len(index['versions']) + 1:04d}"
+            path = os.path.join(self.root, version)
+            os.makedirs(path, exist_ok=True)
+            booster.save_model(self.model_path(version))
+            metadata = dict(metadata, version=version, created=time.strftime('%Y-%m-%d %H:%M:%S'))
+            with open(os.path.join(path, 'metadata.json'), 'w') as f:
+                json.dump(metadata, f, indent=2, default=float)
+            index['versions'].append(version)
+            if activate:
+                index['active'] = version
+                self._publish(version)
+            write_json(self._index_path(), index)
+        print(f"Registered model {version}{' (active)' if activate else ''} at {path}")
+        return version
+
+    def promote(self, version):
+        """Make a version the one LiveTrader trades with (clearing it as candidate)."""
+        with self._locked():
+            index = self.index()
+            if version not in index['versions']:
+                raise ValueError(f"Unknown model version: {version}")
+            index['active'] = version
+            if index.get('candidate') == version:
+                index['candidate'] = None
+            self._publish(version)
+            write_json(self._index_path(), index)
+
+    def _publish(self, version):
+        """Atomically write a version's booster to published_path, in the format its extension names."""
+        booster = xgb.Booster()
+        booster.load_model(self.model_path(version))
+        os.makedirs(os.path.dirname(self.published_path), exist_ok=True)
+        base, ext = os.path.splitext(self.published_path)
+        tmp_path = f"{base}.tmp{ext}"  # Keep the extension: XGBoost picks JSON or UBJ from it
+        booster.save_model(tmp_path)
+        os.replace(tmp_path, self.published_path)
+
+    def set_candidate(self, version):
+        """Shadow-score a version alongside the active one (None stops shadowing)."""
+        with self._locked():
+            index = self.index()
+            if version is not None and version not in index['versions']:
+                raise ValueError(f"Unknown model version: {version}")
+            index['candidate'] = version
+            write_json(self._index_path(), index)
+
+    def load(self, version):
+        """Load a version as an MLModel."""
+        start = time.perf_counter()
+        model = MLModel(model_path=self.model_path(version))
+        print(f"Loaded model {version} in {(time.perf_counter() - start) * 1000:.1f} ms")
+        return model
+
+class ModelWatcher(threading.Thread):
+    """Background thread that loads newly promoted or shadowed models so the trading loop never blocks on I/O.
+
+    The trading loop calls take_update() between candles and swaps in whatever has been loaded.
+    """
+
+    def __init__(self, registry, active=None, candidate=None, poll_seconds=MODEL_POLL_SECONDS):
+        super().__init__(daemon=True)
+        self.registry = registry
+        self.poll_seconds = poll_seconds
+        self.loaded = {'active': active, 'candidate': candidate}  # Versions the trader already has
+        self.token = registry.state_token()
+        self.lock = threading.Lock()
+        self.update = None
+        self.stopped = threading.Event()
+
+    def check(self):
+        """Load any version the registry now points to that differs from what is loaded."""
+        token = self.registry.state_token()
+        if token == self.token:
+            return
+        self.token = token
+        index = self.registry.index()
+        update = {}
+        for role in ('active', 'candidate'):
+            version = index.get(role)
+            if version == self.loaded[role]:
+                continue
+            model = self.registry.load(version) if version else None
+            if model is not None and model.model is None:
+                print(f"Keeping the current {role} model: {version} failed to load")
+                continue
+            update[role] = (version, model)
+            self.loaded[role] = version
+        if update:
+            with self.lock:
+                self.update = dict(self.update or {}, **update)
+
+    def take_update(self):
+        """Return and clear {role: (version, model)} loaded since the last call, or None."""
+        with self.lock:
+            update, self.update = self.update, None
+        return update
+
+    def run(self):
+        while not self.stopped.wait(self.poll_seconds):
+            try:
+                self.check()
+            except Exception as e:
+                print(f"Error checking model registry: {e}")
+
+    def stop(self):
+        self.stopped.set()
+
+if __name__ == "__main__":
+    # python -m src.model_registry [list | promote VERSION | candidate VERSION | clear-candidate]
+    registry = ModelRegistry()
+    command = sys.argv[1].lower() if len(sys.argv) > 1 else 'list'
+    if command == 'list':
+        index = registry.index()
+        for version in index['versions']:
+            metadata = registry.metadata(version)
+            role = 'active' if version == index['active'] else 'candidate' if version == index.get('candidate') else ''
+            metrics = metadata.get('metrics', {})
+            print(f"{version}  {role:<9} {metadata['created']}  trained {metadata.get('train_from')} -> "
+                  f"{metadata.get('train_to')}  AUC {metrics.get('roc_auc', float('nan')):.3f}  "
+                  f"precision {metrics.get('precision', float('nan')):.3f}")
+        print(f"{len(index['versions'])} versions")
+    elif command == 'promote' and len(sys.argv) > 2:
+        registry.promote(sys.argv[2])
+        print(f"Promoted {sys.argv[2]}")
+    elif command == 'candidate' and len(sys.argv) > 2:
+        registry.set_candidate(sys.argv[2])
+        print(f"Shadow-scoring {sys.argv[2]}")
+    elif command == 'clear-candidate':
+        registry.set_candidate(None)
+        print("Shadow scoring stopped")
+    else:
+        print("Usage: python -m src.model_registry [list | promote VERSION | candidate VERSION | clear-candidate]")
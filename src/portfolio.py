@@ -0,0 +1,260 @@
+import os
+import time
+from bisect import bisect_left
+from multiprocessing import Pool, cpu_count
+import numpy as np
+import pandas as pd
+from src.data_handler import DataHandler
+from src.feature_store import load_features
+from src.ml_model import MLModel, MODEL_PATH
+from src.prediction_cache import cached_predict
+from src.backtest_engine import (TRADE_DTYPE, TRADE_TYPES, EXIT_REASONS, BUY, SELL, STOP_LOSS, TAKE_PROFIT,
+                                 TRAILING_STOP, default_params)
+from src.metrics import compute_metrics
+from src.config import (STRATEGY_COLUMNS, SIGNAL_THRESHOLD, TIMEFRAME, INITIAL_CAPITAL, PORTFOLIO_SYMBOLS,
+                        MAX_TOTAL_EXPOSURE)
+
+REPORTS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'reports')
+SYMBOL_METRICS = ['exposure', 'win_rate', 'profit_factor', 'total_fees', 'avg_holding_period', 'sell_count']
+
+def symbol_arrays(task):
+    """Load one symbol's candles, features and model probabilities; runs in a worker process.
+
+    Workers share the feature store and prediction cache on disk; both merge their index under a file lock,
+    so a cold cache filled by several workers at once keeps every symbol's entry.
+    """
+    symbol, timeframe, model_path = task
+    df = DataHandler(symbol=symbol).load_historical_data(timeframe)
+    if df.empty:
+        return symbol, None
+    df = load_features(df, STRATEGY_COLUMNS)
+    pred_prob = cached_predict(MLModel(model_path), df, label=f"{symbol} {timeframe}")
+    return symbol, {
+        'timestamp': df['timestamp'].to_numpy(dtype='datetime64[ns]').view(np.int64),
+        'close': df['close'].to_numpy(dtype=np.float64),
+        'atr': df['ATR'].to_numpy(dtype=np.float64),
+        'pred_prob': np.asarray(pred_prob, dtype=np.float64),
+        'trend_regime': (df['SMA50'] > df['SMA200']).to_numpy(dtype=np.int8)
+    }
+
+def align_symbols(per_symbol):
+    """Put per-symbol arrays on the union of their timestamps as (symbols, bars) arrays.
+
+    valid marks the bars a symbol actually has a candle; close is carried forward over its missing bars
+    (and 0 before its first candle) so open positions can always be valued.
+    """
+    timestamps = np.unique(np.concatenate([arrays['timestamp'] for arrays in per_symbol]))
+    n_symbols, n_bars = len(per_symbol), len(timestamps)
+    aligned = {
+        'timestamp': timestamps,
+        'valid': np.zeros((n_symbols, n_bars), dtype=bool),
+        'close': np.zeros((n_symbols, n_bars)),
+        'atr': np.zeros((n_symbols, n_bars)),
+        'pred_prob': np.zeros((n_symbols, n_bars)),
+        'trend_regime': np.zeros((n_symbols, n_bars), dtype=np.int8)
+    }
+    bars = np.arange(n_bars)
+    for s, arrays in enumerate(per_symbol):
+        pos = np.searchsorted(timestamps, arrays['timestamp'])
+        aligned['valid'][s, pos] = True
+        for name in ('close', 'atr', 'pred_prob', 'trend_regime'):
+            aligned[name][s, pos] = arrays[name]
+        last = np.maximum.accumulate(np.where(aligned['valid'][s], bars, 0))
+        aligned['close'][s] = aligned['close'][s, last]
+        aligned['trend_regime'][s] = aligned['trend_regime'][s, last]
+    return aligned
+
+def run_portfolio_engine(close, atr, signal, trend_regime, valid, timestamp, params=None,
+                         max_total_exposure=MAX_TOTAL_EXPOSURE):
+    """Simulate all symbols over one shared cash balance in a single pass over the common clock.
+
+    Each symbol follows backtest_engine's rules (ATR stop-loss, take-profit, trailing stop, cooldown), with its
+    state held in per-symbol arrays so every bar is a handful of vectorized operations across symbols. New
+    signals on a bar share the regime position fraction of portfolio value between them, and are scaled down
+    together so cash is never negative and open positions stay within max_total_exposure of portfolio value.
+    Bars where nothing is held and nothing signals are skipped. With one symbol and a cap of at least the
+    position fraction this reproduces run_engine's fills.
+    Returns (trades, trade_symbols, portfolio_values, symbol_pnl) where symbol_pnl is each symbol's realized
+    plus unrealized profit per bar.
+    """
+    p = default_params()
+    if params:
+        p.update(params)
+    n_symbols, n = close.shape
+    fee_rate = p['fee_rate']
+    cooldown_candles = int(p['cooldown'])
+    take_profit_atr = p['take_profit_atr']
+    trailing_factor = 1 - p['trailing_stop_percent']
+    stop_mult = np.where(trend_regime == 1, p['stop_loss_atr'], p['choppy_stop_loss_atr'])
+    size_fraction = np.where(trend_regime == 1, p['position_size_fraction'], p['choppy_position_size_fraction'])
+    signal = (signal == 1) & valid
+
+    trades = np.zeros(2 * int(signal.sum()), dtype=TRADE_DTYPE)
+    trade_symbols = np.zeros(len(trades), dtype=np.int64)
+    portfolio_values = np.empty(n, dtype=np.float64)
+    symbol_pnl = np.zeros((n_symbols, n), dtype=np.float64)
+
+    cash = float(p['initial_capital'])
+    amount = np.zeros(n_symbols)
+    entry_price = np.zeros(n_symbols)
+    cost = np.zeros(n_symbols)  # Cash paid for the open position (fee included)
+    buy_fee = np.zeros(n_symbols)
+    peak = np.zeros(n_symbols)
+    entry_bar = np.zeros(n_symbols, dtype=np.int64)
+    next_entry = np.zeros(n_symbols, dtype=np.int64)  # First bar a symbol may enter again after its cooldown
+    held = np.zeros(n_symbols, dtype=bool)
+    realized = np.zeros(n_symbols)
+    signal_bars = np.flatnonzero(signal.any(axis=0)).tolist()
+    count = 0
+    t = 0
+    while t < n:
+        if not held.any():
+            # Flat everywhere: nothing happens until the next bar with a signal
+            s = bisect_left(signal_bars, t)
+            j = signal_bars[s] if s < len(signal_bars) else n
+            portfolio_values[t:j] = cash
+            symbol_pnl[:, t:j] = realized[:, None]
+            if j == n:
+                break
+            t = j
+        price = close[:, t]
+        # Marked before this bar's fills, like run_engine
+        unrealized = amount * price - cost
+        portfolio_value = cash + float((amount * price).sum())
+        portfolio_values[t] = portfolio_value
+        symbol_pnl[:, t] = realized + unrealized
+
+        # Exits on symbols held since before this bar and trading on it
+        check = held & valid[:, t] & (entry_bar < t)
+        if check.any():
+            stop_hit = check & (price < entry_price - atr[:, t] * stop_mult[:, t])
+            take_hit = check & (price > entry_price + take_profit_atr * atr[:, t])
+            trail_hit = check & (price < peak * trailing_factor)
+            exits = stop_hit | take_hit | trail_hit
+            peak = np.where(check & ~exits, np.maximum(peak, price), peak)
+            for s in np.flatnonzero(exits).tolist():
+                exit_price = float(price[s])
+                fee = amount[s] * exit_price * fee_rate
+                row = trades[count]
+                row['trade_number'] = count + 1
+                row['type'] = SELL
+                row['timestamp'] = timestamp[t]
+                row['price'] = exit_price
+                row['amount'] = amount[s]
+                row['portfolio_value'] = portfolio_value
+                row['fee'] = fee
+                row['reason'] = STOP_LOSS if stop_hit[s] else TAKE_PROFIT if take_hit[s] else TRAILING_STOP
+                row['profit_loss'] = (exit_price - entry_price[s]) * amount[s] - fee - buy_fee[s]
+                row['regime'] = trend_regime[s, t]
+                row['holding_period'] = int(timestamp[t] - timestamp[entry_bar[s]]) / 1e9 / (3600 * 4)
+                trade_symbols[count] = s
+                count += 1
+                proceeds = amount[s] * exit_price * (1 - fee_rate)
+                cash += proceeds
+                realized[s] += proceeds - cost[s]
+                amount[s] = cost[s] = 0.0
+                held[s] = False
+                next_entry[s] = t + 1 + cooldown_candles
+
+        # Entries: concurrent signals split the position fraction, capped by cash and total exposure
+        candidates = np.flatnonzero(signal[:, t] & ~held & (next_entry <= t))
+        if len(candidates):
+            trade_value = size_fraction[candidates, t] * portfolio_value / len(candidates)
+            exposure = float((amount * price).sum())
+            budget = min(cash, max_total_exposure * portfolio_value - exposure)
+            if budget < p['position_size_fraction'] * portfolio_value * p['min_cash_fraction'] / len(candidates):
+                candidates = candidates[:0]
+            elif trade_value.sum() > budget:
+                trade_value *= budget / trade_value.sum()
+            for s, value in zip(candidates.tolist(), trade_value.tolist()):
+                entry = float(price[s])
+                amount[s] = (value / entry) * (1 - fee_rate)
+                buy_fee[s] = amount[s] * entry * fee_rate
+                row = trades[count]
+                row['trade_number'] = count + 1
+                row['type'] = BUY
+                row['timestamp'] = timestamp[t]
+                row['price'] = entry
+                row['amount'] = amount[s]
+                row['portfolio_value'] = portfolio_value
+                row['fee'] = buy_fee[s]
+                row['regime'] = trend_regime[s, t]
+                trade_symbols[count] = s
+                count += 1
+                cash -= value
+                cost[s] = value
+                entry_price[s] = peak[s] = entry
+                entry_bar[s] = t
+                held[s] = True
+        t += 1
+
+    return trades[:count], trade_symbols[:count], portfolio_values, symbol_pnl
+
+def portfolio_backtest(symbols=None, timeframe=TIMEFRAME, processes=None, params=None,
+                       signal_threshold=SIGNAL_THRESHOLD, max_total_exposure=MAX_TOTAL_EXPOSURE, model_path=MODEL_PATH):
+    """Backtest the saved model (model_path) over a basket of symbols sharing INITIAL_CAPITAL.
+
+    Features and predictions are loaded per symbol in parallel (each through the feature store and prediction
+    cache), aligned on a common clock and simulated together by run_portfolio_engine. Per-symbol and portfolio
+    metrics are printed and written to reports/portfolio_<timeframe>_symbols.csv, with the trades in
+    reports/portfolio_<timeframe>_trades.csv. Returns (summary, trades, metrics).
+    """
+    symbols = list(symbols or PORTFOLIO_SYMBOLS)
+    processes = min(processes or cpu_count(), len(symbols))
+    start = time.time()
+    with Pool(processes) as pool:
+        loaded = dict(pool.imap_unordered(symbol_arrays, [(symbol, timeframe, model_path) for symbol in symbols]))
+    missing = [symbol for symbol in symbols if loaded[symbol] is None]
+    symbols = [symbol for symbol in symbols if loaded[symbol] is not None]
+    if missing:
+        print(f"No {timeframe} data for {', '.join(missing)}; left out of the portfolio.")
+    if not symbols:
+        return pd.DataFrame(), pd.DataFrame(), {}
+    aligned = align_symbols([loaded[symbol] for symbol in symbols])
+    print(f"Loaded features for {len(symbols)} symbols in {time.time() - start:.1f}s; "
+          f"{len(aligned['timestamp'])} bars on the common clock")
+
+    start = time.time()
+    signal = (aligned['pred_prob'] > signal_threshold).astype(np.int8)
+    trades, trade_symbols, portfolio_values, symbol_pnl = run_portfolio_engine(
+        aligned['close'], aligned['atr'], signal, aligned['trend_regime'], aligned['valid'], aligned['timestamp'],
+        params, max_total_exposure
+    )
+    print(f"Simulated {len(symbols)} symbols x {len(aligned['timestamp'])} bars in {time.time() - start:.2f}s: "
+          f"{len(trades)} trades, final portfolio value {portfolio_values[-1]:.2f}")
+
+    # Portfolio regime stats use the first symbol's regime as the market regime; round trips pair per symbol
+    metrics = compute_metrics(portfolio_values, trades, aligned['timestamp'], aligned['trend_regime'][0],
+                              trade_groups=trade_symbols)
+    rows = []
+    for s, symbol in enumerate(symbols):
+        pnl = symbol_pnl[s]
+        symbol_metrics = compute_metrics(INITIAL_CAPITAL + pnl, trades[trade_symbols == s], aligned['timestamp'],
+                                         aligned['trend_regime'][s], rolling_window=None)
+        rows.append(dict({'symbol': symbol, 'return_contribution': pnl[-1] / INITIAL_CAPITAL * 100,
+                          'pnl_max_drawdown': float((np.maximum.accumulate(pnl) - pnl).max())},
+                         **{name: symbol_metrics[name] for name in SYMBOL_METRICS}))
+    rows.append(dict({'symbol': 'PORTFOLIO', 'return_contribution': metrics['total_return'],
+                      'pnl_max_drawdown': float((np.maximum.accumulate(portfolio_values) - portfolio_values).max())},
+                     **{name: metrics[name] for name in SYMBOL_METRICS}))
+    summary = pd.DataFrame(rows)
+
+    trade_table = pd.DataFrame({
+        'symbol': np.asarray(symbols, dtype=object)[trade_symbols],
+        'type': np.asarray(TRADE_TYPES, dtype=object)[trades['type']],
+        'timestamp': trades['timestamp'], 'price': trades['price'], 'amount': trades['amount'],
+        'fee': trades['fee'], 'portfolio_value': trades['portfolio_value'],
+        'reason': np.where(trades['type'] == SELL, np.asarray(EXIT_REASONS, dtype=object)[trades['reason']], ''),
+        'profit_loss': trades['profit_loss']
+    })
+    os.makedirs(REPORTS_DIR, exist_ok=True)
+    summary_path = os.path.join(REPORTS_DIR, f"portfolio_{timeframe}_symbols.csv")
+    summary.to_csv(summary_path, index=False)
+    trade_table.to_csv(os.path.join(REPORTS_DIR, f"portfolio_{timeframe}_trades.csv"), index=False)
+    print(f"Portfolio backtest on {timeframe}: return {metrics['total_return']:.2f}%, Sharpe {metrics['sharpe_ratio']:.2f}, "
+          f"Sortino {metrics['sortino_ratio']:.2f}, Calmar {metrics['calmar_ratio']:.2f}, "
+          f"max drawdown {metrics['max_drawdown'] * 100:.2f}%, exposure {metrics['exposure']:.1f}%. Per symbol "
+          f"(return contribution to the shared capital, drawdown of its P/L in USDT):")
+    print(summary.to_string(index=False))
+    print(f"Results written to '{summary_path}'.")
+    return summary, trade_table, metrics
@@ -0,0 +1,152 @@
+import hashlib
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+import xgboost as xgb
+from src.ml_model import MODEL_PATH, feature_matrix
+from src.index_file import locked, read_json, write_json
+from src.config import ML_FEATURES
+
+PREDICTION_CACHE_ROOT = os.path.join('data', 'predictions')
+INDEX = 'index.json'
+
+_file_hashes = {}  # (path, size, mtime) -> hash, so a model file is hashed once per process
+
+def model_fingerprint(model_path):
+    """Hash of the model file's bytes; changes whenever the model is retrained and saved."""
+    stat = os.stat(model_path)
+    key = (model_path, stat.st_size, stat.st_mtime_ns)
+    if key not in _file_hashes:
+        digest = hashlib.blake2b(digest_size=16)
+        with open(model_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        _file_hashes[key] = digest.hexdigest()
+    return _file_hashes[key]
+
+def feature_fingerprint(X, timestamps=None):
+    """Hash of the float32 feature matrix the model scores (and optionally the row timestamps)."""
+    digest = hashlib.blake2b(np.ascontiguousarray(X).tobytes(), digest_size=16)
+    if timestamps is not None:
+        digest.update(np.asarray(timestamps, dtype='datetime64[ms]').tobytes())
+    return digest.hexdigest()
+
+class PredictionCache:
+    """Model probabilities stored as .npy files, keyed by model file hash and feature fingerprint."""
+
+    def __init__(self, root=PREDICTION_CACHE_ROOT):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self.index = self._load_index()
+
+    def _load_index(self):
+        return read_json(os.path.join(self.root, INDEX), dict)
+
+    def _save_index(self, updated=None, removed=()):
+        """Apply this process's changes to the index on disk under the cache lock, so concurrent writers merge."""
+        path = os.path.join(self.root, INDEX)
+        with locked(path):
+            index = self._load_index()
+            index.update(updated or {})
+            for key in removed:
+                index.pop(key, None)
+            write_json(path, index)
+        self.index = index
+
+    def _path(self, key):
+        return os.path.join(self.root, f"{key}.npy")
+
+    def get(self, model_hash, features_hash):
+        key = f"{model_hash}_{features_hash}"
+        self.index = self._load_index()  # Entries other processes added since this cache was opened
+        if key not in self.index or not os.path.exists(self._path(key)):
+            return None
+        pred_prob = np.load(self._path(key))
+        self._save_index({key: dict(self.index[key], last_access=time.time())})
+        return pred_prob
+
+    def put(self, model_hash, features_hash, pred_prob, **metadata):
+        key = f"{model_hash}_{features_hash}"
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix=f"{key}.", suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, np.asarray(pred_prob, dtype=np.float32))
+        os.replace(tmp_path, self._path(key))
+        now = time.time()
+        self._save_index({key: dict(metadata, model=model_hash, features=features_hash, rows=len(pred_prob),
+                                    bytes=os.path.getsize(self._path(key)), created=now, last_access=now)})
+
+    def entries(self):
+        self.index = self._load_index()
+        return [dict(entry, key=key) for key, entry in sorted(self.index.items(), key=lambda item: item[1]['created'])]
+
+    def prune(self, current_model_hash=None, older_than_days=None, everything=False):
+        """Remove entries scored by a model other than current_model_hash, unused for older_than_days, or all of them."""
+        cutoff = time.time() - older_than_days * 86400 if older_than_days is not None else None
+        removed = []
+        for key, entry in self._load_index().items():
+            stale = current_model_hash is not None and entry['model'] != current_model_hash
+            old = cutoff is not None and entry['last_access'] < cutoff
+            if everything or stale or old:
+                if os.path.exists(self._path(key)):
+                    os.remove(self._path(key))
+                removed.append(key)
+        self._save_index(removed=removed)
+        return len(removed)
+
+def cached_predict(model, df, label=None, cache=None):
+    """model.predict over df[ML_FEATURES], reusing cached probabilities for the same model file and features."""
+    X = feature_matrix(df)
+    if model.model is None or not os.path.exists(model.model_path):
+        return model.predict(xgb.DMatrix(X, feature_names=ML_FEATURES))
+    cache = cache or PredictionCache()
+    model_hash = model_fingerprint(model.model_path)
+    features_hash = feature_fingerprint(X, df['timestamp'] if 'timestamp' in df else None)
+    pred_prob = cache.get(model_hash, features_hash)
+    if pred_prob is not None:
+        print(f"Prediction cache hit: {len(pred_prob)} probabilities for {label or 'features'} ({model_hash[:8]})")
+        return pred_prob
+    start = time.perf_counter()
+    pred_prob = model.predict(xgb.DMatrix(X, feature_names=ML_FEATURES))
+    cache.put(model_hash, features_hash, pred_prob, label=label, model_path=model.model_path)
+    print(f"Prediction cache miss: scored {len(pred_prob)} rows for {label or 'features'} in {time.perf_counter() - start:.2f}s")
+    return np.asarray(pred_prob, dtype=np.float32)
+
+def threshold_scan(pred_prob, labels, thresholds):
+    """Signal count, hits and precision at every threshold from one sort of the probabilities.
+
+    A signal fires where pred_prob > threshold; labels are the 0/1 outcomes. Returns a dict of
+    arrays aligned with thresholds.
+    """
+    pred_prob = np.asarray(pred_prob, dtype=np.float64)
+    order = np.argsort(pred_prob)
+    sorted_prob = pred_prob[order]
+    # hits_above[i] = outcomes that were hits among sorted rows i..n-1
+    hits_above = np.concatenate([np.cumsum(np.asarray(labels, dtype=np.int64)[order][::-1])[::-1], [0]])
+    first = np.searchsorted(sorted_prob, np.asarray(thresholds, dtype=np.float64), side='right')
+    signals = len(pred_prob) - first
+    hits = hits_above[first]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        precision = np.where(signals > 0, hits / signals, np.nan)
+    return {'threshold': np.asarray(thresholds), 'signals': signals, 'hits': hits, 'precision': precision}
+
+if __name__ == "__main__":
+    # python -m src.prediction_cache [list | prune [days] | clear]
+    command = sys.argv[1].lower() if len(sys.argv) > 1 else 'list'
+    cache = PredictionCache()
+    current = model_fingerprint(MODEL_PATH) if os.path.exists(MODEL_PATH) else None
+    if command == 'list':
+        entries = cache.entries()
+        for entry in entries:
+            print(f"{entry['key'][:24]}  {entry.get('label') or '-':<12} {entry['rows']:>9} rows  {entry['bytes'] / 1e6:7.2f} MB  "
+                  f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(entry['last_access']))}"
+                  f"{'  (stale model)' if current and entry['model'] != current else ''}")
+        print(f"{len(entries)} entries, {sum(entry['bytes'] for entry in entries) / 1e6:.2f} MB")
+    elif command == 'prune':
+        days = float(sys.argv[2]) if len(sys.argv) > 2 else None
+        print(f"Removed {cache.prune(current_model_hash=current, older_than_days=days)} entries")
+    elif command == 'clear':
+        print(f"Removed {cache.prune(everything=True)} entries")
+    else:
+        print(f"Unknown command: {command}. Use 'list', 'prune [days]', or 'clear'.")
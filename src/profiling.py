@@ -0,0 +1,60 @@
+import os
+import resource
+import time
+from collections import deque
+from contextlib import contextmanager
+import numpy as np
+
+def current_rss_mb():
+    """Resident set size of this process in MB (Linux /proc; falls back to the peak elsewhere)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 ** 2
+    except (OSError, ValueError):
+        return peak_rss_mb()
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 ** 2 if os.uname().sysname == 'Darwin' else peak / 1024  # bytes on macOS, KB on Linux
+
+class StageProfiler:
+    """Records wall time, RSS and peak RSS after each named stage of a pipeline."""
+
+    def __init__(self, label):
+        self.label = label
+        self.stages = []
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        yield
+        elapsed = time.perf_counter() - start
+        rss, peak = current_rss_mb(), peak_rss_mb()
+        self.stages.append((name, elapsed, rss, peak))
+        print(f"[{self.label}] {name}: {elapsed:.2f}s, RSS {rss:.0f} MB, peak {peak:.0f} MB")
+
+    def summary(self):
+        print(f"{self.label} memory profile:")
+        for name, elapsed, rss, peak in self.stages:
+            print(f"  {name:<20} {elapsed:8.2f}s  RSS {rss:8.0f} MB  peak {peak:8.0f} MB")
+
+class LatencyRecorder:
+    """Rolling window of call latencies with percentile summaries."""
+
+    def __init__(self, window=10000):
+        self.samples = deque(maxlen=window)
+
+    def record(self, seconds):
+        self.samples.append(seconds)
+
+    def percentile(self, q):
+        return float(np.percentile(self.samples, q)) if self.samples else float('nan')
+
+    def summary(self):
+        """{'count', 'p50_us', 'p99_us', 'max_us'} over the window."""
+        if not self.samples:
+            return {'count': 0, 'p50_us': float('nan'), 'p99_us': float('nan'), 'max_us': float('nan')}
+        samples = np.fromiter(self.samples, dtype=np.float64, count=len(self.samples))
+        p50, p99 = np.percentile(samples, [50, 99])  # One sort for both percentiles
+        return {'count': len(samples), 'p50_us': p50 * 1e6, 'p99_us': p99 * 1e6, 'max_us': samples.max() * 1e6}
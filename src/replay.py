@@ -0,0 +1,101 @@
+import asyncio
+import contextlib
+import os
+import sys
+import time
+import pandas as pd
+from src.data_handler import DataHandler
+from src.fake_exchange import FakeExchange
+from src.clock import SimulatedClock
+from src.live_trading import LiveTrader
+from src.ml_model import MLModel
+from src.backtest_utils import backtest
+from src.config import SYMBOL, TIMEFRAME, INITIAL_CAPITAL, TRANSACTION_FEE_RATE, REPLAY_PRICE_TOLERANCE, REPLAY_AMOUNT_TOLERANCE
+
+REPORTS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'reports')
+
+def simulated_exchange(df, timeframe, clock, ticks=None):
+    """FakeExchange serving df's candles as they close on clock, with INITIAL_CAPITAL and the backtest fee rate."""
+    timestamps = df['timestamp'].astype('datetime64[ms]').astype('int64').to_numpy()
+    columns = [df[column].to_numpy(dtype=float) for column in ('open', 'high', 'low', 'close', 'volume')]
+    rows = [[int(t), o, h, l, c, v] for t, o, h, l, c, v in zip(timestamps, *columns)]
+    quote = SYMBOL.split('/')[1]
+    return FakeExchange({timeframe: rows}, clock=clock, balances={quote: float(INITIAL_CAPITAL)},
+                        fee_rate=TRANSACTION_FEE_RATE, ticks=ticks)
+
+def replay(timeframe=TIMEFRAME, df=None, model=None, ticks=None, log_path=None):
+    """Run LiveTrader's async loop over stored candles against a simulated exchange, in virtual time.
+
+    Every candle close is one LiveTrader cycle: streaming indicators, predict_fast, the shared exit rules and
+    market orders, exactly as live. The intrabar stop monitor only runs when ticks are given. The log goes to
+    reports/replay_<timeframe>.log. Returns (trader, exchange).
+    """
+    if df is None:
+        df = DataHandler().load_historical_data(timeframe)
+    clock = SimulatedClock(df['timestamp'].iloc[0].value // 10**6)
+    exchange = simulated_exchange(df, timeframe, clock, ticks)
+    log_path = log_path or os.path.join(REPORTS_DIR, f"replay_{timeframe}.log")
+    os.makedirs(os.path.dirname(log_path), exist_ok=True)
+    start = time.perf_counter()
+    with open(log_path, 'w') as log, contextlib.redirect_stdout(log):
+        trader = LiveTrader(exchange=exchange, clock=clock, snapshot_path=None)
+        trader.model = model or MLModel()  # The same model file backtest() scores
+        trader.model_version, trader.candidate = None, None
+        trader.stop_monitor.enabled = ticks is not None
+        asyncio.run(trader.run_async(max_cycles=len(df)))
+    elapsed = time.perf_counter() - start
+    print(f"Replayed {len(df)} {timeframe} candles through LiveTrader in {elapsed:.1f}s "
+          f"({len(df) / elapsed:.0f} candles/s): {len(trader.trades)} trades, {len(exchange.orders)} orders, "
+          f"{trader.ledger.reconciles} balance requests. Log: {log_path}")
+    return trader, exchange
+
+def diff_trades(live_trades, backtest_trades, price_tolerance=REPLAY_PRICE_TOLERANCE, amount_tolerance=REPLAY_AMOUNT_TOLERANCE):
+    """Compare two trade lists position by position; returns a DataFrame with one row per mismatching trade."""
+    rows = []
+    for i in range(max(len(live_trades), len(backtest_trades))):
+        live = live_trades[i] if i < len(live_trades) else None
+        expected = backtest_trades[i] if i < len(backtest_trades) else None
+        problems = []
+        if live is None or expected is None:
+            problems.append('missing in replay' if live is None else 'missing in backtest')
+        else:
+            if live['type'] != expected['type']:
+                problems.append('type')
+            if pd.Timestamp(live['timestamp']) != pd.Timestamp(expected['timestamp']):
+                problems.append('timestamp')
+            if live.get('reason') != expected.get('reason'):
+                problems.append('reason')
+            if abs(live['price'] - expected['price']) > price_tolerance * abs(expected['price']):
+                problems.append('price')
+            if abs(live['amount'] - expected['amount']) > amount_tolerance * abs(expected['amount']):
+                problems.append('amount')
+        if problems:
+            rows.append({
+                'trade': i + 1, 'problems': ', '.join(problems),
+                'replay_type': live and live['type'], 'backtest_type': expected and expected['type'],
+                'replay_timestamp': live and live['timestamp'], 'backtest_timestamp': expected and expected['timestamp'],
+                'replay_reason': live and live.get('reason'), 'backtest_reason': expected and expected.get('reason'),
+                'replay_price': live and live['price'], 'backtest_price': expected and expected['price'],
+                'replay_amount': live and live['amount'], 'backtest_amount': expected and expected['amount']
+            })
+    return pd.DataFrame(rows)
+
+def replay_check(timeframe=TIMEFRAME):
+    """Replay history through LiveTrader and diff its trades against backtest(); returns the mismatch table."""
+    trader, _ = replay(timeframe)
+    backtest_trades, _ = backtest(timeframe, intrabar_timeframe=None)  # LiveTrader acts on closes, like the default fill mode
+    diff = diff_trades(trader.trades, backtest_trades)
+    path = os.path.join(REPORTS_DIR, f"replay_diff_{timeframe}.csv")
+    diff.to_csv(path, index=False)
+    if diff.empty:
+        print(f"Replay matches backtest: {len(backtest_trades)} identical trades.")
+    else:
+        first = diff.iloc[0]
+        print(f"Replay differs from backtest in {len(diff)} of {max(len(trader.trades), len(backtest_trades))} trades "
+              f"(replay {len(trader.trades)}, backtest {len(backtest_trades)}); first at trade {first['trade']}: "
+              f"{first['problems']}. Details: {path}")
+    return diff
+
+if __name__ == "__main__":
+    # python -m src.replay [timeframe]
+    replay_check(sys.argv[1] if len(sys.argv) > 1 else TIMEFRAME)
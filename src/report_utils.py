@@ -1,66 +1,266 @@
-from src.config import INITIAL_CAPITAL
-
-def generate_html_report(timeframe, trades, metrics):
-    """Generate HTML report with trade details and summary metrics."""
-    trade_rows = ""
-    for trade in trades:
-        trade_type_class = "buy" if trade['type'] == 'buy' else "sell"
-        reason = trade.get('reason', 'signal')
-        profit_loss = trade['profit_loss']
-        profit_loss_display = "N/A" if trade['type'] == 'buy' else f"{profit_loss:.2f}"
-        profit_loss_class = "positive" if profit_loss > 0 else "negative" if profit_loss < 0 else ""
-        trade_rows += f"<tr><td>{trade['trade_number']}</td><td><span class='{trade_type_class}'>{trade['type'].upper()}</span></td>" \
-                      f"<td>{trade['timestamp']}</td><td>{trade['price']:.2f}</td><td>{trade['amount']:.6f}</td>" \
-                      f"<td>{trade['fee']:.2f}</td><td>{trade['portfolio_value']:.2f}</td><td>{reason}</td>" \
-                      f"<td><span class='{profit_loss_class}'>{profit_loss_display}</span></td></tr>"
-
-    html_content = f"""
-    <html>
-    <head>
-        <title>Backtest Report - {timeframe}</title>
-        <style>
-            body {{ font-family: Arial, sans-serif; margin: 20px; background-color: #f4f4f4; }}
-            h1 {{ color: #333; }} h2 {{ color: #555; }}
-            table {{ width: 100%; border-collapse: collapse; margin-top: 20px; background-color: #fff; box-shadow: 0 0 10px rgba(0,0,0,0.1); }}
-            th, td {{ padding: 10px; border: 1px solid #ddd; text-align: left; }}
-            th {{ background-color: #4CAF50; color: white; }}
-            tr:nth-child(even) {{ background-color: #f2f2f2; }}
-            .summary {{ margin-top: 20px; padding: 15px; background-color: #e8f5e9; border-radius: 5px; }}
-            .trade-details {{ margin-top: 20px; }}
-            .buy {{ color: green; font-weight: bold; }} .sell {{ color: red; font-weight: bold; }}
-            .positive {{ color: green; }} .negative {{ color: red; }}
-        </style>
-    </head>
-    <body>
-        <h1>Backtest Report - {timeframe}</h1>
-        <div class="summary">
-            <h2>Summary</h2>
-            <table>
-                <tr><th>Metric</th><th>Value</th></tr>
-                <tr><td>Initial Capital</td><td>{INITIAL_CAPITAL:.2f} USDT</td></tr>
-                <tr><td>Final Portfolio Value</td><td>{metrics['final_value']:.2f} USDT</td></tr>
-                <tr><td>Total Return</td><td>{metrics['total_return']:.2f}%</td></tr>
-                <tr><td>Sharpe Ratio (Annualized)</td><td>{metrics['sharpe_ratio']:.2f}</td></tr>
-                <tr><td>Max Drawdown</td><td>{metrics['max_drawdown'] * 100:.2f}%</td></tr>
-                <tr><td>Total Trades</td><td>{len(trades)} (Buys: {len(metrics['buy_trades'])}, Sells: {len(metrics['sell_trades'])})</td></tr>
-                <tr><td>Win Rate</td><td>{metrics['win_rate']:.2f}%</td></tr>
-                <tr><td>Total Transaction Fees</td><td>{metrics['total_fees']:.2f} USDT</td></tr>
-                <tr><td>Average Holding Period (Candles)</td><td>{metrics['avg_holding_period']:.2f}</td></tr>
-                <tr><td>Profit Factor</td><td>{metrics['profit_factor']:.2f}</td></tr>
-                <tr><td>Max Consecutive Wins</td><td>{metrics['max_consecutive_wins']}</td></tr>
-                <tr><td>Max Consecutive Losses</td><td>{metrics['max_consecutive_losses']}</td></tr>
-                <tr><td>Win Rate in Trending Markets</td><td>{metrics['trending_win_rate']:.2f}% ({metrics['trend_regime_trades']['trending']} trades)</td></tr>
-                <tr><td>Win Rate in Choppy Markets</td><td>{metrics['choppy_win_rate']:.2f}% ({metrics['trend_regime_trades']['choppy']} trades)</td></tr>
-            </table>
-        </div>
-        <div class="trade-details">
-            <h2>Trade Details</h2>
-            <table>
-                <tr><th>Trade #</th><th>Type</th><th>Timestamp</th><th>Price (USDT)</th><th>Amount (BTC)</th><th>Fee (USDT)</th><th>Portfolio Value (USDT)</th><th>Reason</th><th>Profit/Loss (USDT)</th></tr>
-                {trade_rows}
-            </table>
+import html
+import io
+import json
+import math
+import os
+import numpy as np
+import pandas as pd
+from src.config import INITIAL_CAPITAL, REPORT_CHART_POINTS, REPORT_PAGE_SIZE, REPORT_CHUNK_ROWS
+
+try:
+    import pyarrow  # noqa: F401 -- only needed for the Parquet outputs
+except ImportError:
+    pyarrow = None
+
+STYLE = """
+        body { font-family: Arial, sans-serif; margin: 20px; background-color: #f4f4f4; }
+        h1 { color: #333; } h2 { color: #555; }
+        table { width: 100%; border-collapse: collapse; margin-top: 20px; background-color: #fff; box-shadow: 0 0 10px rgba(0,0,0,0.1); }
+        th, td { padding: 10px; border: 1px solid #ddd; text-align: left; }
+        th { background-color: #4CAF50; color: white; }
+        tr:nth-child(even) { background-color: #f2f2f2; }
+        .summary { margin-top: 20px; padding: 15px; background-color: #e8f5e9; border-radius: 5px; }
+        .trade-details, .chart { margin-top: 20px; }
+        .chart svg { background-color: #fff; box-shadow: 0 0 10px rgba(0,0,0,0.1); }
+        .buy { color: green; font-weight: bold; } .sell { color: red; font-weight: bold; }
+        .positive { color: green; } .negative { color: red; }
+        .pager { margin-top: 10px; } .pager button { margin-right: 5px; }
+"""
+
+# Renders one page of the embedded trade rows; only the visible page is ever in the DOM
+PAGER_SCRIPT = """
+    <script>
+    (function () {
+        var rows = JSON.parse(document.getElementById('trade-data').textContent);
+        var pageSize = %(page_size)d, page = 0, pages = Math.max(1, Math.ceil(rows.length / pageSize));
+        var body = document.getElementById('trade-rows'), label = document.getElementById('trade-page');
+        function cell(text, cls) { var td = document.createElement('td'); if (cls) { var span = document.createElement('span'); span.className = cls; span.textContent = text; td.appendChild(span); } else { td.textContent = text; } return td; }
+        function render() {
+            body.textContent = '';
+            rows.slice(page * pageSize, (page + 1) * pageSize).forEach(function (r) {
+                var tr = document.createElement('tr');
+                tr.appendChild(cell(r[0])); tr.appendChild(cell(r[1].toUpperCase(), r[1]));
+                for (var i = 2; i < 8; i++) tr.appendChild(cell(r[i]));
+                tr.appendChild(cell(r[8], r[9]));
+                body.appendChild(tr);
+            });
+            label.textContent = 'Page ' + (page + 1) + ' of ' + pages + ' (' + rows.length + ' trades)';
+        }
+        window.tradePage = function (step) { page = step === 'first' ? 0 : step === 'last' ? pages - 1 : Math.min(pages - 1, Math.max(0, page + step)); render(); };
+        render();
+    })();
+    </script>
+"""
+
+def decimate_minmax(values, max_points):
+    """Indices of at most max_points samples that keep every bucket's min and max (plus the first and last point).
+
+    Plotting the kept points draws the same envelope as the full series, so spikes and drawdowns survive.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    if n <= max_points:
+        return np.arange(n)
+    buckets = max(1, (max_points - 2) // 2)
+    size = math.ceil(n / buckets)
+    padded = np.full(buckets * size, np.nan)
+    padded[:n] = values
+    padded = padded.reshape(buckets, size)
+    offsets = np.arange(buckets) * size
+    low = offsets + np.argmin(np.where(np.isnan(padded), np.inf, padded), axis=1)
+    high = offsets + np.argmax(np.where(np.isnan(padded), -np.inf, padded), axis=1)
+    keep = np.unique(np.concatenate([[0, n - 1], low, high]))
+    return keep[keep < n]
+
+def _polyline(x, y, x_range, y_range, left, top, width, height):
+    """SVG points string mapping data coordinates into the given box."""
+    x_span = (x_range[1] - x_range[0]) or 1
+    y_span = (y_range[1] - y_range[0]) or 1
+    px = left + (x - x_range[0]) / x_span * width
+    py = top + height - (y - y_range[0]) / y_span * height
+    return ' '.join(f"{a:.1f},{b:.1f}" for a, b in zip(px, py))
+
+def equity_chart_svg(timestamps, portfolio_values, max_points=REPORT_CHART_POINTS, width=1000, height=420):
+    """Inline SVG with the equity curve and the drawdown below it, each min/max-decimated to max_points."""
+    equity = np.asarray(portfolio_values, dtype=np.float64)
+    x = np.asarray(pd.to_datetime(timestamps).astype('int64'), dtype=np.float64)
+    peak = np.maximum.accumulate(equity)
+    drawdown = np.where(peak > 0, equity / peak - 1, 0.0) * 100
+    left, right, gap = 70, 10, 30
+    plot_width = width - left - right
+    equity_height, drawdown_height = int(height * 0.62), int(height * 0.38) - gap - 20
+    x_range = (x[0], x[-1])
+
+    equity_idx = decimate_minmax(equity, max_points)
+    drawdown_idx = decimate_minmax(drawdown, max_points)
+    equity_range = (equity.min(), equity.max())
+    drawdown_range = (min(drawdown.min(), -1e-9), 0.0)
+    drawdown_top = 10 + equity_height + gap
+    equity_points = _polyline(x[equity_idx], equity[equity_idx], x_range, equity_range, left, 10, plot_width, equity_height)
+    drawdown_points = _polyline(x[drawdown_idx], drawdown[drawdown_idx], x_range, drawdown_range, left, drawdown_top,
+                                plot_width, drawdown_height)
+    first, last = pd.Timestamp(int(x[0])), pd.Timestamp(int(x[-1]))
+    zero_y = drawdown_top
+    return f"""<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" viewBox="0 0 {width} {height}" font-size="11">
+        <text x="{left}" y="{10 + 12}" fill="#555">Equity (USDT): {equity_range[0]:.0f} - {equity_range[1]:.0f}</text>
+        <rect x="{left}" y="10" width="{plot_width}" height="{equity_height}" fill="none" stroke="#ddd"/>
+        <text x="{left - 5}" y="{10 + 10}" text-anchor="end">{equity_range[1]:.0f}</text>
+        <text x="{left - 5}" y="{10 + equity_height}" text-anchor="end">{equity_range[0]:.0f}</text>
+        <polyline fill="none" stroke="#4CAF50" stroke-width="1" points="{equity_points}"/>
+        <text x="{left}" y="{drawdown_top - 5}" fill="#555">Drawdown (%): max {drawdown.min():.2f}%</text>
+        <rect x="{left}" y="{drawdown_top}" width="{plot_width}" height="{drawdown_height}" fill="none" stroke="#ddd"/>
+        <text x="{left - 5}" y="{drawdown_top + 10}" text-anchor="end">0%</text>
+        <text x="{left - 5}" y="{drawdown_top + drawdown_height}" text-anchor="end">{drawdown_range[0]:.1f}%</text>
+        <polygon fill="#f44336" fill-opacity="0.3" stroke="#f44336" stroke-width="1"
+                 points="{left},{zero_y} {drawdown_points} {left + plot_width},{zero_y}"/>
+        <text x="{left}" y="{height - 5}">{first:%Y-%m-%d}</text>
+        <text x="{left + plot_width}" y="{height - 5}" text-anchor="end">{last:%Y-%m-%d}</text>
+    </svg>"""
+
+def _trade_row(trade):
+    """[number, type, timestamp, price, amount, fee, value, reason, P/L, P/L class] as display strings."""
+    profit_loss = trade['profit_loss']
+    return [trade['trade_number'], trade['type'], str(trade['timestamp']), f"{trade['price']:.2f}", f"{trade['amount']:.6f}",
+            f"{trade['fee']:.2f}", f"{trade['portfolio_value']:.2f}", trade.get('reason', 'signal'),
+            "N/A" if trade['type'] == 'buy' else f"{profit_loss:.2f}",
+            "positive" if profit_loss > 0 else "negative" if profit_loss < 0 else ""]
+
+def _summary_rows(trades, metrics):
+    rows = [
+        ('Initial Capital', f"{INITIAL_CAPITAL:.2f} USDT"),
+        ('Final Portfolio Value', f"{metrics['final_value']:.2f} USDT"),
+        ('Total Return', f"{metrics['total_return']:.2f}%"),
+        ('Annualized Return (CAGR)', f"{metrics['cagr']:.2f}%"),
+        ('Sharpe Ratio (Annualized)', f"{metrics['sharpe_ratio']:.2f}"),
+        ('Sortino Ratio (Annualized)', f"{metrics['sortino_ratio']:.2f}"),
+        ('Calmar Ratio', f"{metrics['calmar_ratio']:.2f}"),
+        ('Max Drawdown', f"{metrics['max_drawdown'] * 100:.2f}%"),
+        ('Longest Drawdown (Candles)', f"{metrics['max_drawdown_duration']}"),
+        ('Exposure', f"{metrics['exposure']:.2f}% of candles in position"),
+        ('Total Trades', f"{len(trades)} (Buys: {metrics['buy_count']}, Sells: {metrics['sell_count']})"),
+        ('Win Rate', f"{metrics['win_rate']:.2f}% (avg win {metrics['avg_win']:.2f}, avg loss {metrics['avg_loss']:.2f} USDT)"),
+        ('Total Transaction Fees', f"{metrics['total_fees']:.2f} USDT"),
+        ('Average Holding Period (Candles)', f"{metrics['avg_holding_period']:.2f}"),
+        ('Profit Factor', f"{metrics['profit_factor']:.2f}"),
+        ('Max Consecutive Wins', f"{metrics['max_consecutive_wins']}"),
+        ('Max Consecutive Losses', f"{metrics['max_consecutive_losses']}"),
+        ('Win Rate in Trending Markets', f"{metrics['trending_win_rate']:.2f}% ({metrics['trend_regime_trades']['trending']} trades)"),
+        ('Win Rate in Choppy Markets', f"{metrics['choppy_win_rate']:.2f}% ({metrics['trend_regime_trades']['choppy']} trades)")
+    ]
+    if 'rolling' in metrics:
+        rows.append((f"Rolling Sharpe ({metrics['rolling_window']} candles)",
+                     f"min {metrics['rolling_sharpe_min']:.2f}, median {metrics['rolling_sharpe_median']:.2f}"))
+    return ''.join(f"<tr><td>{name}</td><td>{value}</td></tr>" for name, value in rows)
+
+def write_html_report(f, timeframe, trades, metrics, timestamps=None, portfolio_values=None,
+                      page_size=REPORT_PAGE_SIZE, chunk_rows=REPORT_CHUNK_ROWS):
+    """Stream the HTML report into the open text file f.
+
+    Trade rows are embedded as a JSON array written chunk_rows at a time and shown page_size rows per page;
+    the first page is also rendered as plain HTML so the report reads without JavaScript.
+    """
+    f.write(f"""<html>
+<head>
+    <meta charset="utf-8">
+    <title>Backtest Report - {timeframe}</title>
+    <style>{STYLE}</style>
+</head>
+<body>
+    <h1>Backtest Report - {timeframe}</h1>
+    <div class="summary">
+        <h2>Summary</h2>
+        <table>
+            <tr><th>Metric</th><th>Value</th></tr>
+            {_summary_rows(trades, metrics)}
+        </table>
+    </div>
+""")
+    if portfolio_values is not None and len(portfolio_values) > 1:
+        f.write(f"""    <div class="chart">
+        <h2>Equity and Drawdown</h2>
+        {equity_chart_svg(timestamps, portfolio_values)}
+    </div>
+""")
+    f.write("""    <div class="trade-details">
+        <h2>Trade Details</h2>
+        <div class="pager">
+            <button onclick="tradePage('first')">First</button><button onclick="tradePage(-1)">Previous</button>
+            <button onclick="tradePage(1)">Next</button><button onclick="tradePage('last')">Last</button>
+            <span id="trade-page"></span>
         </div>
-    </body>
-    </html>
+        <table>
+            <thead><tr><th>Trade #</th><th>Type</th><th>Timestamp</th><th>Price (USDT)</th><th>Amount (BTC)</th><th>Fee (USDT)</th><th>Portfolio Value (USDT)</th><th>Reason</th><th>Profit/Loss (USDT)</th></tr></thead>
+            <tbody id="trade-rows">
+""")
+    for trade in trades[:page_size]:
+        row = [html.escape(str(value)) for value in _trade_row(trade)]
+        f.write(f"<tr><td>{row[0]}</td><td><span class='{row[1]}'>{row[1].upper()}</span></td><td>{row[2]}</td><td>{row[3]}</td>"
+                f"<td>{row[4]}</td><td>{row[5]}</td><td>{row[6]}</td><td>{row[7]}</td><td><span class='{row[9]}'>{row[8]}</span></td></tr>\n")
+    f.write("""            </tbody>
+        </table>
+    </div>
+    <script type="application/json" id="trade-data">[""")
+    for start in range(0, len(trades), chunk_rows):
+        chunk = ','.join(json.dumps(_trade_row(trade), separators=(',', ':')) for trade in trades[start:start + chunk_rows])
+        f.write(chunk.replace('</', '<\\/') if start == 0 else ',' + chunk.replace('</', '<\\/'))
+    f.write("]</script>\n")
+    f.write(PAGER_SCRIPT % {'page_size': page_size})
+    f.write("</body>\n</html>\n")
+
+def generate_html_report(timeframe, trades, metrics, timestamps=None, portfolio_values=None):
+    """Generate HTML report with trade details and summary metrics, as a string."""
+    buffer = io.StringIO()
+    write_html_report(buffer, timeframe, trades, metrics, timestamps, portfolio_values)
+    return buffer.getvalue()
+
+def _json_value(value):
+    if isinstance(value, (np.integer, np.floating)):
+        value = value.item()
+    if isinstance(value, float) and not math.isfinite(value):
+        return None if math.isnan(value) else str(value)
+    return value
+
+def write_report_files(path, timeframe, trades, metrics, timestamps=None, portfolio_values=None):
+    """Write the HTML report to path plus machine-readable outputs next to it.
+
+    <name>.json holds the metrics and the decimated equity curve; with pyarrow installed the full trade list and
+    equity series (plus rolling metrics) also go to <name>_trades.parquet and <name>_equity.parquet, otherwise
+    trades go to <name>_trades.jsonl. Returns the list of files written.
     """
-    return html_content
\ No newline at end of file
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    base = os.path.splitext(path)[0]
+    with open(path, 'w', encoding='utf-8', buffering=1 << 20) as f:
+        write_html_report(f, timeframe, trades, metrics, timestamps, portfolio_values)
+    written = [path]
+
+    summary = {key: _json_value(value) for key, value in metrics.items() if not isinstance(value, (dict, pd.DataFrame))}
+    summary['trend_regime_trades'] = {key: _json_value(value) for key, value in metrics['trend_regime_trades'].items()}
+    summary['regimes'] = {name: {key: _json_value(value) for key, value in stats.items()}
+                          for name, stats in metrics['regimes'].items()}
+    summary.update(timeframe=timeframe, initial_capital=INITIAL_CAPITAL, trades=len(trades))
+    if portfolio_values is not None and len(portfolio_values):
+        keep = decimate_minmax(portfolio_values, REPORT_CHART_POINTS)
+        times = pd.to_datetime(np.asarray(timestamps)[keep])
+        summary['equity_curve'] = {'timestamp': [str(t) for t in times],
+                                   'portfolio_value': np.asarray(portfolio_values, dtype=np.float64)[keep].tolist()}
+    with open(base + '.json', 'w') as f:
+        json.dump(summary, f, indent=2, default=str)
+    written.append(base + '.json')
+
+    trades_frame = pd.DataFrame(trades)
+    if pyarrow is not None:
+        trades_frame.to_parquet(base + '_trades.parquet', index=False)
+        written.append(base + '_trades.parquet')
+        if portfolio_values is not None:
+            equity = pd.DataFrame({'timestamp': pd.to_datetime(np.asarray(timestamps)), 'portfolio_value': portfolio_values})
+            if 'rolling' in metrics:
+                equity = pd.concat([equity, metrics['rolling'].add_prefix('rolling_')], axis=1)
+            equity.to_parquet(base + '_equity.parquet', index=False)
+            written.append(base + '_equity.parquet')
+    else:
+        if trades_frame.empty:
+            open(base + '_trades.jsonl', 'w').close()  # pandas writes a lone blank line, which is not valid JSON Lines
+        else:
+            trades_frame.to_json(base + '_trades.jsonl', orient='records', lines=True, date_format='iso')
+        written.append(base + '_trades.jsonl')
+    return written
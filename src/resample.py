@@ -0,0 +1,50 @@
+import numpy as np
+import ccxt
+
+WEEK_OFFSET_MS = 4 * 24 * 3600 * 1000  # Epoch day 0 is a Thursday; exchange weeks start on Monday
+
+def timeframe_ms(timeframe):
+    return ccxt.Exchange.parse_timeframe(timeframe) * 1000
+
+def bucket_offset_ms(timeframe):
+    """Offset of the exchange's bucket grid from the epoch: weekly candles open on Monday 00:00 UTC."""
+    if timeframe.endswith('M') or timeframe.endswith('y'):
+        raise ValueError(f"Cannot derive calendar timeframe {timeframe} from fixed-width candles")
+    return WEEK_OFFSET_MS if timeframe.endswith('w') else 0
+
+def can_resample(base_timeframe, target_timeframe):
+    """True if target candles are whole multiples of base candles on the same bucket grid."""
+    try:
+        offset = bucket_offset_ms(target_timeframe)
+    except ValueError:
+        return False
+    base, target = timeframe_ms(base_timeframe), timeframe_ms(target_timeframe)
+    return target > base and target % base == 0 and offset % base == 0
+
+def resample_arrays(arrays, base_timeframe, target_timeframe, complete_only=True):
+    """Aggregate base OHLCV column arrays into coarser candles aligned to exchange bucket boundaries.
+
+    open=first, high=max, low=min, close=last, volume=sum. With complete_only, a trailing bucket the
+    base candles do not yet cover (the still-forming candle) is dropped. Returns column arrays.
+    """
+    base_ms, target_ms = timeframe_ms(base_timeframe), timeframe_ms(target_timeframe)
+    offset = bucket_offset_ms(target_timeframe)
+    timestamps = np.asarray(arrays['timestamp'], dtype=np.int64)
+    if len(timestamps) == 0:
+        return {column: np.asarray(values)[:0] for column, values in arrays.items()}
+    buckets = (timestamps - offset) // target_ms * target_ms + offset
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(timestamps)] - 1
+    if complete_only and timestamps[-1] + base_ms < buckets[-1] + target_ms:
+        starts, ends = starts[:-1], ends[:-1]
+    if len(starts) == 0:
+        return {column: np.asarray(values)[:0] for column, values in arrays.items()}
+    stop = ends[-1] + 1
+    return {
+        'timestamp': buckets[starts],
+        'open': np.asarray(arrays['open'])[starts],
+        'high': np.maximum.reduceat(np.asarray(arrays['high'])[:stop], starts),
+        'low': np.minimum.reduceat(np.asarray(arrays['low'])[:stop], starts),
+        'close': np.asarray(arrays['close'])[ends],
+        'volume': np.add.reduceat(np.asarray(arrays['volume'])[:stop], starts)
+    }
@@ -0,0 +1,47 @@
+import os
+import pickle
+import tempfile
+import time
+
+SNAPSHOT_VERSION = 1  # Bump when the snapshot layout changes; older snapshots are then ignored
+
+def save_snapshot(state, path):
+    """Atomically write a state dict: pickle to a temp file, fsync, then rename over the old snapshot.
+
+    A crash mid-write leaves the previous snapshot intact, and a temp file left behind by one is never
+    reused or read. Returns the snapshot size in bytes.
+    """
+    payload = pickle.dumps(dict(state, version=SNAPSHOT_VERSION, saved_at=time.time()), protocol=pickle.HIGHEST_PROTOCOL)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix=os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return len(payload)
+
+def load_snapshot(path, **expected):
+    """Read a snapshot written by save_snapshot, or None if it is missing, unreadable, from another
+    SNAPSHOT_VERSION, or does not match the expected key/values (e.g. symbol and timeframe)."""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'rb') as f:
+            state = pickle.load(f)
+    except Exception as e:
+        print(f"Ignoring unreadable snapshot {path}: {e}")
+        return None
+    if state.get('version') != SNAPSHOT_VERSION:
+        print(f"Ignoring snapshot {path}: version {state.get('version')}, expected {SNAPSHOT_VERSION}")
+        return None
+    for key, value in expected.items():
+        if state.get(key) != value:
+            print(f"Ignoring snapshot {path}: {key} is {state.get(key)!r}, expected {value!r}")
+            return None
+    return state
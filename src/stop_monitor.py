@@ -0,0 +1,95 @@
+import asyncio
+import time
+import pandas as pd
+from src.config import (SYMBOL, ATR_STOP_LOSS_MULTIPLIER, ATR_STOP_LOSS_MULTIPLIER_CHOPPY, ATR_TAKE_PROFIT_MULTIPLIER,
+                        TRAILING_STOP_PERCENT, STOP_MONITOR_POLL_SECONDS, STOP_MONITOR_LATENCY_BUDGET_MS)
+from src.profiling import LatencyRecorder
+
+def stop_multiplier(regime):
+    """ATR multiple for the stop-loss: tighter in choppy markets."""
+    return ATR_STOP_LOSS_MULTIPLIER_CHOPPY if regime == 'choppy' else ATR_STOP_LOSS_MULTIPLIER
+
+def exit_reason(price, entry_price, atr, stop_mult, peak_price,
+                take_profit_atr=ATR_TAKE_PROFIT_MULTIPLIER, trailing_stop_percent=TRAILING_STOP_PERCENT):
+    """The live exit rules in priority order: 'stop-loss', 'take-profit', 'trailing-stop', or None to hold."""
+    if price < entry_price - atr * stop_mult:
+        return 'stop-loss'
+    if price > entry_price + take_profit_atr * atr:
+        return 'take-profit'
+    if price < peak_price * (1 - trailing_stop_percent):
+        return 'trailing-stop'
+    return None
+
+class StopMonitor:
+    """Checks an open LiveTrader position against the exit rules on every ticker poll between candle closes.
+
+    The ATR and regime come from the last closed candle, exactly as in the candle-close check; the trailing-stop
+    peak follows the polled prices, read from the trader's market data client. Works against any exchange with
+    fetch_ticker, including a FakeExchange replaying recorded ticks under a SimulatedClock.
+    """
+
+    def __init__(self, trader, poll_seconds=STOP_MONITOR_POLL_SECONDS, latency_budget_ms=STOP_MONITOR_LATENCY_BUDGET_MS):
+        self.trader = trader
+        self.poll_ms = int(poll_seconds * 1000)
+        self.latency_budget_ms = latency_budget_ms
+        self.check_latency = LatencyRecorder()  # Per-tick rule evaluation
+        self.exit_latency = LatencyRecorder()  # Tick received -> sell order returned
+        self.ticks = 0
+        self.exits = 0
+        self.enabled = True  # Replays without tick data turn this off to trade on candle closes only
+
+    def holding(self):
+        trader = self.trader
+        return trader.position > 0 and trader.active_trade is not None and trader.indicators is not None
+
+    def check(self, price):
+        """Exit reason for a live price, or None (raising the trailing-stop peak) while the position holds."""
+        trader = self.trader
+        latest = trader.indicators.latest
+        regime = 'trending' if latest['SMA50'] > latest['SMA200'] else 'choppy'
+        reason = exit_reason(price, trader.active_trade['price'], latest['ATR'], stop_multiplier(regime), trader.peak_price)
+        if reason is None:
+            trader.peak_price = max(trader.peak_price, price)
+        return reason
+
+    async def poll_once(self):
+        """Fetch one ticker, check it and sell if an exit rule fires; returns the order or None."""
+        ticker = await asyncio.to_thread(self.trader.market_exchange.fetch_ticker, SYMBOL)
+        received_at = time.perf_counter()
+        price = ticker['last']
+        if price is None or not self.holding():
+            return None
+        self.ticks += 1
+        reason = self.check(price)
+        self.check_latency.record(time.perf_counter() - received_at)
+        if reason is None:
+            return None
+        trader = self.trader
+        timestamp = pd.Timestamp(ticker.get('timestamp') or trader.clock.now_ms(), unit='ms')
+        order = trader._sell(reason, price, timestamp, trader.cash + trader.position * price)
+        trader.save_state()
+        latency = time.perf_counter() - received_at
+        self.exit_latency.record(latency)
+        self.exits += 1
+        print(f"Intrabar {reason} at {price:.2f}: order sent {latency * 1000:.1f} ms after the tick"
+              f"{' (over the latency budget)' if latency * 1000 > self.latency_budget_ms else ''}")
+        return order
+
+    async def watch_until(self, target_ms):
+        """Poll the ticker every poll_seconds until target_ms while a position is open; otherwise just sleep."""
+        clock = self.trader.clock
+        while clock.now_ms() < target_ms:
+            if not self.enabled or not self.holding():
+                await clock.sleep_until(target_ms)
+                return
+            next_poll_ms = clock.now_ms() + self.poll_ms
+            try:
+                await self.poll_once()
+            except Exception as e:
+                print(f"Error in stop monitor: {e}")
+            await clock.sleep_until(min(next_poll_ms, target_ms))
+
+    def summary(self):
+        checks, exits = self.check_latency.summary(), self.exit_latency.summary()
+        return (f"Stop monitor: {self.ticks} ticks, check p50/p99 {checks['p50_us']:.1f}/{checks['p99_us']:.1f} us, "
+                f"{self.exits} intrabar exits" + (f" (tick -> order p99 {exits['p99_us'] / 1000:.1f} ms)" if self.exits else ''))
@@ -0,0 +1,250 @@
+import math
+from collections import deque
+import numpy as np
+from src.config import SMA_PERIOD, RSI_PERIOD, MACD_FAST, MACD_SLOW, MACD_SIGNAL, BB_PERIOD, BB_STD
+
+NAN = float('nan')
+
+class _EMA:
+    """Exponential moving average matching pandas ewm(adjust=False, min_periods=...)."""
+
+    def __init__(self, alpha, min_periods):
+        self.alpha = alpha
+        self.min_periods = min_periods
+        self.count = 0
+        self.value = NAN
+
+    def update(self, x):
+        if math.isnan(x):
+            return self.current()
+        self.count += 1
+        if self.count == 1:
+            self.value = x
+        else:
+            self.value = (1 - self.alpha) * self.value + self.alpha * x
+        return self.current()
+
+    def current(self):
+        return self.value if self.count >= self.min_periods else NAN
+
+class _RollingWindow:
+    """Fixed-size window with O(1) rolling mean, variance and (optionally) covariance with a second series.
+
+    Uses add/remove Welford updates and re-sums the window once per full cycle so rounding error cannot drift.
+    """
+
+    def __init__(self, window, paired=False):
+        self.window = window
+        self.paired = paired
+        self.xs = deque(maxlen=window)
+        self.ys = deque(maxlen=window)
+        self.updates = 0
+        self.mean_x = self.mean_y = 0.0
+        self.m2_x = self.m2_y = self.c_xy = 0.0
+
+    def update(self, x, y=0.0):
+        if len(self.xs) == self.window:
+            self._remove(self.xs[0], self.ys[0])
+        self.xs.append(x)
+        self.ys.append(y)
+        self._add(x, y)
+        self.updates += 1
+        if self.updates % self.window == 0:
+            self._resum()
+
+    def _add(self, x, y):
+        n = len(self.xs)
+        dx = x - self.mean_x
+        self.mean_x += dx / n
+        self.m2_x += dx * (x - self.mean_x)
+        if self.paired:
+            dy = y - self.mean_y
+            self.mean_y += dy / n
+            self.m2_y += dy * (y - self.mean_y)
+            self.c_xy += dx * (y - self.mean_y)
+
+    def _remove(self, x, y):
+        n = len(self.xs)
+        if n == 1:
+            self.mean_x = self.mean_y = self.m2_x = self.m2_y = self.c_xy = 0.0
+            return
+        mean_x = (n * self.mean_x - x) / (n - 1)
+        self.m2_x -= (x - mean_x) * (x - self.mean_x)
+        if self.paired:
+            mean_y = (n * self.mean_y - y) / (n - 1)
+            self.m2_y -= (y - mean_y) * (y - self.mean_y)
+            self.c_xy -= (x - mean_x) * (y - self.mean_y)
+            self.mean_y = mean_y
+        self.mean_x = mean_x
+
+    def _resum(self):
+        xs = np.fromiter(self.xs, dtype=np.float64, count=len(self.xs))
+        self.mean_x = xs.mean()
+        self.m2_x = float(((xs - self.mean_x) ** 2).sum())
+        if self.paired:
+            ys = np.fromiter(self.ys, dtype=np.float64, count=len(self.ys))
+            self.mean_y = ys.mean()
+            self.m2_y = float(((ys - self.mean_y) ** 2).sum())
+            self.c_xy = float(((xs - self.mean_x) * (ys - self.mean_y)).sum())
+
+    def full(self):
+        return len(self.xs) == self.window
+
+    def mean(self):
+        return self.mean_x if self.full() else NAN
+
+    def std(self):
+        """Population standard deviation (ddof=0), as used by the Bollinger bands."""
+        return math.sqrt(max(self.m2_x, 0.0) / self.window) if self.full() else NAN
+
+    def corr(self):
+        if not self.full():
+            return NAN
+        return _divide(self.c_xy, math.sqrt(max(self.m2_x, 0.0) * max(self.m2_y, 0.0)))
+
+def _divide(a, b):
+    """Float division with pandas semantics: x/0 gives +-inf, 0/0 and NaN operands give NaN."""
+    if math.isnan(a) or math.isnan(b):
+        return NAN
+    if b == 0:
+        return NAN if a == 0 else math.copysign(math.inf, a)
+    return a / b
+
+def _pct_change(current, previous):
+    if previous is None:
+        return NAN
+    return _divide(current, previous) - 1
+
+class StreamingIndicators:
+    """Stateful, constant time and memory per candle version of calculate_indicators.
+
+    Feed closed candles in order with update(); seed() replays history once. Values match
+    calculate_indicators to within floating-point tolerance for the same candle history.
+    """
+
+    ATR_WINDOW = 14
+    ROC_WINDOW = 20
+    CORR_WINDOW = 20
+
+    def __init__(self):
+        self.count = 0
+        self.last_timestamp = None
+        self.sma50 = _RollingWindow(SMA_PERIOD)
+        self.sma200 = _RollingWindow(200)
+        self.ema20 = _EMA(2 / 21, 20)
+        self.ema50 = _EMA(2 / 51, 50)
+        self.ema100 = _EMA(2 / 101, 100)
+        self.rsi_up = _EMA(1 / RSI_PERIOD, RSI_PERIOD)
+        self.rsi_down = _EMA(1 / RSI_PERIOD, RSI_PERIOD)
+        self.macd_fast = _EMA(2 / (MACD_FAST + 1), MACD_FAST)
+        self.macd_slow = _EMA(2 / (MACD_SLOW + 1), MACD_SLOW)
+        self.macd_signal = _EMA(2 / (MACD_SIGNAL + 1), MACD_SIGNAL)
+        self.bb = _RollingWindow(BB_PERIOD)
+        self.price_volume = _RollingWindow(self.CORR_WINDOW, paired=True)
+        self.closes = deque(maxlen=self.ROC_WINDOW + 1)
+        self.volumes = deque(maxlen=self.ROC_WINDOW + 1)
+        self.true_ranges = []  # Only kept until the first ATR value is seeded
+        self.atr = NAN
+        self.prev_macd_diff = NAN
+        self.prev_close_change = NAN
+        self.prev_atr_normalized = NAN
+        self.latest = {}
+
+    def seed(self, df):
+        """Warm the state up from a history frame with timestamp/open/high/low/close/volume columns."""
+        for candle in zip(df['timestamp'], df['open'].to_numpy(float), df['high'].to_numpy(float),
+                          df['low'].to_numpy(float), df['close'].to_numpy(float), df['volume'].to_numpy(float)):
+            self.update(*candle)
+        return self.latest
+
+    def update(self, timestamp, open_, high, low, close, volume):
+        """Consume one closed candle and return the updated indicator row as a dict."""
+        prev_close = self.closes[-1] if self.closes else None
+        prev_volume = self.volumes[-1] if self.volumes else None
+        self.closes.append(close)
+        self.volumes.append(volume)
+        self.count += 1
+        self.last_timestamp = timestamp
+
+        self.sma50.update(close)
+        self.sma200.update(close)
+        ema20 = self.ema20.update(close)
+        ema50 = self.ema50.update(close)
+        ema100 = self.ema100.update(close)
+
+        # RSI: Wilder smoothing of up/down moves; the first candle counts as a zero move
+        diff = close - prev_close if prev_close is not None else NAN
+        up = diff if diff > 0 else 0.0
+        down = -diff if diff < 0 else 0.0
+        ema_up = self.rsi_up.update(up)
+        ema_down = self.rsi_down.update(down)
+        if math.isnan(ema_down):
+            rsi = NAN
+        elif ema_down == 0:
+            rsi = 100.0
+        else:
+            rsi = 100 - (100 / (1 + ema_up / ema_down))
+
+        # MACD: the signal line only starts once the slow EMA is valid
+        macd = self.macd_fast.update(close) - self.macd_slow.update(close)
+        macd_signal = self.macd_signal.update(macd)
+        macd_diff = macd - macd_signal
+        macd_histogram_slope = macd_diff - self.prev_macd_diff
+        self.prev_macd_diff = macd_diff
+
+        self.bb.update(close)
+        bb_mean, bb_std = self.bb.mean(), self.bb.std()
+        bb_upper = bb_mean + BB_STD * bb_std
+        bb_lower = bb_mean - BB_STD * bb_std
+        bb_range = bb_upper - bb_lower
+        bb_width = bb_range / close
+        bb_position = _divide(close - bb_lower, bb_range)
+
+        volume_change = _pct_change(volume, prev_volume)
+        close_change = _pct_change(close, prev_close)
+        return_lag1 = self.prev_close_change
+        self.prev_close_change = close_change
+        if len(self.volumes) > self.ROC_WINDOW:
+            volume_momentum = _pct_change(volume, self.volumes[0]) * 100
+            momentum = _pct_change(close, self.closes[0]) * 100
+        else:
+            volume_momentum = momentum = NAN
+
+        # ATR: mean of the first 14 true ranges, then Wilder smoothing (zero before that, like ta)
+        if prev_close is None:
+            true_range = high - low
+        else:
+            true_range = max(high - low, abs(high - prev_close), abs(low - prev_close))
+        if self.count < self.ATR_WINDOW:
+            self.true_ranges.append(true_range)
+            atr = 0.0
+        elif self.count == self.ATR_WINDOW:
+            self.true_ranges.append(true_range)
+            atr = sum(self.true_ranges) / self.ATR_WINDOW
+            self.true_ranges = []
+        else:
+            atr = (self.atr * (self.ATR_WINDOW - 1) + true_range) / float(self.ATR_WINDOW)
+        self.atr = atr
+        atr_normalized = atr / close
+        volatility_change = _pct_change(atr_normalized, self.prev_atr_normalized)
+        self.prev_atr_normalized = atr_normalized
+
+        self.price_volume.update(close, volume)
+        momentum_vol_adj = _divide(momentum, atr_normalized)
+
+        self.latest = {
+            'timestamp': timestamp, 'open': open_, 'high': high, 'low': low, 'close': close, 'volume': volume,
+            'SMA50': self.sma50.mean(), 'EMA20': ema20, 'EMA50': ema50, 'EMA100': ema100, 'SMA200': self.sma200.mean(),
+            'RSI': rsi, 'MACD': macd, 'MACD_signal': macd_signal, 'MACD_diff': macd_diff,
+            'MACD_histogram_slope': macd_histogram_slope, 'BB_upper': bb_upper, 'BB_lower': bb_lower,
+            'BB_width': bb_width, 'bb_position': bb_position, 'volume_change': volume_change,
+            'volume_momentum': volume_momentum, 'close_change': close_change, 'return_lag1': return_lag1,
+            'ATR': atr, 'ATR_normalized': atr_normalized, 'volatility_change': volatility_change,
+            'price_volume_corr': self.price_volume.corr(), 'ema_diff': ema20 - ema50, 'momentum': momentum,
+            'momentum_vol_adj': momentum_vol_adj
+        }
+        return self.latest
+
+    def ready(self, columns):
+        """True once every requested column has a value, i.e. the row would survive calculate_indicators' dropna."""
+        return bool(self.latest) and not any(math.isnan(self.latest[c]) for c in columns)
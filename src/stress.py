@@ -0,0 +1,170 @@
+import os
+import time
+from multiprocessing import Pool, cpu_count
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from src.data_handler import DataHandler
+from src.indicators import calculate_indicators
+from src.ml_model import MLModel, feature_matrix
+from src.backtest_engine import run_engine
+from src.metrics import compute_metrics
+from src.sweep import to_shared, attach_shared
+from src.config import (ML_FEATURES, STRATEGY_COLUMNS, SIGNAL_THRESHOLD, TIMEFRAME, STRESS_PATHS, STRESS_BARS,
+                        STRESS_SEED, STRESS_BLOCK_BARS, STRESS_REGIME_MEAN_BARS, STRESS_HIGH_VOL_PROBABILITY,
+                        STRESS_HIGH_VOL_MULTIPLIER, STRESS_CRASH_PROBABILITY, STRESS_CRASH_DEPTH,
+                        STRESS_CRASH_RECOVERY, STRESS_CRASH_VOLUME_MULTIPLIER, STRESS_PATHS_PER_TASK)
+
+REPORTS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'reports')
+QUANTILES = [0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99]
+
+_worker = {}  # Per-worker model and views onto the shared path arrays, set up once by _init_worker
+
+def block_bootstrap(n_source, n_paths, n_bars, block_bars, rng):
+    """(n_paths, n_bars) indices into a source series, drawn as contiguous blocks of block_bars."""
+    n_blocks = -(-n_bars // block_bars)
+    starts = rng.integers(0, max(n_source - block_bars + 1, 1), size=(n_paths, n_blocks))  # Last block may end on the last bar
+    idx = (starts[:, :, None] + np.arange(block_bars)).reshape(n_paths, -1)[:, :n_bars]
+    return np.minimum(idx, n_source - 1)
+
+def volatility_regimes(n_paths, n_bars, rng, mean_bars=STRESS_REGIME_MEAN_BARS,
+                       high_probability=STRESS_HIGH_VOL_PROBABILITY, multiplier=STRESS_HIGH_VOL_MULTIPLIER):
+    """(n_paths, n_bars) volatility scale: regimes of geometric length, each high-volatility with high_probability."""
+    switches = rng.random((n_paths, n_bars)) < 1 / mean_bars
+    regime_id = np.cumsum(switches, axis=1) - switches[:, :1]  # 0-based: a switch on the first bar starts regime 0
+    high = rng.random((n_paths, n_bars)) < high_probability  # Indexed by regime id, so one draw per regime
+    return np.where(np.take_along_axis(high, regime_id, axis=1), multiplier, 1.0)
+
+def flash_crashes(n_paths, n_bars, rng, probability=STRESS_CRASH_PROBABILITY, depth=STRESS_CRASH_DEPTH,
+                  recovery=STRESS_CRASH_RECOVERY):
+    """(log return shocks, crash mask): a drop of depth on crash candles, partly recovered on the next candle."""
+    crash = rng.random((n_paths, n_bars)) < probability
+    drop = np.where(crash, np.log1p(-rng.uniform(depth[0], depth[1], size=(n_paths, n_bars))), 0.0)
+    shocks = drop.copy()
+    shocks[:, 1:] -= recovery * drop[:, :-1]
+    return shocks, crash
+
+def generate_paths(df, n_paths=STRESS_PATHS, n_bars=STRESS_BARS, seed=STRESS_SEED, block_bars=STRESS_BLOCK_BARS):
+    """Synthetic OHLCV paths from a block bootstrap of df's candles, with volatility regimes and flash crashes.
+
+    Each synthetic candle takes its close-to-close return, its wick sizes and its volume from a historical
+    candle; returns are scaled around their mean by the volatility regime, and crash shocks are added on top.
+    Everything is built as (n_paths, n_bars) arrays from one seeded generator, so a seed always gives the
+    same paths. Returns a dict of 2-D open/high/low/close/volume arrays, 1-D timestamps and the crash mask.
+    """
+    rng = np.random.default_rng(seed)
+    o, h, l, c, v = (df[column].to_numpy(dtype=np.float64) for column in ('open', 'high', 'low', 'close', 'volume'))
+    log_returns = np.log(c[1:] / c[:-1])
+    upper_wick = np.log(h[1:] / np.maximum(o[1:], c[1:]))
+    lower_wick = np.log(np.minimum(o[1:], c[1:]) / l[1:])
+    volume = v[1:]
+
+    idx = block_bootstrap(len(log_returns), n_paths, n_bars, block_bars, rng)
+    scale = volatility_regimes(n_paths, n_bars, rng)
+    shocks, crash = flash_crashes(n_paths, n_bars, rng)
+    mean = log_returns.mean()
+    returns = mean + (log_returns[idx] - mean) * scale + shocks
+
+    close = c[-1] * np.exp(np.cumsum(returns, axis=1))
+    open_ = np.empty_like(close)
+    open_[:, 0] = c[-1]
+    open_[:, 1:] = close[:, :-1]
+    body_low = np.minimum(open_, close)
+    high = np.maximum(open_, close) * np.exp(upper_wick[idx] * scale)
+    low = np.where(crash, body_low, body_low * np.exp(-lower_wick[idx] * scale))  # Crash candles close at their low
+    bar = int(np.median(np.diff(df['timestamp'].to_numpy(dtype='datetime64[ns]').view(np.int64))))
+    return {
+        'open': open_, 'high': high, 'low': low, 'close': close,
+        'volume': volume[idx] * scale * np.where(crash, STRESS_CRASH_VOLUME_MULTIPLIER, 1.0),
+        'timestamp': df['timestamp'].iloc[-1].value + np.arange(1, n_bars + 1, dtype=np.int64) * bar,
+        'crash': crash
+    }
+
+def _init_worker(specs):
+    """Load the model and attach to the shared path arrays once per worker process."""
+    attach_shared(specs, _worker)
+    _worker['model'] = MLModel()
+
+def run_stress_task(task):
+    """Indicators, one batched prediction and a backtest for paths [start, stop); returns one metrics row per path."""
+    start, stop, params = task
+    timestamps = pd.to_datetime(_worker['timestamp'])
+    frames = []
+    for path in range(start, stop):
+        candles = pd.DataFrame({'timestamp': timestamps, **{column: _worker[column][path]
+                                                            for column in ('open', 'high', 'low', 'close', 'volume')}})
+        frames.append(calculate_indicators(candles, STRATEGY_COLUMNS))
+    X = np.concatenate([feature_matrix(frame) for frame in frames])
+    pred_prob = np.asarray(_worker['model'].predict(xgb.DMatrix(X, feature_names=ML_FEATURES)))
+    rows, offset = [], 0
+    for path, frame in zip(range(start, stop), frames):
+        probabilities = pred_prob[offset:offset + len(frame)]
+        offset += len(frame)
+        trend_regime = (frame['SMA50'] > frame['SMA200']).to_numpy(dtype=np.int8)
+        timestamp = frame['timestamp'].to_numpy(dtype='datetime64[ns]').view(np.int64)
+        trades, portfolio_values = run_engine(
+            frame['close'].to_numpy(dtype=np.float64), frame['ATR'].to_numpy(dtype=np.float64),
+            (probabilities > params['signal_threshold']).astype(np.int8), trend_regime, timestamp,
+            {k: v for k, v in params.items() if k != 'signal_threshold'}
+        )
+        metrics = compute_metrics(portfolio_values, trades, timestamp, trend_regime, rolling_window=None)
+        rows.append({
+            'path': path, 'total_return': metrics['total_return'], 'max_drawdown': metrics['max_drawdown'],
+            'sharpe_ratio': metrics['sharpe_ratio'], 'sortino_ratio': metrics['sortino_ratio'],
+            'calmar_ratio': metrics['calmar_ratio'], 'max_drawdown_duration': metrics['max_drawdown_duration'],
+            'exposure': metrics['exposure'], 'win_rate': metrics['win_rate'], 'num_trades': len(trades),
+            'crashes': int(_worker['crash'][path].sum()),
+            'market_return': (frame['close'].iloc[-1] / frame['close'].iloc[0] - 1) * 100
+        })
+    return rows
+
+def distribution(results, columns=('total_return', 'max_drawdown', 'sharpe_ratio')):
+    """Quantile table of the given result columns."""
+    return results[list(columns)].quantile(QUANTILES).rename(index=lambda q: f"p{q * 100:g}")
+
+def run_stress(timeframe=TIMEFRAME, n_paths=STRESS_PATHS, n_bars=STRESS_BARS, seed=STRESS_SEED, processes=None,
+               params=None):
+    """Backtest the saved model on n_paths synthetic paths in parallel and report the return/drawdown distribution.
+
+    Paths are bootstrapped from the stored timeframe candles and live in shared memory for the workers; nothing
+    is written to disk except the per-path results in reports/stress_<timeframe>.csv.
+    """
+    processes = processes or cpu_count()
+    params = dict({'signal_threshold': SIGNAL_THRESHOLD}, **(params or {}))
+    df = DataHandler().load_historical_data(timeframe)
+    if len(df) < STRESS_BLOCK_BARS + 2:
+        print(f"Not enough {timeframe} candles to bootstrap stress paths.")
+        return pd.DataFrame()
+    start_time = time.time()
+    paths = generate_paths(df, n_paths, n_bars, seed)
+    print(f"Generated {n_paths} stress paths of {n_bars} {timeframe} candles (seed {seed}) in "
+          f"{time.time() - start_time:.1f}s; {int(paths['crash'].sum())} flash crashes injected")
+
+    blocks, specs = to_shared(paths)
+    del paths
+    tasks = [(start, min(start + STRESS_PATHS_PER_TASK, n_paths), params)
+             for start in range(0, n_paths, STRESS_PATHS_PER_TASK)]
+    rows = []
+    try:
+        with Pool(processes, initializer=_init_worker, initargs=(specs,)) as pool:
+            for count, task_rows in enumerate(pool.imap_unordered(run_stress_task, tasks), 1):
+                rows.extend(task_rows)
+                if count % 10 == 0 or count == len(tasks):
+                    elapsed = time.time() - start_time
+                    print(f"Backtested {len(rows)}/{n_paths} paths ({len(rows) / elapsed:.1f} paths/s)")
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+    results = pd.DataFrame(rows).sort_values('path').reset_index(drop=True)
+    os.makedirs(REPORTS_DIR, exist_ok=True)
+    results_path = os.path.join(REPORTS_DIR, f"stress_{timeframe}.csv")
+    results.to_csv(results_path, index=False)
+    print(f"Stress test on {timeframe} completed in {time.time() - start_time:.1f}s. "
+          f"Loss probability {(results['total_return'] < 0).mean() * 100:.1f}%, "
+          f"mean return {results['total_return'].mean():.2f}%, "
+          f"mean max drawdown {results['max_drawdown'].mean() * 100:.2f}%. Distribution:")
+    print(distribution(results).to_string())
+    print(f"Per-path results written to '{results_path}'.")
+    return results
@@ -0,0 +1,154 @@
+import itertools
+import json
+import os
+import time
+from multiprocessing import Pool, cpu_count, shared_memory
+import numpy as np
+import pandas as pd
+from src.data_handler import DataHandler
+from src.feature_store import load_features
+from src.ml_model import MLModel
+from src.prediction_cache import cached_predict
+from src.backtest_engine import run_engine
+from src.metrics import compute_metrics
+from src.config import INITIAL_CAPITAL, STRATEGY_COLUMNS, SWEEP_GRID, SWEEP_RANK_BY
+
+# Scalar metrics from compute_metrics written to the results table
+RESULT_METRICS = [
+    'total_return', 'cagr', 'sharpe_ratio', 'sortino_ratio', 'calmar_ratio', 'max_drawdown', 'max_drawdown_duration',
+    'exposure', 'rolling_sharpe_min', 'win_rate', 'profit_factor', 'total_fees', 'avg_holding_period', 'max_consecutive_wins', 'max_consecutive_losses', 'trending_win_rate',
+    'choppy_win_rate', 'final_value'
+]
+
+_shared = {}  # Per-worker views onto the shared arrays, set up once by _init_worker
+
+def expand_grid(grid):
+    """Expand a {param: [values]} grid into a list of parameter dicts."""
+    keys = sorted(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+
+def param_key(params):
+    """Stable string key identifying one parameter combination."""
+    return json.dumps(params, sort_keys=True)
+
+def prepare_sweep_arrays(timeframe):
+    """Compute indicators and model predictions once and return the arrays every sweep task needs."""
+    handler = DataHandler()
+    df = handler.load_historical_data(timeframe)
+    df = load_features(df, STRATEGY_COLUMNS)
+    pred_prob = cached_predict(MLModel(), df, label=timeframe)
+    return {
+        'close': df['close'].to_numpy(dtype=np.float64),
+        'atr': df['ATR'].to_numpy(dtype=np.float64),
+        'pred_prob': np.asarray(pred_prob, dtype=np.float64),
+        'trend_regime': (df['SMA50'] > df['SMA200']).to_numpy(dtype=np.int8),
+        'timestamp': df['timestamp'].to_numpy(dtype='datetime64[ns]').view(np.int64)
+    }
+
+def data_fingerprint(arrays):
+    """Identify the swept dataset so a checkpoint from different data is not resumed."""
+    ts = arrays['timestamp']
+    return f"{len(ts)}:{ts[0] if len(ts) else 0}:{ts[-1] if len(ts) else 0}:{float(arrays['pred_prob'].sum()):.10g}"
+
+def to_shared(arrays):
+    """Copy arrays into shared memory blocks; returns (blocks, specs) where specs let workers attach."""
+    blocks, specs = [], {}
+    for name, arr in arrays.items():
+        block = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+        np.ndarray(arr.shape, dtype=arr.dtype, buffer=block.buf)[:] = arr
+        blocks.append(block)
+        specs[name] = (block.name, arr.shape, arr.dtype.str)
+    return blocks, specs
+
+def attach_shared(specs, target):
+    """Map the shared arrays described by specs into the target dict."""
+    for name, (block_name, shape, dtype) in specs.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        target[name + '_block'] = block  # Keep the mapping alive for the life of the worker
+        target[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+
+def _init_worker(specs):
+    """Attach to the shared arrays once per worker process instead of pickling them per task."""
+    attach_shared(specs, _shared)
+
+def _signal_for(threshold):
+    """Return the 0/1 signal array for a threshold, reusing it across tasks in this worker."""
+    cache = _shared.setdefault('signals', {})
+    if threshold not in cache:
+        cache[threshold] = (_shared['pred_prob'] > threshold).astype(np.int8)
+    return cache[threshold]
+
+def run_sweep_task(params):
+    """Backtest one parameter combination against the shared arrays and return its metrics row."""
+    engine_params = {k: v for k, v in params.items() if k != 'signal_threshold'}
+    trades, portfolio_values = run_engine(
+        _shared['close'], _shared['atr'], _signal_for(params['signal_threshold']),
+        _shared['trend_regime'], _shared['timestamp'], engine_params
+    )
+    metrics = compute_metrics(portfolio_values, trades, _shared['timestamp'], _shared['trend_regime'],
+                              initial_capital=engine_params.get('initial_capital', INITIAL_CAPITAL))
+    row = dict(params)
+    row.update({name: float(metrics[name]) for name in RESULT_METRICS})
+    row['num_trades'] = len(trades)
+    return row
+
+def load_checkpoint(path, fingerprint):
+    """Load finished results for this dataset from a JSON-lines checkpoint file."""
+    done = {}
+    if not os.path.exists(path):
+        return done
+    with open(path) as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # Partially written last line from a crash
+            if entry.get('data') == fingerprint:
+                done[entry['key']] = entry['result']
+    return done
+
+def run_sweep(timeframe='4h', grid=None, processes=None, rank_by=SWEEP_RANK_BY):
+    """Run a parameter grid over a process pool, checkpointing each result, and write a ranked table."""
+    grid = grid or SWEEP_GRID
+    processes = processes or cpu_count()
+    reports_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'reports')
+    os.makedirs(reports_dir, exist_ok=True)
+    checkpoint_path = os.path.join(reports_dir, f"sweep_checkpoint_{timeframe}.jsonl")
+    results_path = os.path.join(reports_dir, f"sweep_results_{timeframe}.csv")
+
+    arrays = prepare_sweep_arrays(timeframe)
+    fingerprint = data_fingerprint(arrays)
+    combos = expand_grid(grid)
+    done = load_checkpoint(checkpoint_path, fingerprint)
+    pending = [params for params in combos if param_key(params) not in done]
+    print(f"Sweep on {timeframe}: {len(combos)} combinations, {len(done)} already done, "
+          f"{len(pending)} to run on {processes} processes")
+
+    blocks, specs = to_shared(arrays)
+    del arrays
+    try:
+        if pending:
+            start = time.time()
+            with Pool(processes, initializer=_init_worker, initargs=(specs,)) as pool, \
+                    open(checkpoint_path, 'a') as checkpoint:
+                chunksize = max(1, len(pending) // (processes * 8))
+                for count, row in enumerate(pool.imap_unordered(run_sweep_task, pending, chunksize=chunksize), 1):
+                    params = {k: row[k] for k in grid}
+                    checkpoint.write(json.dumps({'data': fingerprint, 'key': param_key(params), 'result': row}) + "\n")
+                    checkpoint.flush()
+                    done[param_key(params)] = row
+                    if count % 100 == 0 or count == len(pending):
+                        elapsed = time.time() - start
+                        print(f"Completed {count}/{len(pending)} runs ({count / elapsed:.1f} runs/s)")
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+    results = pd.DataFrame([done[param_key(params)] for params in combos])
+    results = results.sort_values(rank_by, ascending=(rank_by == 'max_drawdown')).reset_index(drop=True)
+    results.index += 1
+    results.to_csv(results_path, index_label='rank')
+    print(f"Sweep completed. Ranked results written to '{results_path}'. Top 5 by {rank_by}:")
+    print(results.head())
+    return results
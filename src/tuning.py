@@ -0,0 +1,170 @@
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from multiprocessing import cpu_count
+import numpy as np
+import xgboost as xgb
+from src.data_handler import DataHandler
+from src.feature_store import load_features
+from src.ml_model import MODELS_DIR, TUNED_PARAMS_PATH, feature_matrix, make_target, booster_params, chronological_split
+from src.config import (ML_FEATURES, EARLY_STOPPING_ROUNDS, TUNE_SPACE, TUNE_TRIALS, TUNE_CONCURRENCY,
+                        TUNE_PRUNE_WARMUP_TRIALS, TUNE_PRUNE_ROUNDS)
+
+TRIALS_DB = os.path.join(MODELS_DIR, 'tuning.sqlite')
+MAX_ROUNDS = 2000
+
+def sample_params(space, trial_number, seed=0):
+    """Draw one parameter set; trial n always gets the same draw so a resumed search continues the sequence."""
+    rng = np.random.default_rng([seed, trial_number])
+    params = {}
+    for name, (low, high, scale) in sorted(space.items()):
+        if scale == 'int':
+            params[name] = int(rng.integers(low, high + 1))
+        elif scale == 'log':
+            params[name] = float(math.exp(rng.uniform(math.log(low), math.log(high))))
+        else:
+            params[name] = float(rng.uniform(low, high))
+    return params
+
+class TrialDB:
+    """SQLite record of every trial, keyed by study (the dataset being tuned on), for resuming searches."""
+
+    def __init__(self, path=TRIALS_DB):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS trials (
+            study TEXT, number INTEGER, params TEXT, state TEXT, value REAL, auc REAL,
+            best_iteration INTEGER, seconds REAL, curve TEXT, PRIMARY KEY (study, number))""")
+        self.conn.commit()
+
+    def finished(self, study):
+        """{number: row} of trials that completed or were pruned."""
+        rows = self.conn.execute("SELECT number, params, state, value, auc, best_iteration, seconds FROM trials "
+                                 "WHERE study = ? AND state IN ('complete', 'pruned')", (study,))
+        return {row[0]: {'number': row[0], 'params': json.loads(row[1]), 'state': row[2], 'value': row[3],
+                         'auc': row[4], 'best_iteration': row[5], 'seconds': row[6]} for row in rows}
+
+    def curves(self, study):
+        """Validation loss at each pruning round for every finished trial."""
+        rows = self.conn.execute("SELECT curve FROM trials WHERE study = ? AND curve IS NOT NULL", (study,))
+        return [{int(k): v for k, v in json.loads(row[0]).items()} for row in rows]
+
+    def record(self, study, result):
+        self.conn.execute("INSERT OR REPLACE INTO trials VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", (
+            study, result['number'], json.dumps(result['params']), result['state'], result['value'], result['auc'],
+            result['best_iteration'], result['seconds'], json.dumps(result['curve'])))
+        self.conn.commit()
+
+class MedianPruner:
+    """Stops a trial whose validation loss at a checkpoint round is worse than the median of other trials there."""
+
+    def __init__(self, rounds=TUNE_PRUNE_ROUNDS, warmup_trials=TUNE_PRUNE_WARMUP_TRIALS, history=()):
+        self.rounds = set(rounds)
+        self.warmup_trials = warmup_trials
+        self.reports = {r: [] for r in rounds}
+        for curve in history:
+            for r, value in curve.items():
+                if r in self.reports:
+                    self.reports[r].append(value)
+        self.lock = threading.Lock()
+
+    def should_prune(self, round_number, value):
+        """Report a trial's loss at round_number; True if the trial should stop."""
+        with self.lock:
+            others = list(self.reports[round_number])
+            self.reports[round_number].append(value)
+        return len(others) >= self.warmup_trials and value > float(np.median(others))
+
+class _PruningCallback(xgb.callback.TrainingCallback):
+    def __init__(self, pruner, curve):
+        super().__init__()
+        self.pruner = pruner
+        self.curve = curve
+        self.pruned = False
+
+    def after_iteration(self, model, epoch, evals_log):
+        round_number = epoch + 1
+        if round_number not in self.pruner.rounds:
+            return False
+        loss = evals_log['validation']['logloss'][-1]
+        self.curve[round_number] = loss
+        self.pruned = self.pruner.should_prune(round_number, loss)
+        return self.pruned
+
+def run_trial(number, params, dtrain, dval, base_params, pruner, nthread):
+    """Train one parameter set on the shared quantized matrices; returns the trial result row."""
+    start = time.perf_counter()
+    trial_params = dict(base_params, **params, nthread=nthread, eval_metric=['auc', 'logloss'])
+    curve = {}
+    callback = _PruningCallback(pruner, curve)
+    evals_log = {}
+    model = xgb.train(trial_params, dtrain, num_boost_round=MAX_ROUNDS, evals=[(dval, 'validation')],
+                      early_stopping_rounds=EARLY_STOPPING_ROUNDS, evals_result=evals_log,
+                      callbacks=[callback], verbose_eval=False)
+    best = model.best_iteration
+    return {
+        'number': number, 'params': params, 'state': 'pruned' if callback.pruned else 'complete',
+        'value': float(evals_log['validation']['logloss'][best]), 'auc': float(evals_log['validation']['auc'][best]),
+        'best_iteration': best, 'seconds': time.perf_counter() - start, 'curve': curve
+    }
+
+def tune(timeframe='4h', trials=TUNE_TRIALS, concurrency=TUNE_CONCURRENCY, space=None, db_path=TRIALS_DB,
+         params_path=TUNED_PARAMS_PATH):
+    """Random search over TUNE_SPACE with concurrent, prunable trials on one shared QuantileDMatrix pair.
+
+    Trials minimise validation logloss on the same train/validation rows MLModel.train uses (the
+    test rows are never seen). Results go to a SQLite trial database, so rerunning continues the
+    search; the best parameters are written to models/xgboost_params.json for MLModel.
+    """
+    space = space or TUNE_SPACE
+    handler = DataHandler()
+    df = load_features(handler.load_historical_data(timeframe), ML_FEATURES)
+    X, y = feature_matrix(df), make_target(df['close'])
+    train_end, val_end = chronological_split(len(df))
+    study = f"{timeframe}:{len(df)}:{df['timestamp'].iloc[-1]}:{json.dumps(space, sort_keys=True)}"
+
+    # Quantize once; every trial trains on these matrices (QuantileDMatrix is read-only during training)
+    dtrain = xgb.QuantileDMatrix(X[:train_end], label=y[:train_end], feature_names=ML_FEATURES)
+    dval = xgb.QuantileDMatrix(X[train_end:val_end], label=y[train_end:val_end], ref=dtrain, feature_names=ML_FEATURES)
+    base_params = booster_params(y[:train_end])
+    del X
+
+    db = TrialDB(db_path)
+    done = db.finished(study)
+    pending = [n for n in range(trials) if n not in done]
+    pruner = MedianPruner(history=db.curves(study))
+    nthread = max(1, cpu_count() // concurrency)
+    print(f"Tuning on {timeframe}: {len(done)} trials already done, {len(pending)} to run, "
+          f"{concurrency} at a time x {nthread} threads")
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        futures = [executor.submit(run_trial, n, sample_params(space, n), dtrain, dval, base_params, pruner, nthread)
+                   for n in pending]
+        for future in as_completed(futures):
+            result = future.result()
+            db.record(study, result)
+            done[result['number']] = result
+            print(f"Trial {result['number']} {result['state']}: logloss {result['value']:.5f}, AUC {result['auc']:.4f}, "
+                  f"{result['best_iteration'] + 1} rounds, {result['seconds']:.1f}s {result['params']}")
+    elapsed = time.perf_counter() - start
+    if pending:
+        print(f"Ran {len(pending)} trials in {elapsed:.1f}s: {len(pending) / elapsed * 3600:.0f} trials/hour "
+              f"on {cpu_count()} cores ({sum(done[n]['state'] == 'pruned' for n in pending)} pruned)")
+
+    completed = [trial for trial in done.values() if trial['state'] == 'complete']
+    if not completed:
+        print("No completed trials; tuned parameters not written.")
+        return None
+    best = min(completed, key=lambda trial: trial['value'])
+    os.makedirs(os.path.dirname(params_path), exist_ok=True)
+    with open(params_path, 'w') as f:
+        json.dump({'params': best['params'], 'study': study, 'trial': best['number'], 'logloss': best['value'],
+                   'auc': best['auc'], 'best_iteration': best['best_iteration']}, f, indent=2)
+    print(f"Best trial {best['number']}: logloss {best['value']:.5f}, AUC {best['auc']:.4f}. "
+          f"Parameters written to '{params_path}'")
+    return best
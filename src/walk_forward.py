@@ -0,0 +1,111 @@
+import os
+import time
+from multiprocessing import Pool, cpu_count
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from sklearn.metrics import precision_score, roc_auc_score
+from src.data_handler import DataHandler
+from src.feature_store import load_features
+from src.ml_model import feature_matrix, make_target, booster_params, load_tuned_params
+from src.sweep import to_shared, attach_shared
+from src.config import (ML_FEATURES, STRATEGY_COLUMNS, SIGNAL_THRESHOLD, EARLY_STOPPING_ROUNDS,
+                        WALK_FORWARD_TRAIN_CANDLES, WALK_FORWARD_TEST_CANDLES, WALK_FORWARD_MODE,
+                        WALK_FORWARD_VALIDATION_FRACTION)
+
+LABEL_HORIZON = 1  # Labels look one candle ahead, so that many rows before each test window are left out of training
+
+_shared = {}  # Per-worker views onto the shared feature matrix and labels
+
+def fold_bounds(n, train_candles=WALK_FORWARD_TRAIN_CANDLES, test_candles=WALK_FORWARD_TEST_CANDLES, mode=WALK_FORWARD_MODE):
+    """Split n rows into folds of (train_start, test_start, test_end); the last test window may be shorter."""
+    if mode not in ('expanding', 'rolling'):
+        raise ValueError(f"Unknown walk-forward mode: {mode}")
+    folds = []
+    for test_start in range(train_candles, n, test_candles):
+        train_start = 0 if mode == 'expanding' else test_start - train_candles
+        folds.append((train_start, test_start, min(test_start + test_candles, n)))
+    return folds
+
+def _init_worker(specs, nthread, tuned_params):
+    attach_shared(specs, _shared)
+    _shared['nthread'] = nthread
+    _shared['tuned_params'] = tuned_params
+
+def train_fold(task):
+    """Train on one fold's window with early stopping and predict its out-of-sample test window."""
+    fold, (train_start, test_start, test_end) = task
+    start = time.perf_counter()
+    X, y = _shared['X'], _shared['y']
+    train_end = test_start - LABEL_HORIZON
+    val_start = train_end - max(1, int((train_end - train_start) * WALK_FORWARD_VALIDATION_FRACTION))
+    params = booster_params(y[train_start:val_start], _shared['tuned_params'])
+    params['nthread'] = _shared['nthread']
+    dtrain = xgb.QuantileDMatrix(X[train_start:val_start], label=y[train_start:val_start], feature_names=ML_FEATURES)
+    dval = xgb.QuantileDMatrix(X[val_start:train_end], label=y[val_start:train_end], ref=dtrain, feature_names=ML_FEATURES)
+    model = xgb.train(params, dtrain, num_boost_round=2000, evals=[(dval, 'validation')],
+                      early_stopping_rounds=EARLY_STOPPING_ROUNDS, verbose_eval=False)
+    pred_prob = model.inplace_predict(X[test_start:test_end])
+    y_test = y[test_start:test_end].astype(int)
+    # The last row of the series has no next close, so its label is not a real outcome
+    scored = slice(0, len(y_test) - 1) if test_end == len(y) else slice(None)
+    y_scored, p_scored = y_test[scored], pred_prob[scored]
+    return {
+        'fold': fold, 'train_start': train_start, 'test_start': test_start, 'test_end': test_end,
+        'train_rows': val_start - train_start, 'best_iteration': model.best_iteration,
+        'auc': roc_auc_score(y_scored, p_scored) if len(np.unique(y_scored)) == 2 else float('nan'),
+        'precision': precision_score(y_scored, p_scored > SIGNAL_THRESHOLD, zero_division=0),
+        'signals': int((p_scored > SIGNAL_THRESHOLD).sum()), 'seconds': time.perf_counter() - start,
+        'pred_prob': pred_prob
+    }
+
+def walk_forward(timeframe='4h', train_candles=WALK_FORWARD_TRAIN_CANDLES, test_candles=WALK_FORWARD_TEST_CANDLES,
+                 mode=WALK_FORWARD_MODE, processes=None):
+    """Train every fold in parallel and stitch the out-of-sample predictions.
+
+    Returns (predictions, folds): a pred_prob Series indexed by candle timestamp covering every
+    test window, which backtest() accepts directly, and a per-fold metrics table.
+    """
+    handler = DataHandler()
+    df = load_features(handler.load_historical_data(timeframe), STRATEGY_COLUMNS)
+    folds = fold_bounds(len(df), train_candles, test_candles, mode)
+    if not folds:
+        print(f"Not enough {timeframe} data for walk-forward: {len(df)} rows, {train_candles} needed for the first fold.")
+        return pd.Series(dtype=np.float64), pd.DataFrame()
+    processes = min(processes or cpu_count(), len(folds))
+    nthread = max(1, cpu_count() // processes)  # Split the cores between workers instead of oversubscribing them
+    print(f"Walk-forward on {timeframe}: {len(folds)} {mode} folds of {test_candles} test candles, "
+          f"{processes} processes x {nthread} threads")
+
+    blocks, specs = to_shared({'X': feature_matrix(df), 'y': make_target(df['close'])})
+    results = []
+    try:
+        start = time.perf_counter()
+        with Pool(processes, initializer=_init_worker, initargs=(specs, nthread, load_tuned_params())) as pool:
+            for result in pool.imap_unordered(train_fold, list(enumerate(folds, 1))):
+                results.append(result)
+                print(f"Fold {result['fold']}/{len(folds)}: AUC {result['auc']:.3f}, precision {result['precision']:.3f} "
+                      f"({result['signals']} signals), {result['best_iteration'] + 1} rounds, {result['seconds']:.1f}s")
+        elapsed = time.perf_counter() - start
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+    results.sort(key=lambda result: result['fold'])
+    pred_prob = np.concatenate([result.pop('pred_prob') for result in results])
+    test_rows = np.concatenate([np.arange(result['test_start'], result['test_end']) for result in results])
+    predictions = pd.Series(pred_prob.astype(np.float64), index=pd.DatetimeIndex(df['timestamp'].to_numpy()[test_rows]),
+                            name='pred_prob')
+    folds_table = pd.DataFrame(results)
+    folds_table['test_from'] = df['timestamp'].to_numpy()[folds_table['test_start']]
+    folds_table['test_to'] = df['timestamp'].to_numpy()[folds_table['test_end'] - 1]
+
+    reports_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'reports')
+    os.makedirs(reports_dir, exist_ok=True)
+    predictions.to_csv(os.path.join(reports_dir, f"walk_forward_predictions_{timeframe}.csv"), index_label='timestamp')
+    folds_table.to_csv(os.path.join(reports_dir, f"walk_forward_folds_{timeframe}.csv"), index=False)
+    print(f"Walk-forward completed in {elapsed:.1f}s (sum of fold times {folds_table['seconds'].sum():.1f}s). "
+          f"Mean AUC {folds_table['auc'].mean():.3f} (std {folds_table['auc'].std():.3f}), "
+          f"mean precision {folds_table['precision'].mean():.3f}")
+    return predictions, folds_table
@@ -0,0 +1,39 @@
+import asyncio
+import ccxt
+import pytest
+import src.async_fetcher as async_fetcher
+from src.async_fetcher import AsyncFetcher, FetchJob
+from src.candle_store import CandleStore
+from src.fake_exchange import FakeAsyncExchange
+
+HOUR_MS = 3600 * 1000
+
+def make_candles(n, start=0):
+    return [[start + i * HOUR_MS, 100.0 + i, 101.0 + i, 99.0 + i, 100.5 + i, 10.0] for i in range(n)]
+
+@pytest.fixture(autouse=True)
+def short_backoff(monkeypatch):
+    # The 429 back-off penalizes the token bucket by FETCH_RETRY_DELAY seconds; keep tests fast
+    monkeypatch.setattr(async_fetcher, 'FETCH_RETRY_DELAY', 0.01)
+
+def run_fetch(exchange, store, **kwargs):
+    fetcher = AsyncFetcher(exchange=exchange, store=store, rate=1000, burst=1000, limit_per_call=100, **kwargs)
+    job = FetchJob('BTC/USDT', '1h', 0, key='BTC_USDT_1h')
+    return fetcher, asyncio.run(fetcher.run([job]))
+
+def test_rate_limited_pages_are_retried(tmp_path):
+    candles = make_candles(450)
+    exchange = FakeAsyncExchange({'1h': candles}, latency=0.001, rate_limit_calls=[1, 2, 4])
+    store = CandleStore(str(tmp_path))
+    fetcher, result = run_fetch(exchange, store)
+    assert fetcher.rate_limited == 3
+    # The newest candle is still forming at now_ms, so everything before it is stored, in order
+    df = store.load('BTC_USDT_1h')
+    assert result['BTC_USDT_1h'] == len(df) == 449
+    assert df['timestamp'].is_monotonic_increasing
+
+def test_persistent_rate_limit_gives_up(tmp_path):
+    exchange = FakeAsyncExchange({'1h': make_candles(50)}, latency=0.001, rate_limit_calls=range(1, 1000))
+    with pytest.raises(ccxt.RateLimitExceeded):
+        run_fetch(exchange, CandleStore(str(tmp_path)), max_rate_limited=3)
+    assert exchange.calls == 4  # The first try plus three retries
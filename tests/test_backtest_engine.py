@@ -0,0 +1,143 @@
+import numpy as np
+import pandas as pd
+from src.backtest_engine import (BUY, SELL, STOP_LOSS, TAKE_PROFIT, TRAILING_STOP, default_params, intrabar_index,
+                                 _find_exit, _find_exit_intrabar, run_engine)
+
+HOUR_NS = 3600 * 10**9
+BAR_NS = 4 * HOUR_NS
+
+def make_market(n_bars, seed, gap_probability=0.1):
+    """Random 4h bars and the 1h sub-candles inside them; some bars have no sub-candles at all."""
+    rng = np.random.default_rng(seed)
+    sub_close = 100 * np.exp(np.cumsum(rng.normal(0, 0.006, 4 * n_bars)))
+    sub_open = np.concatenate(([100.0], sub_close[:-1])) * np.exp(rng.normal(0, 0.002, 4 * n_bars))
+    sub_high = np.maximum(sub_open, sub_close) * np.exp(np.abs(rng.normal(0, 0.004, 4 * n_bars)))
+    sub_low = np.minimum(sub_open, sub_close) * np.exp(-np.abs(rng.normal(0, 0.004, 4 * n_bars)))
+    timestamp = np.arange(n_bars, dtype=np.int64) * BAR_NS
+    keep = np.repeat(rng.random(n_bars) >= gap_probability, 4) & (rng.random(4 * n_bars) >= 0.05)
+    sub_candles = pd.DataFrame({'timestamp': pd.to_datetime(np.arange(4 * n_bars, dtype=np.int64) * HOUR_NS),
+                                'open': sub_open, 'high': sub_high, 'low': sub_low, 'close': sub_close})[keep]
+    close = sub_close[3::4]
+    atr = close * rng.uniform(0.005, 0.02, n_bars)
+    trend_regime = np.repeat(rng.random(-(-n_bars // 20)) < 0.5, 20)[:n_bars].astype(np.int8)
+    return close, atr, trend_regime, timestamp, sub_candles.reset_index(drop=True)
+
+def reference_loop(close, atr, signal, trend_regime, params):
+    """The per-candle backtest loop run_engine replaced; returns ([(bar, type, price, amount, fee, reason, profit)], values)."""
+    cash, position, entry, peak, cooldown = params['initial_capital'], 0.0, None, 0.0, 0
+    fee_rate = params['fee_rate']
+    trades, values = [], []
+    for i in range(len(close)):
+        price = close[i]
+        portfolio_value = cash + position * price
+        values.append(portfolio_value)
+        if cooldown > 0:
+            cooldown -= 1
+            continue
+        if position > 0:
+            stop_mult = params['stop_loss_atr'] if trend_regime[i] == 1 else params['choppy_stop_loss_atr']
+            if price < entry[2] - atr[i] * stop_mult:
+                reason = STOP_LOSS
+            elif price > entry[2] + params['take_profit_atr'] * atr[i]:
+                reason = TAKE_PROFIT
+            elif price < peak * (1 - params['trailing_stop_percent']):
+                reason = TRAILING_STOP
+            else:
+                peak = max(peak, price)
+                continue
+            fee = position * price * fee_rate
+            profit = (price - entry[2]) * position - fee - entry[4]
+            trades.append((i, SELL, price, position, fee, reason, profit))
+            cash += position * price * (1 - fee_rate)
+            position, entry, peak, cooldown = 0.0, None, 0.0, int(params['cooldown'])
+        elif signal[i] == 1 and cash >= params['position_size_fraction'] * portfolio_value * params['min_cash_fraction']:
+            fraction = params['position_size_fraction'] if trend_regime[i] == 1 else params['choppy_position_size_fraction']
+            trade_value = fraction * portfolio_value
+            if cash < trade_value:
+                continue
+            position = trade_value / price * (1 - fee_rate)
+            entry = (i, BUY, price, position, position * price * fee_rate, 0, 0.0)
+            trades.append(entry)
+            cash -= trade_value
+            peak = price
+    return trades, np.array(values)
+
+def test_run_engine_matches_per_candle_loop():
+    for seed in range(4):
+        close, atr, trend_regime, timestamp, _ = make_market(3000, seed)
+        signal = (np.random.default_rng(seed + 10).random(len(close)) < 0.08).astype(np.int8)
+        params = dict(default_params(), take_profit_atr=3.0, cooldown=3)
+        expected_trades, expected_values = reference_loop(close, atr, signal, trend_regime, params)
+        trades, values = run_engine(close, atr, signal, trend_regime, timestamp, params)
+
+        assert len(trades) == len(expected_trades) > 20
+        bars = np.searchsorted(timestamp, trades['timestamp'].view(np.int64))
+        assert [(bar, t, reason) for bar, t, _, _, _, reason, _ in expected_trades] == \
+            list(zip(bars.tolist(), trades['type'].tolist(), trades['reason'].tolist()))
+        expected = np.array([row[2:5] + row[6:] for row in expected_trades])
+        assert np.allclose(expected, np.column_stack([trades['price'], trades['amount'], trades['fee'], trades['profit_loss']]))
+        assert np.allclose(values, expected_values)
+        # Both stop multipliers were exercised
+        sell_bars = bars[trades['type'] == SELL]
+        assert set(trend_regime[sell_bars[trades['reason'][trades['type'] == SELL] == STOP_LOSS]]) == {0, 1}
+
+def reference_exit(close, atr, stop_mult, start, entry_price, params, index):
+    """Sub-candle by sub-candle version of the documented _find_exit_intrabar rules."""
+    take_profit_atr = params['take_profit_atr']
+    trailing_factor = 1 - params['trailing_stop_percent']
+    peak = entry_price
+    for k in range(start, len(close)):
+        trail = peak * trailing_factor
+        if index['start'][k] == index['end'][k]:
+            stop, take = entry_price - atr[k] * stop_mult[k], entry_price + take_profit_atr * atr[k]
+            if close[k] < stop:
+                return k, STOP_LOSS, close[k]
+            if close[k] > take:
+                return k, TAKE_PROFIT, close[k]
+            if close[k] < trail:
+                return k, TRAILING_STOP, close[k]
+        else:
+            stop, take = entry_price - atr[k - 1] * stop_mult[k - 1], entry_price + take_profit_atr * atr[k - 1]
+            for c in range(index['start'][k], index['end'][k]):
+                sub_open, high, low = index['open'][c], index['high'][c], index['low'][c]
+                if low < stop or low < trail:
+                    if low < stop and (low >= trail or stop >= trail):
+                        return k, STOP_LOSS, min(stop, sub_open)
+                    return k, TRAILING_STOP, min(trail, sub_open)
+                if high > take:
+                    return k, TAKE_PROFIT, max(take, sub_open)
+        peak = max(peak, close[k])
+    return len(close), 0, None
+
+def test_intrabar_exit_matches_brute_force():
+    params = dict(default_params(), take_profit_atr=3.0)
+    reasons = set()
+    for seed in range(5):
+        close, atr, trend_regime, timestamp, sub_candles = make_market(600, seed)
+        index = intrabar_index(timestamp, BAR_NS, sub_candles)
+        stop_mult = np.where(trend_regime == 1, params['stop_loss_atr'], params['choppy_stop_loss_atr'])
+        for entry_bar in range(0, 590, 7):
+            expected = reference_exit(close, atr, stop_mult, entry_bar + 1, close[entry_bar], params, index)
+            k, reason, exit_price = _find_exit_intrabar(close, atr, stop_mult, entry_bar + 1, close[entry_bar], params, index)
+            assert (k, reason) == expected[:2]
+            assert exit_price == expected[2] or np.isclose(exit_price, expected[2])
+            reasons.add(reason)
+    assert {STOP_LOSS, TAKE_PROFIT, TRAILING_STOP} <= reasons
+
+def test_empty_intrabar_index_matches_close_only():
+    params = dict(default_params(), take_profit_atr=3.0)
+    close, atr, trend_regime, timestamp, sub_candles = make_market(2000, 0)
+    empty = intrabar_index(timestamp, BAR_NS, sub_candles.iloc[:0])
+    stop_mult = np.where(trend_regime == 1, params['stop_loss_atr'], params['choppy_stop_loss_atr'])
+    for entry_bar in range(0, 1990, 13):
+        k, reason, peak = _find_exit(close, atr, stop_mult, entry_bar + 1, close[entry_bar], close[entry_bar], params)
+        expected_price = float(close[k]) if k < len(close) else None
+        assert _find_exit_intrabar(close, atr, stop_mult, entry_bar + 1, close[entry_bar], params, empty) == \
+            (k, reason, expected_price)
+
+    signal = (np.random.default_rng(1).random(len(close)) < 0.05).astype(np.int8)
+    trades, values = run_engine(close, atr, signal, trend_regime, timestamp, params)
+    intrabar_trades, intrabar_values = run_engine(close, atr, signal, trend_regime, timestamp, params, intrabar=empty)
+    assert len(trades) > 10
+    assert np.array_equal(trades, intrabar_trades)
+    assert np.array_equal(values, intrabar_values)
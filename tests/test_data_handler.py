@@ -0,0 +1,51 @@
+import pandas as pd
+import pytest
+import src.data_handler as data_handler
+from src.candle_store import CandleStore, candle_key
+from src.data_handler import DataHandler
+from src.fake_exchange import FakeExchange
+
+HOUR_MS = 3600 * 1000
+START_DATE = '2024-01-01'
+START_MS = int(pd.Timestamp(START_DATE).timestamp() * 1000)
+KEY = candle_key('BTC/USDT', '1h')
+
+def make_candles(n):
+    return [[START_MS + i * HOUR_MS, 100.0 + i, 101.0 + i, 99.0 + i, 100.5 + i, 10.0] for i in range(n)]
+
+@pytest.fixture(autouse=True)
+def no_retry_sleep(monkeypatch):
+    monkeypatch.setattr(data_handler, 'FETCH_RETRY_DELAY', 0)
+
+def test_sync_paginates_closed_candles(tmp_path):
+    # The last candle opened 30 minutes ago and is still forming
+    exchange = FakeExchange({'1h': make_candles(250)}, now_ms=START_MS + 249 * HOUR_MS + HOUR_MS // 2)
+    handler = DataHandler(exchange=exchange, store=CandleStore(str(tmp_path)))
+    df = handler.sync_historical_data('1h', START_DATE, limit_per_call=100)
+
+    assert len(df) == 249
+    assert df['timestamp'].is_monotonic_increasing and not df['timestamp'].duplicated().any()
+    assert df['close'].iloc[-1] == 100.5 + 248
+    # Each page starts just after the last candle of the previous one
+    assert [since for _, since, _ in exchange.requests] == [START_MS, START_MS + 99 * HOUR_MS + 1,
+                                                             START_MS + 199 * HOUR_MS + 1]
+
+def test_sync_resumes_after_last_stored_candle(tmp_path):
+    candles = make_candles(300)
+    exchange = FakeExchange({'1h': candles}, now_ms=START_MS + 150 * HOUR_MS)
+    handler = DataHandler(exchange=exchange, store=CandleStore(str(tmp_path)))
+    handler.sync_historical_data('1h', START_DATE, limit_per_call=100)
+    assert handler.store.last_timestamp(KEY) == START_MS + 149 * HOUR_MS
+
+    exchange.requests.clear()
+    exchange.now_ms = START_MS + 300 * HOUR_MS
+    df = handler.sync_historical_data('1h', START_DATE, limit_per_call=100)
+    assert exchange.requests[0][1] == START_MS + 150 * HOUR_MS  # Only candles newer than the stored ones
+    assert len(df) == 300 and (df['timestamp'].diff().dropna() == pd.Timedelta(hours=1)).all()
+
+def test_sync_retries_failed_pages(tmp_path):
+    exchange = FakeExchange({'1h': make_candles(250)}, now_ms=START_MS + 250 * HOUR_MS, fail_calls=[2, 3])
+    handler = DataHandler(exchange=exchange, store=CandleStore(str(tmp_path)))
+    df = handler.sync_historical_data('1h', START_DATE, limit_per_call=100)
+    assert len(df) == 250
+    assert exchange.requests[1][1] == exchange.requests[2][1] == exchange.requests[3][1]  # Same page, retried twice
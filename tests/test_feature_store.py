@@ -0,0 +1,62 @@
+import os
+from multiprocessing import Pool
+import numpy as np
+import pandas as pd
+from src.config import STRATEGY_COLUMNS
+from src.feature_store import FeatureStore
+from src.indicators import calculate_indicators
+
+def make_candles(n, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 30000 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+    open_ = np.concatenate(([30000.0], close[:-1]))
+    return pd.DataFrame({
+        'timestamp': pd.date_range('2022-01-01', periods=n, freq='4h'), 'open': open_,
+        'high': np.maximum(open_, close) * 1.003, 'low': np.minimum(open_, close) * 0.997,
+        'close': close, 'volume': rng.lognormal(3, 0.5, n)
+    })
+
+def assert_same_features(actual, expected):
+    assert list(actual.columns) == list(expected.columns)
+    assert actual['timestamp'].equals(expected['timestamp'])
+    assert np.allclose(actual[STRATEGY_COLUMNS].to_numpy(float), expected[STRATEGY_COLUMNS].to_numpy(float))
+
+def test_miss_hit_and_extend(tmp_path):
+    df = make_candles(1500)
+    store = FeatureStore(root=str(tmp_path))
+    assert_same_features(store.get_features(df.iloc[:1200], STRATEGY_COLUMNS),
+                         calculate_indicators(df.iloc[:1200], STRATEGY_COLUMNS))
+    assert_same_features(store.get_features(df.iloc[:1200], STRATEGY_COLUMNS),
+                         calculate_indicators(df.iloc[:1200], STRATEGY_COLUMNS))
+    # The grown series extends the same entry instead of recomputing everything
+    assert_same_features(store.get_features(df, STRATEGY_COLUMNS), calculate_indicators(df, STRATEGY_COLUMNS))
+    stats = FeatureStore(root=str(tmp_path)).stats()
+    assert (stats['misses'], stats['hits'], stats['extensions'], stats['entries']) == (1, 1, 1, 1)
+
+def test_least_recently_used_entry_is_evicted(tmp_path):
+    store = FeatureStore(root=str(tmp_path))
+    first, second = make_candles(800, seed=1), make_candles(800, seed=2)
+    store.get_features(first, STRATEGY_COLUMNS)
+    entry_bytes = store.stats()['bytes']
+    store.max_bytes = int(entry_bytes * 1.5)  # Room for one entry only
+    store.get_features(second, STRATEGY_COLUMNS)
+    stats = store.stats()
+    assert stats['entries'] == 1 and stats['evictions'] == 1
+    assert len([name for name in os.listdir(tmp_path) if os.path.isdir(tmp_path / name)]) == 1
+    store.get_features(second, STRATEGY_COLUMNS)
+    assert store.stats()['hits'] == 1
+
+def _cache_series(task):
+    root, seed = task
+    return len(FeatureStore(root=root).get_features(make_candles(600, seed), STRATEGY_COLUMNS))
+
+def test_concurrent_processes_keep_every_entry(tmp_path):
+    tasks = [(str(tmp_path), seed) for seed in range(8)]
+    with Pool(4) as pool:
+        assert all(pool.map(_cache_series, tasks))
+    stats = FeatureStore(root=str(tmp_path)).stats()
+    assert stats['entries'] == 8 and stats['misses'] == 8
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.tmp')]
+    with Pool(4) as pool:
+        pool.map(_cache_series, tasks)
+    assert FeatureStore(root=str(tmp_path)).stats()['hits'] == 8
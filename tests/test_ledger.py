@@ -0,0 +1,52 @@
+import pytest
+from src.ledger import Ledger
+
+def make_ledger(cash=1000.0, position=0.0):
+    ledger = Ledger('BTC', 'USDT', reconcile_seconds=3600)
+    ledger.reconcile({'BTC': {'free': position}, 'USDT': {'free': cash}}, now_ms=0)
+    return ledger
+
+def order(side, amount, filled, cost, fee=None):
+    return {'id': '1', 'side': side, 'amount': amount, 'filled': filled, 'cost': cost, 'fee': fee}
+
+def test_fee_in_base_currency_comes_out_of_the_position():
+    ledger = make_ledger()
+    assert ledger.apply_fill(order('buy', 0.01, 0.01, 300.0, {'cost': 0.00001, 'currency': 'BTC'}))
+    assert ledger.position == pytest.approx(0.00999)
+    assert ledger.cash == pytest.approx(700.0)
+    assert ledger.stale_reason is None
+
+def test_fee_in_quote_currency_comes_out_of_cash():
+    ledger = make_ledger(cash=0.0, position=0.01)
+    assert ledger.apply_fill(order('sell', 0.01, 0.01, 300.0, {'cost': 0.3, 'currency': 'USDT'}))
+    assert ledger.position == pytest.approx(0.0)
+    assert ledger.cash == pytest.approx(299.7)
+
+def test_partial_fill_books_the_filled_amount_and_marks_stale():
+    ledger = make_ledger()
+    assert ledger.apply_fill(order('buy', 0.01, 0.004, 120.0))
+    assert ledger.position == pytest.approx(0.004)
+    assert ledger.cash == pytest.approx(880.0)
+    assert ledger.stale_reason == 'order 1 filled 0.004 of 0.01'
+    assert ledger.reconcile_due(1)
+
+def test_cost_falls_back_to_filled_times_average():
+    ledger = make_ledger()
+    assert ledger.apply_fill({'id': '1', 'side': 'buy', 'amount': 0.01, 'filled': 0.01, 'cost': None, 'average': 30000.0})
+    assert ledger.cash == pytest.approx(700.0)
+
+def test_missing_fill_details_leave_the_book_and_force_a_reconcile():
+    ledger = make_ledger()
+    assert not ledger.apply_fill({'id': '1', 'side': 'buy', 'amount': 0.01})
+    assert (ledger.position, ledger.cash, ledger.fills) == (0.0, 1000.0, 0)
+    assert ledger.reconcile_due(1)
+
+def test_reconcile_replaces_the_book_and_reports_drift():
+    ledger = make_ledger()
+    ledger.apply_fill(order('buy', 0.01, 0.01, 300.0))
+    drift = ledger.reconcile({'BTC': {'free': 0.0099}, 'USDT': {'free': 700.0}}, now_ms=5000)
+    assert drift == pytest.approx((-0.0001, 0.0))
+    assert (ledger.position, ledger.cash) == (0.0099, 700.0)
+    assert ledger.stale_reason is None and ledger.last_reconcile_ms == 5000
+    assert not ledger.reconcile_due(5000 + 3599 * 1000)
+    assert ledger.reconcile_due(5000 + 3600 * 1000)
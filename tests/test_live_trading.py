@@ -0,0 +1,194 @@
+import asyncio
+import ccxt
+import numpy as np
+import pandas as pd
+import pytest
+from src.clock import SimulatedClock
+from src.config import (SYMBOL, TIMEFRAME, INITIAL_CAPITAL, LIVE_CLOSE_GRACE_SECONDS, LIVE_FETCH_RETRIES,
+                        LIVE_FETCH_RETRY_SECONDS, POSITION_SIZE_FRACTION)
+from src.fake_exchange import FakeExchange
+from src.live_trading import LiveTrader
+
+BAR_MS = FakeExchange.parse_timeframe(TIMEFRAME) * 1000
+START_MS = 100000 * BAR_MS
+
+def make_candles(n_candles, scale=100.0):
+    rng = np.random.default_rng(0)
+    close = scale * np.exp(np.cumsum(rng.normal(0, 0.01, n_candles)))
+    volume = rng.lognormal(3, 0.5, n_candles)
+    return [[START_MS + i * BAR_MS, c, c * 1.01, c * 0.99, c, v] for i, (c, v) in enumerate(zip(close, volume))]
+
+def make_trader(n_candles, seeded_bars):
+    """LiveTrader on a simulated exchange, with indicators seeded at the close of candle seeded_bars - 1."""
+    candles = make_candles(n_candles)
+    clock = SimulatedClock(START_MS + seeded_bars * BAR_MS)
+    exchange = FakeExchange({TIMEFRAME: candles}, clock=clock, balances={SYMBOL.split('/')[1]: float(INITIAL_CAPITAL)})
+    trader = LiveTrader(exchange=exchange, clock=clock, snapshot_path=None)
+    trader.fetch_latest_data()
+    return trader, clock
+
+def test_warm_up_counts_missed_candles_down_the_cooldown():
+    trader, clock = make_trader(1300, 1200)
+    trader.cooldown = 10
+    clock.advance(3 * BAR_MS)
+    trader.warm_up()
+    assert trader.cooldown == 7
+    assert trader.indicators.last_timestamp.value // 10**6 == START_MS + 1202 * BAR_MS
+
+def test_warm_up_after_reseed_does_not_extend_cooldown():
+    trader, clock = make_trader(2400, 1200)
+    for _ in range(3):  # A few live updates push the update count past what a re-seed replays
+        clock.advance(BAR_MS)
+        trader.fetch_latest_data()
+    count = trader.indicators.count
+    trader.cooldown = 10
+    clock.advance(1100 * BAR_MS)  # Down longer than one update fetch covers: warm_up re-seeds
+    trader.warm_up()
+    assert trader.indicators.count < count  # Re-seeded from the latest candles
+    assert trader.cooldown == 0
+
+def test_market_data_and_orders_use_separate_clients():
+    clock = SimulatedClock(START_MS + 1050 * BAR_MS)
+    market = FakeExchange({TIMEFRAME: make_candles(1100)}, clock=clock)
+    # The order venue quotes different prices, as testnet does
+    venue = FakeExchange({TIMEFRAME: make_candles(1100, scale=101.0)}, clock=clock,
+                         balances={SYMBOL.split('/')[1]: float(INITIAL_CAPITAL)})
+    trader = LiveTrader(exchange=venue, clock=clock, snapshot_path=None, market_exchange=market)
+    latest = trader.fetch_latest_data()
+    assert latest['close'] == market.candles[TIMEFRAME][1049][4]
+    assert market.requests and not venue.requests
+    assert trader.sync_position() and trader.cash == INITIAL_CAPITAL
+    order = trader._buy(1, latest['close'], latest['timestamp'], trader.cash, 'trending')
+    assert venue.orders == [order] and not market.orders
+
+    def venue_ticker(symbol):
+        raise AssertionError("stop checks must use market prices")
+    venue.fetch_ticker = venue_ticker
+    asyncio.run(trader.stop_monitor.poll_once())
+    assert trader.stop_monitor.ticks == 1
+
+def test_run_async_cycles_on_a_simulated_clock():
+    clock = SimulatedClock(START_MS + 1050 * BAR_MS + 1234)  # Mid-candle start
+    exchange = FakeExchange({TIMEFRAME: make_candles(1100)}, clock=clock,
+                            balances={SYMBOL.split('/')[1]: float(INITIAL_CAPITAL)})
+    first_close = START_MS + 1051 * BAR_MS
+    # Candles closing at these times are published late by the exchange: the second one misses every retry
+    publish_delay_ms = {first_close + BAR_MS: 12 * 1000, first_close + 3 * BAR_MS: 600 * 1000}
+    fetch_ohlcv = exchange.fetch_ohlcv
+
+    def late_fetch_ohlcv(symbol, timeframe='1m', since=None, limit=None, params={}):
+        return [row for row in fetch_ohlcv(symbol, timeframe, since, limit, params)
+                if row[0] + BAR_MS + publish_delay_ms.get(row[0] + BAR_MS, 0) <= clock.now_ms()]
+    exchange.fetch_ohlcv = late_fetch_ohlcv
+
+    trader = LiveTrader(exchange=exchange, clock=clock, snapshot_path=None)
+    trader.stop_monitor.enabled = False  # Candle-close decisions only
+    trader.ledger.reconcile_ms = 10**12  # Reconcile only when the book is stale
+    failing_bar = pd.Timestamp(first_close + 4 * BAR_MS - BAR_MS, unit='ms')
+
+    def predict_fast(row):
+        if row['timestamp'] == failing_bar:
+            raise RuntimeError("injected failure")
+        return np.array([0.99])
+    trader.model.predict_fast = predict_fast
+
+    cycles = []
+    step = trader.step
+
+    async def recording_step(bar_close_ms):
+        cycle = {'bar_close_ms': bar_close_ms, 'woke_ms': clock.now_ms(), 'reconciles': trader.ledger.reconciles}
+        cycles.append(cycle)
+        cycle['result'] = await step(bar_close_ms)
+        cycle['done_ms'] = clock.now_ms()
+        return cycle['result']
+    trader.step = recording_step
+
+    asyncio.run(trader.run_async(max_cycles=7))
+    grace_ms = LIVE_CLOSE_GRACE_SECONDS * 1000
+    assert [cycle['bar_close_ms'] for cycle in cycles] == [first_close + k * BAR_MS for k in range(7)]
+    assert all(cycle['woke_ms'] == cycle['bar_close_ms'] + grace_ms for cycle in cycles)
+    # Late by 12 s: published on the second retry; never published in time: skipped after every retry
+    assert cycles[1]['done_ms'] == cycles[1]['woke_ms'] + 2 * LIVE_FETCH_RETRY_SECONDS * 1000
+    assert cycles[3]['done_ms'] == cycles[3]['woke_ms'] + LIVE_FETCH_RETRIES * LIVE_FETCH_RETRY_SECONDS * 1000
+    assert cycles[3]['result'] is None
+    # The failing cycle raised out of step, the loop went on and the next cycle reconciled balances first
+    assert 'done_ms' not in cycles[4]
+    assert cycles[6]['reconciles'] == cycles[5]['reconciles'] + 1
+    # One decision latency per completed cycle (not the skipped or failed one), one order latency per order
+    assert trader.cycle_latency.summary()['count'] == 5
+    assert trader.order_latency.summary()['count'] == len(exchange.orders) > 0
+
+def test_order_without_fill_details_books_the_expected_amounts_and_reconciles():
+    trader, clock = make_trader(1300, 1200)
+    assert trader.sync_position()
+    create_order = trader.exchange.create_market_buy_order
+    trader.exchange.create_market_buy_order = lambda symbol, amount, params={}: {
+        'id': create_order(symbol, amount)['id'], 'side': 'buy', 'amount': amount}  # Filled, but not reported
+    price = trader.exchange.candles[TIMEFRAME][1199][4]
+    trader._buy(1, price, pd.Timestamp(START_MS, unit='ms'), INITIAL_CAPITAL, 'trending')
+    assert trader.position == trader.trades[-1]['amount']
+    assert trader.cash == pytest.approx(INITIAL_CAPITAL * (1 - POSITION_SIZE_FRACTION))
+    assert trader.ledger.reconcile_due(clock.now_ms())
+    assert trader.sync_position()
+    assert trader.position == trader.exchange.balances[SYMBOL.split('/')[0]]
+    assert trader.cash == trader.exchange.balances[SYMBOL.split('/')[1]]
+    assert trader.ledger.stale_reason is None
+
+def test_failed_balance_fetch_keeps_the_book_and_blocks_trading_until_known():
+    trader, clock = make_trader(1300, 1200)
+    trader.stop_monitor.enabled = False
+    trader.model.predict_fast = lambda row: np.array([0.99])  # Would buy on every candle
+    fetch_balance = trader.exchange.fetch_balance
+    failing = [True]
+
+    def flaky_fetch_balance(params={}):
+        if failing[0]:
+            raise ccxt.NetworkError("injected failure")
+        return fetch_balance(params)
+    trader.exchange.fetch_balance = flaky_fetch_balance
+
+    clock.advance(BAR_MS)
+    assert asyncio.run(trader.step(clock.now_ms())) is None
+    assert not trader.ledger.known and not trader.exchange.orders
+    assert trader.ledger.reconcile_due(clock.now_ms())
+
+    failing[0] = False
+    clock.advance(BAR_MS)
+    assert asyncio.run(trader.step(clock.now_ms())) is not None
+    book = (trader.position, trader.cash)
+
+    failing[0] = True
+    trader.ledger.mark_stale('test')
+    assert not trader.sync_position()
+    assert trader.ledger.known and (trader.position, trader.cash) == book
+    assert trader.ledger.reconcile_due(clock.now_ms())
+
+def test_snapshot_restores_an_identical_trader(tmp_path):
+    trader, clock = make_trader(1300, 1200)
+    trader.sync_position()
+    latest = trader.indicators.latest
+    trader._buy(1, latest['close'], latest['timestamp'], trader.cash, 'trending')
+    trader.peak_price = latest['close'] * 1.02
+    trader.cooldown = 1
+    trader.trend_metrics['regime'] = 'trending'
+    trader.snapshot_path = str(tmp_path / 'live.pkl')
+    trader.save_state()
+
+    restored = LiveTrader(exchange=trader.exchange, clock=clock, snapshot_path=trader.snapshot_path)
+    assert restored.restored
+    for name in ('active_trade', 'peak_price', 'cooldown', 'trade_number', 'trend_metrics', 'cash', 'position'):
+        assert getattr(restored, name) == getattr(trader, name)
+    assert restored.ledger.known and restored.ledger.reconcile_due(clock.now_ms())  # Re-checked after a restart
+    assert restored.indicators.latest == trader.indicators.latest
+    # The restored indicators carry the same rolling state forward
+    clock.advance(BAR_MS)
+    assert restored.fetch_latest_data() == trader.fetch_latest_data()
+
+def test_snapshot_for_another_market_is_ignored(tmp_path, monkeypatch):
+    trader, clock = make_trader(1300, 1200)
+    trader.snapshot_path = str(tmp_path / 'live.pkl')
+    trader.cooldown = 3
+    trader.save_state()
+    monkeypatch.setattr('src.live_trading.TIMEFRAME', '1h')
+    restored = LiveTrader(exchange=trader.exchange, clock=clock, snapshot_path=trader.snapshot_path)
+    assert not restored.restored and restored.cooldown == 0 and restored.indicators is None
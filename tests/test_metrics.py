@@ -0,0 +1,101 @@
+import numpy as np
+import pandas as pd
+import pytest
+from src.backtest_engine import TRADE_DTYPE, BUY, SELL, run_engine
+from src.metrics import compute_metrics, position_mask, rolling_metrics
+
+N_BARS = 20
+TIMESTAMPS = np.datetime64('2024-01-01T00:00', 'ns') + np.arange(N_BARS) * np.timedelta64(4, 'h')
+
+def make_trades(rows):
+    """TRADE_DTYPE array from (bar, type) rows in time order."""
+    trades = np.zeros(len(rows), dtype=TRADE_DTYPE)
+    for i, (bar, kind) in enumerate(rows):
+        trades[i]['timestamp'] = TIMESTAMPS[bar]
+        trades[i]['type'] = kind
+    return trades
+
+def test_position_mask_single_symbol():
+    trades = make_trades([(2, BUY), (5, SELL), (8, BUY)])
+    in_position, entries, exits = position_mask(trades, TIMESTAMPS, N_BARS)
+    expected = np.zeros(N_BARS - 1, dtype=bool)
+    expected[2:5] = expected[8:] = True
+    assert np.array_equal(in_position, expected)
+    assert list(entries) == [2] and list(exits) == [5]
+
+def test_portfolio_round_trips_pair_per_symbol():
+    # Symbol 0 buys at bar 0 and is still open; symbol 1 round-trips from bar 2 to bar 4, then from 6 to 12
+    trades = make_trades([(0, BUY), (2, BUY), (4, SELL), (6, BUY), (12, SELL)])
+    symbols = np.array([0, 1, 1, 1, 1])
+    in_position, entries, exits = position_mask(trades, TIMESTAMPS, N_BARS, symbols)
+    assert in_position.all()
+    assert sorted(zip(entries, exits)) == [(2, 4), (6, 12)]
+
+    metrics = compute_metrics(np.full(N_BARS, 10000.0), trades, TIMESTAMPS, rolling_window=None, trade_groups=symbols)
+    assert metrics['avg_holding_period'] == 4.0
+    assert metrics['exposure'] == 100.0
+
+def test_periods_per_year_and_sharpe_follow_bar_spacing():
+    returns = np.random.default_rng(0).normal(0.001, 0.01, 500)
+    pv = 10000 * np.cumprod(np.concatenate(([1.0], 1 + returns)))
+    start = np.datetime64('2024-01-01T00:00', 'ns')
+    four_hourly = start + np.arange(len(pv)) * np.timedelta64(4, 'h')
+    daily = start + np.arange(len(pv)) * np.timedelta64(1, 'D')
+    no_trades = make_trades([])
+    assert compute_metrics(pv, no_trades, four_hourly)['periods_per_year'] == 365 * 6
+    assert compute_metrics(pv, no_trades, daily)['periods_per_year'] == 365
+    sharpe_4h = compute_metrics(pv, no_trades, four_hourly, rolling_window=None)['sharpe_ratio']
+    sharpe_1d = compute_metrics(pv, no_trades, daily, rolling_window=None)['sharpe_ratio']
+    assert sharpe_4h == pytest.approx(sharpe_1d * np.sqrt(6))
+    assert sharpe_1d == pytest.approx(returns.mean() / returns.std(ddof=1) * np.sqrt(365))
+
+def test_rolling_metrics_match_naive_pandas_rolling():
+    n, window, ppy = 400, 30, 2190.0
+    rng = np.random.default_rng(1)
+    pv = 10000 * np.cumprod(np.concatenate(([1.0], 1 + rng.normal(0, 0.02, n - 1))))
+    in_position = rng.random(n - 1) < 0.4
+    rolling = rolling_metrics(pv, in_position, window, ppy)
+
+    # Row i covers the window returns ending at bar i; the NaN first return keeps rows before window empty
+    returns = pd.Series(pv).pct_change()
+    by_window = returns.rolling(window)
+    held = pd.Series(in_position.astype(float), index=range(1, n))  # Period j runs from bar j to bar j + 1
+    expected = pd.DataFrame({
+        'sharpe': by_window.mean() / by_window.std() * np.sqrt(ppy),
+        'sortino': by_window.mean() / returns.clip(upper=0).pow(2).rolling(window).mean().pow(0.5) * np.sqrt(ppy),
+        'return': pd.Series(pv) / pd.Series(pv).shift(window) - 1,
+        'drawdown': 1 - pd.Series(pv) / pd.Series(pv).rolling(window + 1).max(),
+        'exposure': held.rolling(window).mean()
+    })
+    for name in expected:
+        assert rolling[name].iloc[:window].isna().all()
+        assert np.allclose(rolling[name].iloc[window:], expected[name].iloc[window:]), name
+    assert rolling['max_drawdown'].iloc[-1] == pytest.approx(expected['drawdown'].iloc[-window - 1:].max())
+
+def test_drawdown_duration_and_exposure_on_a_hand_built_curve():
+    pv = np.array([100, 110, 105, 100, 108, 111, 90, 95, 112, 112], dtype=float)
+    timestamps = TIMESTAMPS[:len(pv)]
+    # Held over periods 2-4 and from bar 7 to the end: 5 of 9 return periods
+    trades = make_trades([(2, BUY), (5, SELL), (7, BUY)])
+    metrics = compute_metrics(pv, trades, timestamps, initial_capital=100, rolling_window=None)
+    assert metrics['max_drawdown_duration'] == 3  # Bars 2-4 below the bar-1 peak
+    assert metrics['max_drawdown'] == pytest.approx(1 - 90 / 111)
+    assert metrics['exposure'] == pytest.approx(500 / 9)
+    assert metrics['total_return'] == pytest.approx(12.0)
+
+def test_round_trip_below_both_fees_is_a_loss():
+    # Enters at 100, peaks at 104 and trails out at 100.05: up on price, down after two fees
+    close = np.array([100.0] * 5 + [102.0, 104.0, 100.05] + [100.05] * 4)
+    n = len(close)
+    signal = np.zeros(n, dtype=np.int8)
+    signal[4] = 1
+    timestamps = TIMESTAMPS[:n]
+    trend_regime = np.ones(n, dtype=np.int8)
+    trades, pv = run_engine(close, np.full(n, 10.0), signal, trend_regime, timestamps)
+    sells = trades[trades['type'] == SELL]
+    assert len(sells) == 1 and sells[0]['price'] > trades[0]['price']
+    assert sells[0]['profit_loss'] < 0
+    metrics = compute_metrics(pv, trades, timestamps, trend_regime, rolling_window=None)
+    assert metrics['win_rate'] == 0.0 and metrics['max_consecutive_losses'] == 1
+    assert metrics['avg_loss'] == pytest.approx(sells[0]['profit_loss'])
+    assert metrics['trending_win_rate'] == 0.0
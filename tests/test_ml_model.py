@@ -0,0 +1,23 @@
+import numpy as np
+import xgboost as xgb
+from src.config import ML_FEATURES
+from src.ml_model import MLModel
+
+def train_small_model(path):
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(200, len(ML_FEATURES)))
+    y = (X[:, 0] > 0).astype(int)
+    booster = xgb.train({'objective': 'binary:logistic'}, xgb.DMatrix(X, label=y, feature_names=ML_FEATURES),
+                        num_boost_round=5)
+    booster.save_model(path)
+    return X
+
+def test_predict_fast_mapping_after_batch(tmp_path):
+    path = str(tmp_path / 'model.json')
+    X = train_small_model(path)
+    model = MLModel(model_path=path)
+    batch = model.predict_fast(X[:8])  # Grows the reused buffer to 8 rows
+    assert batch.shape == (8,)
+    single = model.predict_fast(dict(zip(ML_FEATURES, X[3])))
+    assert single.shape == (1,)
+    assert np.isclose(single[0], batch[3])
@@ -0,0 +1,38 @@
+from multiprocessing import Pool
+import numpy as np
+import xgboost as xgb
+from src.config import ML_FEATURES
+from src.ml_model import MLModel
+from src.model_registry import ModelRegistry
+
+def train_booster(seed):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(200, len(ML_FEATURES)))
+    y = (X[:, seed % len(ML_FEATURES)] > 0).astype(int)
+    return xgb.train({'objective': 'binary:logistic'}, xgb.DMatrix(X, label=y, feature_names=ML_FEATURES),
+                     num_boost_round=5)
+
+def test_promote_publishes_active_model(tmp_path):
+    published = str(tmp_path / 'xgboost_model.json')
+    registry = ModelRegistry(root=str(tmp_path / 'registry'), published_path=published)
+    first = registry.register(train_booster(0), {}, activate=True)
+    second = registry.register(train_booster(1), {})
+    X = np.random.default_rng(2).normal(size=(10, len(ML_FEATURES)))
+
+    assert np.allclose(MLModel(model_path=published).predict_fast(X), registry.load(first).predict_fast(X))
+    registry.promote(second)
+    assert registry.index()['active'] == second
+    assert np.allclose(MLModel(model_path=published).predict_fast(X), registry.load(second).predict_fast(X))
+    assert not np.allclose(registry.load(first).predict_fast(X), registry.load(second).predict_fast(X))
+
+def _register(task):
+    root, published, seed = task
+    return ModelRegistry(root=root, published_path=published).register(train_booster(seed), {'seed': seed})
+
+def test_concurrent_registrations_get_distinct_versions(tmp_path):
+    root, published = str(tmp_path / 'registry'), str(tmp_path / 'xgboost_model.json')
+    with Pool(4) as pool:
+        versions = pool.map(_register, [(root, published, seed) for seed in range(8)])
+    registry = ModelRegistry(root=root, published_path=published)
+    assert sorted(versions) == sorted(set(versions)) == sorted(registry.index()['versions'])
+    assert sorted(registry.metadata(version)['seed'] for version in versions) == list(range(8))
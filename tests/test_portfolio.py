@@ -0,0 +1,49 @@
+import glob
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from src import portfolio
+from src.candle_store import CandleStore, candle_key
+from src.config import ML_FEATURES, STRATEGY_COLUMNS
+from src.feature_store import FeatureStore
+from src.indicators import calculate_indicators
+from src.ml_model import feature_matrix, make_target
+from src.prediction_cache import PredictionCache
+
+SYMBOLS = ['BTC/USDT', 'ETH/USDT', 'SOL/USDT', 'XRP/USDT']
+
+def make_candles(n, seed):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.015, n)))
+    open_ = np.concatenate(([100.0], close[:-1]))
+    return pd.DataFrame({
+        'timestamp': pd.date_range('2022-01-01', periods=n, freq='4h'), 'open': open_,
+        'high': np.maximum(open_, close) * 1.004, 'low': np.minimum(open_, close) * 0.996,
+        'close': close, 'volume': rng.lognormal(3, 0.5, n)
+    })
+
+def test_parallel_symbols_fill_a_cold_cache(tmp_path, monkeypatch):
+    # The candle store, feature store and prediction cache all live under the working directory
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(portfolio, 'REPORTS_DIR', str(tmp_path / 'reports'))
+    store = CandleStore()
+    for seed, symbol in enumerate(SYMBOLS):
+        store.write(candle_key(symbol, '4h'), make_candles(1200 + 50 * seed, seed))
+    features = calculate_indicators(make_candles(1200, 0), STRATEGY_COLUMNS)
+    booster = xgb.train({'objective': 'binary:logistic', 'max_depth': 3},
+                        xgb.DMatrix(feature_matrix(features), label=make_target(features['close']), feature_names=ML_FEATURES),
+                        num_boost_round=20)
+    model_path = str(tmp_path / 'model.json')
+    booster.save_model(model_path)
+
+    cold = portfolio.portfolio_backtest(SYMBOLS, '4h', processes=4, model_path=model_path)
+    stats = FeatureStore().stats()
+    assert (stats['entries'], stats['misses'], stats['hits']) == (len(SYMBOLS), len(SYMBOLS), 0)
+    assert sorted(entry['label'] for entry in PredictionCache().entries()) == sorted(f"{s} 4h" for s in SYMBOLS)
+    assert not glob.glob('data/**/*.tmp', recursive=True)
+
+    warm = portfolio.portfolio_backtest(SYMBOLS, '4h', processes=4, model_path=model_path)
+    stats = FeatureStore().stats()
+    assert (stats['entries'], stats['misses'], stats['hits']) == (len(SYMBOLS), len(SYMBOLS), len(SYMBOLS))
+    assert len(PredictionCache().entries()) == len(SYMBOLS)
+    assert cold[1].equals(warm[1]) and cold[0].equals(warm[0])
@@ -0,0 +1,54 @@
+import os
+from multiprocessing import Pool
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from src.config import ML_FEATURES
+from src.ml_model import MLModel
+from src.prediction_cache import PredictionCache, cached_predict, model_fingerprint
+
+def make_model(path, seed):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(300, len(ML_FEATURES)))
+    booster = xgb.train({'objective': 'binary:logistic'},
+                        xgb.DMatrix(X, label=(X[:, seed] > 0).astype(int), feature_names=ML_FEATURES), num_boost_round=5)
+    booster.save_model(path)
+    return MLModel(model_path=path)
+
+def make_features(n, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame(rng.normal(size=(n, len(ML_FEATURES))), columns=ML_FEATURES)
+    df.insert(0, 'timestamp', pd.date_range('2023-01-01', periods=n, freq='4h'))
+    return df
+
+def test_hit_after_miss_and_prune_stale_model(tmp_path):
+    cache = PredictionCache(root=str(tmp_path / 'cache'))
+    first = make_model(str(tmp_path / 'first.json'), 0)
+    df = make_features(500)
+    scored = cached_predict(first, df, cache=cache)
+    assert len(cache.entries()) == 1
+    assert np.array_equal(cached_predict(first, df, cache=cache), scored)
+    assert np.allclose(scored, first.predict_fast(df[ML_FEATURES].to_numpy()))
+
+    # Another model or other features are different entries; pruning keeps only the current model's
+    second = make_model(str(tmp_path / 'second.json'), 1)
+    cached_predict(second, df, cache=cache)
+    cached_predict(first, make_features(200, seed=1), cache=cache)
+    assert len(PredictionCache(root=str(tmp_path / 'cache')).entries()) == 3
+    assert cache.prune(current_model_hash=model_fingerprint(second.model_path)) == 2
+    assert [entry['model'] for entry in cache.entries()] == [model_fingerprint(second.model_path)]
+    assert len([name for name in os.listdir(tmp_path / 'cache') if name.endswith('.npy')]) == 1
+
+def _put(task):
+    root, seed = task
+    PredictionCache(root=root).put('model', f"features{seed}", np.full(10, seed / 10))
+    return seed
+
+def test_concurrent_puts_keep_every_entry(tmp_path):
+    root = str(tmp_path)
+    with Pool(4) as pool:
+        pool.map(_put, [(root, seed) for seed in range(12)])
+    cache = PredictionCache(root=root)
+    assert len(cache.entries()) == 12
+    assert np.allclose(cache.get('model', 'features7'), 0.7)
+    assert not [name for name in os.listdir(root) if name.endswith('.tmp')]
@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from src.backtest_engine import prepare_arrays, run_engine, trades_to_records
+from src.config import ML_FEATURES, STRATEGY_COLUMNS, SIGNAL_THRESHOLD, TIMEFRAME
+from src.indicators import calculate_indicators
+from src.ml_model import MLModel, feature_matrix, make_target
+from src.replay import replay, diff_trades
+
+def make_candles(n, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 30000 * np.exp(np.cumsum(rng.normal(0, 0.015, n)))
+    open_ = np.concatenate(([30000.0], close[:-1]))
+    return pd.DataFrame({
+        'timestamp': pd.date_range('2022-01-01', periods=n, freq=TIMEFRAME), 'open': open_,
+        'high': np.maximum(open_, close) * np.exp(np.abs(rng.normal(0, 0.005, n))),
+        'low': np.minimum(open_, close) * np.exp(-np.abs(rng.normal(0, 0.005, n))),
+        'close': close, 'volume': rng.lognormal(3, 0.5, n)
+    })
+
+def test_replay_matches_backtest(tmp_path):
+    df = make_candles(1500)
+    features = calculate_indicators(df, STRATEGY_COLUMNS)
+    # Fitted in-sample, so plenty of probabilities clear SIGNAL_THRESHOLD
+    booster = xgb.train({'objective': 'binary:logistic', 'max_depth': 6, 'eta': 0.3},
+                        xgb.DMatrix(feature_matrix(features), label=make_target(features['close']), feature_names=ML_FEATURES),
+                        num_boost_round=100)
+    booster.save_model(str(tmp_path / 'model.json'))
+    model = MLModel(model_path=str(tmp_path / 'model.json'))
+
+    # backtest()'s pipeline on the same frame, with closes-only fills as in replay_check
+    features['pred_prob'] = model.predict(xgb.DMatrix(feature_matrix(features), feature_names=ML_FEATURES))
+    features['signal'] = (features['pred_prob'] > SIGNAL_THRESHOLD).astype(int)
+    features['trend_regime'] = (features['SMA50'] > features['SMA200']).astype(int)
+    trade_array, _ = run_engine(**prepare_arrays(features))
+    backtest_trades = trades_to_records(trade_array)
+
+    trader, exchange = replay(TIMEFRAME, df=df, model=model, log_path=str(tmp_path / 'replay.log'))
+    assert len(backtest_trades) >= 20
+    assert diff_trades(trader.trades, backtest_trades).empty
+    assert len(exchange.orders) == len(trader.trades)
@@ -0,0 +1,78 @@
+import json
+from html.parser import HTMLParser
+import numpy as np
+import pandas as pd
+import pytest
+from src.backtest_engine import run_engine, trades_to_records
+from src.config import REPORT_CHART_POINTS
+from src.metrics import compute_metrics
+from src.report_utils import decimate_minmax, write_report_files
+
+VOID_TAGS = {'meta', 'br', 'hr', 'img', 'input', 'link', 'col'}
+
+class TagChecker(HTMLParser):
+    """Fails on a closing tag that does not match the innermost open one."""
+
+    def __init__(self):
+        super().__init__()
+        self.stack = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag not in VOID_TAGS:
+            self.stack.append(tag)
+
+    def handle_endtag(self, tag):
+        assert self.stack and self.stack.pop() == tag, f"unbalanced </{tag}>"
+
+@pytest.mark.parametrize('n, max_points', [(10, 50), (1000, 50), (100003, 1000), (5000, 7)])
+def test_decimate_minmax_keeps_extremes_and_endpoints(n, max_points):
+    rng = np.random.default_rng(n)
+    values = np.cumsum(rng.normal(0, 1, n))
+    values[n // 3] = values.max() + 50  # A one-bar spike
+    keep = decimate_minmax(values, max_points)
+    assert len(keep) <= max(max_points, 4)
+    assert np.all(np.diff(keep) > 0)
+    assert keep[0] == 0 and keep[-1] == n - 1
+    assert values.argmin() in keep and values.argmax() in keep
+    if n <= max_points:
+        assert len(keep) == n
+
+def make_backtest(n_bars, signal_probability):
+    rng = np.random.default_rng(1)
+    close = 30000 * np.exp(np.cumsum(rng.normal(0, 0.01, n_bars)))
+    timestamp = np.datetime64('2023-01-01T00:00', 'ns') + np.arange(n_bars) * np.timedelta64(4, 'h')
+    trend_regime = (np.arange(n_bars) // 200 % 2).astype(np.int8)
+    signal = (rng.random(n_bars) < signal_probability).astype(np.int8)
+    trade_array, portfolio_values = run_engine(close, close * 0.02, signal, trend_regime, timestamp)
+    metrics = compute_metrics(portfolio_values, trade_array, timestamp, trend_regime)
+    return trades_to_records(trade_array), metrics, timestamp, portfolio_values
+
+@pytest.mark.parametrize('signal_probability', [0.0, 0.05])
+def test_write_report_files(tmp_path, signal_probability):
+    trades, metrics, timestamp, portfolio_values = make_backtest(3000, signal_probability)
+    assert bool(trades) == bool(signal_probability)
+    path = str(tmp_path / 'reports' / 'backtest_report_4h.html')
+    written = write_report_files(path, '4h', trades, metrics, timestamp, portfolio_values)
+    assert written[:2] == [path, str(tmp_path / 'reports' / 'backtest_report_4h.json')]
+
+    checker = TagChecker()
+    with open(path, encoding='utf-8') as f:
+        checker.feed(f.read())
+    checker.close()
+    assert checker.stack == []
+
+    with open(written[1]) as f:
+        summary = json.load(f)
+    assert summary['trades'] == len(trades) and summary['timeframe'] == '4h'
+    assert summary['final_value'] == pytest.approx(portfolio_values[-1])
+    curve = summary['equity_curve']
+    assert len(curve['timestamp']) == len(curve['portfolio_value']) <= REPORT_CHART_POINTS
+    assert curve['portfolio_value'][-1] == pytest.approx(portfolio_values[-1])
+
+    trades_path = written[2]
+    if trades_path.endswith('.parquet'):
+        saved = pd.read_parquet(trades_path)
+    else:
+        with open(trades_path) as f:
+            saved = [json.loads(line) for line in f]
+    assert len(saved) == len(trades)
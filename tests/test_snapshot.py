@@ -0,0 +1,42 @@
+import os
+import pickle
+from src.snapshot import SNAPSHOT_VERSION, save_snapshot, load_snapshot
+
+STATE = {'symbol': 'BTC/USDT', 'timeframe': '4h', 'cooldown': 2, 'peak_price': 31000.0}
+
+def test_round_trip_checks_expected_values(tmp_path):
+    path = str(tmp_path / 'state' / 'live.pkl')
+    assert save_snapshot(STATE, path) > 0
+    state = load_snapshot(path, symbol='BTC/USDT', timeframe='4h')
+    assert {key: state[key] for key in STATE} == STATE and state['version'] == SNAPSHOT_VERSION
+    assert load_snapshot(path, symbol='ETH/USDT', timeframe='4h') is None
+    assert load_snapshot(path, symbol='BTC/USDT', timeframe='1h') is None
+    assert os.listdir(tmp_path / 'state') == ['live.pkl']  # No temp files left behind
+
+def test_other_version_is_ignored(tmp_path):
+    path = str(tmp_path / 'live.pkl')
+    with open(path, 'wb') as f:
+        pickle.dump(dict(STATE, version=SNAPSHOT_VERSION + 1), f)
+    assert load_snapshot(path, symbol='BTC/USDT') is None
+
+def test_missing_truncated_or_corrupt_file_is_ignored(tmp_path):
+    path = str(tmp_path / 'live.pkl')
+    assert load_snapshot(path) is None
+    save_snapshot(STATE, path)
+    with open(path, 'rb') as f:
+        payload = f.read()
+    for data in (payload[:len(payload) // 2], b'', b'not a pickle'):
+        with open(path, 'wb') as f:
+            f.write(data)
+        assert load_snapshot(path) is None
+
+def test_leftover_temp_file_does_not_replace_a_good_snapshot(tmp_path):
+    path = str(tmp_path / 'live.pkl')
+    save_snapshot(STATE, path)
+    # What a crash mid-write leaves behind, under the old fixed temp name and a unique one
+    for leftover in (path + '.tmp', path + '.abc123.tmp'):
+        with open(leftover, 'wb') as f:
+            f.write(b'partial')
+    assert load_snapshot(path)['cooldown'] == 2
+    save_snapshot(dict(STATE, cooldown=1), path)
+    assert load_snapshot(path)['cooldown'] == 1
@@ -0,0 +1,46 @@
+import asyncio
+from types import SimpleNamespace
+import pandas as pd
+from src.clock import SimulatedClock
+from src.config import SYMBOL, TIMEFRAME, INITIAL_CAPITAL
+from src.fake_exchange import FakeExchange
+from src.live_trading import LiveTrader
+
+BAR_MS = FakeExchange.parse_timeframe(TIMEFRAME) * 1000
+START_MS = 1000 * BAR_MS  # A candle close
+SECOND_MS = 1000
+
+def open_position(prices, regime='trending', atr=10.0):
+    """LiveTrader bought at prices[0] on a simulated exchange that then replays prices one tick per second."""
+    clock = SimulatedClock(START_MS)
+    candles = [[START_MS - (i + 1) * BAR_MS, 100.0, 101.0, 99.0, 100.0, 1.0] for i in range(5)]
+    ticks = [(START_MS + i * SECOND_MS, price) for i, price in enumerate(prices)]
+    base, quote = SYMBOL.split('/')
+    exchange = FakeExchange({TIMEFRAME: candles}, clock=clock, balances={quote: float(INITIAL_CAPITAL)}, ticks=ticks)
+    trader = LiveTrader(exchange=exchange, clock=clock, snapshot_path=None)
+    trader.sync_position()
+    sma200 = 100.0 if regime == 'trending' else 200.0
+    trader.indicators = SimpleNamespace(latest={'ATR': atr, 'SMA50': 150.0, 'SMA200': sma200})
+    trader.trend_metrics['regime'] = regime  # As step() sets it on the candle close before the monitor runs
+    trader._buy(1, prices[0], pd.Timestamp(START_MS, unit='ms'), trader.cash, regime)
+    return trader, exchange
+
+def test_trailing_stop_follows_polled_peak():
+    # Peak 112 sets the trailing stop at 108.64; 108 fires it, well above the 90 stop-loss
+    trader, exchange = open_position([100.0, 105.0, 112.0, 110.0, 108.0, 120.0])
+    asyncio.run(trader.stop_monitor.watch_until(START_MS + BAR_MS))
+    sell = exchange.orders[-1]
+    assert trader.stop_monitor.exits == 1
+    assert trader.trades[-1]['reason'] == 'trailing-stop'
+    assert sell['side'] == 'sell' and sell['price'] == 108.0 and sell['timestamp'] == START_MS + 4 * SECOND_MS
+    assert sell['amount'] == exchange.orders[0]['amount']
+    assert trader.position == 0 and exchange.balances['BTC'] == 0
+    assert trader.clock.now_ms() == START_MS + BAR_MS  # Kept sleeping until the candle close once flat
+
+def test_choppy_stop_loss_fires_on_first_breach():
+    # Choppy regime: stop at 100 - 0.5 * 10 = 95
+    trader, exchange = open_position([100.0, 98.0, 94.0, 90.0], regime='choppy')
+    asyncio.run(trader.stop_monitor.watch_until(START_MS + BAR_MS))
+    assert trader.trades[-1]['reason'] == 'stop-loss'
+    assert exchange.orders[-1]['price'] == 94.0 and exchange.orders[-1]['timestamp'] == START_MS + 2 * SECOND_MS
+    assert len(exchange.orders) == 2
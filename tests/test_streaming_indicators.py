@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+from src.config import STRATEGY_COLUMNS
+from src.indicators import calculate_indicators
+from src.streaming_indicators import StreamingIndicators
+
+def make_candles(n, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 30000 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+    open_ = np.concatenate(([30000.0], close[:-1]))
+    return pd.DataFrame({
+        'timestamp': pd.date_range('2022-01-01', periods=n, freq='4h'), 'open': open_,
+        'high': np.maximum(open_, close) * np.exp(np.abs(rng.normal(0, 0.004, n))),
+        'low': np.minimum(open_, close) * np.exp(-np.abs(rng.normal(0, 0.004, n))),
+        'close': close, 'volume': rng.lognormal(3, 0.5, n)
+    })
+
+def latest_row(indicators):
+    return np.array([indicators.latest[column] for column in STRATEGY_COLUMNS], dtype=np.float64)
+
+def test_streaming_matches_batch_indicators():
+    df = make_candles(3000)
+    expected = calculate_indicators(df, STRATEGY_COLUMNS).set_index('timestamp')
+    indicators = StreamingIndicators()
+    indicators.seed(df.iloc[:1500])
+    assert indicators.ready(STRATEGY_COLUMNS)
+    assert np.allclose(latest_row(indicators), expected.loc[df['timestamp'].iloc[1499], STRATEGY_COLUMNS].to_numpy(float))
+    rows = []
+    for candle in df.iloc[1500:].itertuples(index=False):
+        indicators.update(candle.timestamp, candle.open, candle.high, candle.low, candle.close, candle.volume)
+        rows.append(latest_row(indicators))
+    assert indicators.last_timestamp == df['timestamp'].iloc[-1]
+    assert np.allclose(np.array(rows), expected.loc[df['timestamp'].iloc[1500:], STRATEGY_COLUMNS].to_numpy(float),
+                       rtol=1e-7, atol=1e-9)
+
+def test_reseed_matches_batch_indicators_on_the_same_window():
+    # LiveTrader re-seeds from the latest candles only; the batch computation over that window must agree
+    df = make_candles(3000, seed=1)
+    window = df.iloc[-1000:].reset_index(drop=True)
+    indicators = StreamingIndicators()
+    indicators.seed(window)
+    expected = calculate_indicators(window, STRATEGY_COLUMNS)
+    assert indicators.count == 1000
+    assert np.allclose(latest_row(indicators), expected[STRATEGY_COLUMNS].iloc[-1].to_numpy(float), rtol=1e-7, atol=1e-9)
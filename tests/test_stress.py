@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+from src.stress import block_bootstrap, volatility_regimes, generate_paths
+
+def test_block_bootstrap_reaches_the_last_block():
+    rng = np.random.default_rng(0)
+    idx = block_bootstrap(50, 200, 40, 10, rng)
+    assert idx.shape == (200, 40)
+    assert idx.max() == 49 and idx.min() >= 0
+    blocks = idx.reshape(200, 4, 10)
+    assert (np.diff(blocks, axis=2) == 1).all()  # Contiguous blocks, never clipped at the end of the source
+    assert block_bootstrap(10, 3, 25, 10, rng).max() == 9  # Source exactly one block long
+
+def test_volatility_regimes_switching_every_bar():
+    # mean_bars=1 switches regime on every bar, including the first: ids must stay within n_bars
+    scale = volatility_regimes(5, 30, np.random.default_rng(0), mean_bars=1, high_probability=0.5, multiplier=3.0)
+    assert scale.shape == (5, 30)
+    assert set(np.unique(scale)) <= {1.0, 3.0}
+
+def test_generate_paths_is_seeded_and_consistent():
+    rng = np.random.default_rng(1)
+    n = 500
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+    open_ = np.concatenate(([100.0], close[:-1]))
+    df = pd.DataFrame({'timestamp': pd.date_range('2024-01-01', periods=n, freq='4h'), 'open': open_,
+                       'high': np.maximum(open_, close) * 1.005, 'low': np.minimum(open_, close) * 0.995,
+                       'close': close, 'volume': rng.uniform(1, 10, n)})
+    paths = generate_paths(df, n_paths=20, n_bars=300, seed=7, block_bars=24)
+    again = generate_paths(df, n_paths=20, n_bars=300, seed=7, block_bars=24)
+    for column in ('open', 'high', 'low', 'close', 'volume', 'crash'):
+        assert np.array_equal(paths[column], again[column])
+    assert (paths['high'] >= np.maximum(paths['open'], paths['close'])).all()
+    assert (paths['low'] <= np.minimum(paths['open'], paths['close'])).all()
+    assert (np.diff(paths['timestamp']) == 4 * 3600 * 10**9).all()